@@ -0,0 +1,252 @@
+"""Benchmark delle parti critiche di Campo Minato.
+
+Uso:
+    python benchmark.py conteggi
+    python benchmark.py mine
+    python benchmark.py avvio      (richiede un display)
+    python benchmark.py database --partite 1000000
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import motore
+
+
+def misura(funzione, ripetizioni=5):
+    """Restituisce il tempo migliore (in secondi) su più esecuzioni"""
+    migliore = float('inf')
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione()
+        migliore = min(migliore, time.perf_counter() - inizio)
+    return migliore
+
+
+def conteggi_ciclo_originale(righe, colonne, posizioni_mine):
+    """Calcolo originale cella per cella, usato come riferimento"""
+    mine_adiacenti = {}
+    for riga in range(righe):
+        for colonna in range(colonne):
+            if (riga, colonna) in posizioni_mine:
+                mine_adiacenti[(riga, colonna)] = -1
+                continue
+            conteggio = 0
+            for r in range(max(0, riga-1), min(righe, riga+2)):
+                for c in range(max(0, colonna-1), min(colonne, colonna+2)):
+                    if (r, c) in posizioni_mine:
+                        conteggio += 1
+            mine_adiacenti[(riga, colonna)] = conteggio
+    return mine_adiacenti
+
+
+def benchmark_conteggi(args):
+    dimensioni = [(9, 9, 10), (16, 30, 99), (100, 100, 2000), (200, 300, 12000), (1000, 1000, 200000)]
+    numpy_disponibile = motore.np
+    print(f"{'Griglia':>12} {'Originale':>12} {'Python puro':>12} {'NumPy':>12}")
+
+    for righe, colonne, mine in dimensioni:
+        random.seed(args.seme)
+        indici = random.sample(range(righe * colonne), mine)
+        posizioni = {divmod(i, colonne) for i in indici}
+        riferimento = conteggi_ciclo_originale(righe, colonne, posizioni)
+
+        risultati = [misura(lambda: conteggi_ciclo_originale(righe, colonne, posizioni), args.ripetizioni)]
+        for modulo_numpy in [None] + ([numpy_disponibile] if numpy_disponibile else []):
+            motore.np = modulo_numpy
+            conteggi = motore.calcola_conteggi(righe, colonne, indici)
+            assert dict(zip(motore.chiavi_griglia(righe, colonne), conteggi)) == riferimento
+            risultati.append(misura(lambda: motore.calcola_conteggi(righe, colonne, indici), args.ripetizioni))
+        motore.np = numpy_disponibile
+
+        colonne_tempi = " ".join(f"{t * 1000:>10.2f}ms" for t in risultati)
+        if len(risultati) < 3:
+            colonne_tempi += f" {'n/d':>12}"
+        print(f"{f'{righe}x{colonne}':>12} {colonne_tempi}")
+
+
+def mine_con_lista(righe, colonne, mine, riga_sicura, colonna_sicura, generatore):
+    """Piazzamento originale: lista di tutte le celle candidate e random.sample"""
+    zona_sicura = {(r, c) for r in range(max(0, riga_sicura-1), min(righe, riga_sicura+2))
+                   for c in range(max(0, colonna_sicura-1), min(colonne, colonna_sicura+2))}
+    posizioni_possibili = [(r, c) for r in range(righe) for c in range(colonne) if (r, c) not in zona_sicura]
+    return set(generatore.sample(posizioni_possibili, mine))
+
+
+def benchmark_mine(args):
+    densita_originale = motore.DENSITA_MASSIMA_SCARTO
+    print(f"{'Griglia':>12} {'Densità':>8} {'Lista':>12} {'Scarto':>12} {'Floyd':>12}")
+
+    for righe, colonne in [(16, 30), (200, 300), (1000, 1000)]:
+        for densita in (0.01, 0.1, 0.2, 0.5, 0.8):
+            mine = int(righe * colonne * densita)
+            generatore = random.Random(args.seme)
+            risultati = [misura(lambda: mine_con_lista(righe, colonne, mine, 0, 0, generatore), args.ripetizioni)]
+            # Forza una strategia alla volta agendo sulla soglia
+            for soglia in (1.0, 0.0):
+                motore.DENSITA_MASSIMA_SCARTO = soglia
+                risultati.append(misura(lambda: motore.campiona_mine(righe, colonne, mine, 0, 0, generatore),
+                                        args.ripetizioni))
+            motore.DENSITA_MASSIMA_SCARTO = densita_originale
+
+            colonne_tempi = " ".join(f"{t * 1000:>10.2f}ms" for t in risultati)
+            print(f"{f'{righe}x{colonne}':>12} {densita:>8.0%} {colonne_tempi}")
+
+
+UTENTE_BENCHMARK = 'benchmark'
+
+
+def avvio_figlio(percorso_db):
+    """Eseguito in un processo nuovo: avvia il gioco come main(), accede con l'utente di prova
+    e scrive su stdout quando il login e poi la partita sono pronti a ricevere input"""
+    import tkinter as tk
+    import gioco
+
+    def segnala(evento):
+        root.update_idletasks()
+        print(evento, flush=True)
+
+    db = gioco.GestoreDatabase(percorso_db)
+    root = tk.Tk()
+    root.style = gioco.ttk.Style()
+    login = gioco.FinestraLogin(root, db)
+
+    def accedi():
+        segnala('login')
+        login.campo_utente.insert(0, UTENTE_BENCHMARK)
+        login.campo_password.insert(0, UTENTE_BENCHMARK)
+        login.login()
+
+    root.after_idle(accedi)
+    utente = login.esegui()
+    controllore = gioco.avvia_gioco(root, db, utente)
+    root.after_idle(lambda: (segnala('partita'), controllore.esci()))
+    root.mainloop()
+    controllore.vista.distruggi()
+    root.destroy()
+    db.chiudi()
+
+
+def benchmark_avvio(args):
+    if args.db:
+        avvio_figlio(args.db)
+        return
+
+    import gioco
+    fasi = ['login', 'partita', 'uscita']
+    misure = {fase: [] for fase in fasi}
+    with tempfile.TemporaryDirectory() as cartella:
+        # Database già creato e con l'utente: si misura l'avvio abituale, non il primo
+        percorso = os.path.join(cartella, 'benchmark.db')
+        db = gioco.GestoreDatabase(percorso)
+        db.aggiungi_utente(UTENTE_BENCHMARK, UTENTE_BENCHMARK, 'benchmark', 'benchmark')
+        db.chiudi()
+
+        for _ in range(args.ripetizioni):
+            inizio = time.perf_counter()
+            processo = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'avvio', '--db', percorso],
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            for riga in processo.stdout:
+                misure[riga.strip()].append(time.perf_counter() - inizio)
+            _, errori = processo.communicate()
+            if processo.returncode != 0:
+                sys.exit(f"Avvio del gioco non riuscito:\n{errori}")
+            misure['uscita'].append(time.perf_counter() - inizio)
+
+    print(f"{'Pronto':>12} {'Migliore':>12} {'Mediana':>12}")
+    for fase in fasi:
+        tempi = sorted(misure[fase])
+        print(f"{fase:>12} {tempi[0] * 1000:>10.1f}ms {tempi[len(tempi) // 2] * 1000:>10.1f}ms")
+
+
+def popola_database(db, utenti, partite, generatore):
+    """Riempie il database di utenti, partite e record casuali (date negli ultimi tre anni).
+    Il primo utente è un giocatore assiduo con il 5% di tutte le partite"""
+    cursore = db.connessione.cursor()
+    cursore.executemany('''
+        INSERT INTO utenti (username, password, domanda_sicurezza, risposta_sicurezza, partite_giocate, partite_vinte)
+        VALUES (?, '', '', '', ?, ?)
+    ''', ((f'giocatore{i}', generatore.randrange(5000), generatore.randrange(2000)) for i in range(utenti)))
+
+    adesso = time.time()
+    difficolta = ['facile', 'medio', 'difficile']
+
+    def righe_partite():
+        for _ in range(partite):
+            data = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(adesso - generatore.randrange(3 * 365 * 86400)))
+            id_utente = 1 if generatore.random() < 0.05 else generatore.randrange(1, utenti + 1)
+            yield (id_utente, generatore.choice(difficolta),
+                   generatore.choice(['vittoria', 'sconfitta']), generatore.randrange(1, 999), 10, '9x9', data)
+
+    cursore.executemany('''
+        INSERT INTO partite (id_utente, difficolta, esito, tempo, mine, dimensione, data_partita)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', righe_partite())
+    cursore.executemany('''
+        INSERT INTO record (id_utente, difficolta, tempo) VALUES (?, ?, ?)
+    ''', ((id_utente, livello, generatore.randrange(1, 999))
+          for id_utente in range(1, utenti + 1) for livello in difficolta))
+    db.connessione.commit()
+
+
+def benchmark_database(args):
+    import gioco
+    generatore = random.Random(args.seme)
+    # Le classifiche sono lette senza passare dalla cache, altrimenti si misurerebbe solo quella
+    interrogazioni = [
+        ("storico (1a pagina)", lambda db: db.ottieni_storico_utente('giocatore0', limite=gioco.RIGHE_PAGINA)),
+        ("storico (10a pagina)", lambda db: db.ottieni_storico_utente('giocatore0', limite=gioco.RIGHE_PAGINA,
+                                                                      offset=9 * gioco.RIGHE_PAGINA)),
+        ("tempi medio", lambda db: db.leggi_leaderboard('tempo', 'medio', 20, 0)),
+        ("vittorie", lambda db: db.leggi_leaderboard('vittorie', None, 20, 0)),
+        ("partite", lambda db: db.leggi_leaderboard('partite', None, 20, 0)),
+        ("recenti", lambda db: db.leggi_leaderboard('recente', None, 20, 0)),
+    ]
+
+    with tempfile.TemporaryDirectory() as cartella:
+        db = gioco.GestoreDatabase(os.path.join(cartella, 'benchmark.db'))
+        inizio = time.perf_counter()
+        popola_database(db, args.utenti, args.partite, generatore)
+        print(f"{args.partite} partite e {args.utenti} utenti inseriti in {time.perf_counter() - inizio:.1f}s\n")
+
+        # Prima con gli indici della migrazione, poi senza per confronto
+        indici = [riga[0] for riga in db.cursore.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'indice_%'")]
+        db.cursore.execute('ANALYZE')
+        con_indici = [misura(lambda: funzione(db), args.ripetizioni) for _, funzione in interrogazioni]
+        for indice in indici:
+            db.cursore.execute(f'DROP INDEX {indice}')
+        db.cursore.execute('ANALYZE')
+        senza_indici = [misura(lambda: funzione(db), args.ripetizioni) for _, funzione in interrogazioni]
+        db.chiudi()
+
+    print(f"{'Interrogazione':>22} {'Senza indici':>14} {'Con indici':>12}")
+    for (nome, _), senza, con in zip(interrogazioni, senza_indici, con_indici):
+        print(f"{nome:>22} {senza * 1000:>12.2f}ms {con * 1000:>10.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di Campo Minato")
+    parser.add_argument('--seme', type=int, default=0, help="seme per la generazione delle griglie")
+    parser.add_argument('--ripetizioni', type=int, default=3, help="esecuzioni per misura (si tiene la migliore)")
+    sottocomandi = parser.add_subparsers(dest='comando', required=True)
+    sottocomandi.add_parser('conteggi', help="calcolo delle mine adiacenti").set_defaults(funzione=benchmark_conteggi)
+    sottocomandi.add_parser('mine', help="piazzamento delle mine").set_defaults(funzione=benchmark_mine)
+    parser_avvio = sottocomandi.add_parser('avvio', help="tempo dall'avvio del processo al login e alla partita")
+    parser_avvio.add_argument('--db', help=argparse.SUPPRESS)  # Usato dal processo figlio
+    parser_avvio.set_defaults(funzione=benchmark_avvio)
+    parser_database = sottocomandi.add_parser('database', help="storico e classifiche su un database molto grande")
+    parser_database.add_argument('--partite', type=int, default=1000000)
+    parser_database.add_argument('--utenti', type=int, default=10000)
+    parser_database.set_defaults(funzione=benchmark_database)
+
+    args = parser.parse_args()
+    args.funzione(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,338 @@
 import tkinter as tk
-from tkinter import messagebox, ttk
-import random
+from tkinter import filedialog, messagebox, ttk
 import os
-import time
-from functools import partial
+from pathlib import Path
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from functools import partial, wraps
+import queue
+import random
 import sqlite3
+import threading
 import hashlib
+import itertools
+import logging
+import time
 from datetime import datetime
 
+from motore import MOTORI, chiavi_griglia, RisolutoreCampoMinato, RiservaGriglie, ProbabilitaMine, RegistrazionePartita
+from profiler import PROFILER, misura_latenza
+
+log = logging.getLogger(__name__)
+
+# Il database sta accanto al gioco, qualunque sia la cartella da cui viene avviato
+PERCORSO_DB = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'campo_minato.db')
+
+# Dimensioni massime per la difficoltà personalizzata
+RIGHE_MASSIME = 200
+COLONNE_MASSIME = 300
+
+# La griglia a pulsanti crea un widget per cella: oltre questo numero di celle Tk si blocca
+# e al suo posto viene usata la griglia su canvas
+CELLE_MASSIME_PULSANTI = 2500
+
+# Con la griglia virtuale si disegnano solo le celle visibili: i limiti salgono
+RIGHE_MASSIME_VIRTUALE = 1000
+COLONNE_MASSIME_VIRTUALE = 1000
+
+# Con il motore 'automatico' le griglie da questo numero di celle in su usano il motore
+# 'compatto', più rapido sulle aree enormi; le altre quello a insiemi
+CELLE_MOTORE_COMPATTO = 10000
+
+# Colori con cui viene evidenziata la cella suggerita (anche estremi della mappa di probabilità)
+COLORE_SUGGERIMENTO_SICURA = '#7ddf64'
+COLORE_SUGGERIMENTO_MINA = '#f25f5c'
+
+# Tempo massimo (in ms) dedicato a ogni passaggio di disegno: le scoperte enormi
+# vengono distribuite su più fotogrammi. None disegna sempre tutto in una volta
+BUDGET_FOTOGRAMMA_MS = 16
+
+# Bit di event.state che indicano i tasti del mouse tenuti premuti (accordo sinistro+destro)
+MASCHERA_TASTO_SINISTRO = 0x100
+MASCHERA_TASTO_DESTRO = 0x400
+
+# Righe lette dal database per ogni pagina di storico e classifiche, e righe tenute
+# al massimo nella tabella (quelle lontane dalla parte visibile vengono scartate)
+RIGHE_PAGINA = 100
+RIGHE_RESIDENTI_MASSIME = 500
+
+# Scritture che possono attendere il thread del database: oltre, chi accoda aspetta
+SCRITTURE_IN_CODA_MASSIME = 64
+# Secondi massimi di attesa delle scritture in coda al logout e all'uscita
+ATTESA_MASSIMA_SCRITTURE = 30
+
+# PRAGMA applicati a ogni connessione (si possono cambiare con il parametro pragma di
+# GestoreDatabase). In WAL più istanze del gioco leggono mentre un'altra scrive
+PRAGMA_DATABASE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',   # In WAL resta integro anche dopo un crash
+    'busy_timeout': 5000,      # Millisecondi di attesa di SQLite prima di "database is locked"
+    'cache_size': -16000,      # Negativo: KiB di cache delle pagine
+    'mmap_size': 64 * 1024 * 1024,
+}
+
+# Se il database resta bloccato oltre il busy_timeout, l'operazione viene ripetuta fino a
+# TENTATIVI_DATABASE volte con attese che partono da ATTESA_INIZIALE_DATABASE secondi e raddoppiano
+TENTATIVI_DATABASE = 5
+ATTESA_INIZIALE_DATABASE = 0.05
+
+# Le classifiche lette restano in memoria al massimo per questi secondi (le partite di altre
+# istanze del gioco non le invalidano) e ne vengono tenute al più VOCI_CACHE_CLASSIFICHE
+DURATA_CACHE_CLASSIFICHE = 60
+VOCI_CACHE_CLASSIFICHE = 32
+
+# Istruzioni SQL già compilate che ogni connessione tiene pronte per il riuso
+ISTRUZIONI_IN_CACHE = 128
+
+
+def mescola_colori(colore_iniziale, colore_finale, frazione):
+    """Colore intermedio tra due colori esadecimali '#rrggbb'"""
+    iniziale = [int(colore_iniziale[i:i + 2], 16) for i in (1, 3, 5)]
+    finale = [int(colore_finale[i:i + 2], 16) for i in (1, 3, 5)]
+    return '#' + ''.join(f'{round(a + (b - a) * frazione):02x}' for a, b in zip(iniziale, finale))
+
+
+def formatta_data(data):
+    """Da 'aaaa-mm-gg hh:mm:ss' (come la salva SQLite) a 'gg/mm/aaaa hh:mm'"""
+    try:
+        if isinstance(data, str):
+            data = datetime.strptime(data, '%Y-%m-%d %H:%M:%S')
+        return data.strftime('%d/%m/%Y %H:%M')
+    except (ValueError, TypeError, AttributeError):
+        return str(data)
 
-# Cambia la directory
-os.chdir(os.path.realpath(__file__)[:-len(os.path.basename(__file__))])
+
+def database_bloccato(errore):
+    return isinstance(errore, sqlite3.OperationalError) and ('locked' in str(errore) or 'busy' in str(errore))
+
+
+def con_ripetizioni(metodo):
+    """Ripete il metodo di GestoreDatabase quando un'altra istanza del gioco tiene bloccato il
+    database, attendendo sempre di più tra un tentativo e l'altro. Dopo ogni errore la transazione
+    viene annullata, così la connessione non resta a tenere il database bloccato"""
+    @wraps(metodo)
+    def ripetuto(self, *args, **kwargs):
+        attesa = ATTESA_INIZIALE_DATABASE
+        for tentativo in range(1, TENTATIVI_DATABASE + 1):
+            try:
+                return metodo(self, *args, **kwargs)
+            except sqlite3.Error as errore:
+                # In un gruppo di scritture l'annullamento perderebbe anche le operazioni precedenti:
+                # lo fa gruppo_scritture
+                if self.gruppo_attivo:
+                    raise
+                self.connessione.rollback()
+                if not database_bloccato(errore) or tentativo == TENTATIVI_DATABASE:
+                    raise
+            # Attese un po' casuali, così le istanze in conflitto non riprovano insieme
+            pausa = attesa * random.uniform(0.5, 1.5)
+            time.sleep(pausa)
+            with self.blocco_contatori:
+                self.blocchi['ripetizioni'] += 1
+                self.blocchi['attesa'] += pausa
+            attesa *= 2
+    return ripetuto
+
+
+class CacheClassifiche:
+    """Pagine di classifica già lette, per (tipo, difficoltà, limite, offset), con scadenza e
+    scarto delle meno usate. È condivisa con il thread di scrittura, che la invalida dopo i commit"""
+    def __init__(self, durata=DURATA_CACHE_CLASSIFICHE, voci_massime=VOCI_CACHE_CLASSIFICHE):
+        self.durata = durata
+        self.voci_massime = voci_massime
+        self.voci = OrderedDict()  # chiave → (scadenza, righe), dalla meno usata di recente
+        # Cresce a ogni invalidazione: una lettura iniziata prima non viene salvata
+        self.generazione = 0
+        self.blocco = threading.Lock()
+        self.contatori = {'trovate': 0, 'mancate': 0, 'invalidate': 0}
+    
+    def leggi(self, chiave):
+        with self.blocco:
+            voce = self.voci.get(chiave)
+            if voce is None or voce[0] < time.monotonic():
+                self.voci.pop(chiave, None)
+                self.contatori['mancate'] += 1
+                return None
+            self.voci.move_to_end(chiave)
+            self.contatori['trovate'] += 1
+            return voce[1]
+    
+    def scrivi(self, chiave, righe, generazione):
+        with self.blocco:
+            if generazione != self.generazione:
+                return
+            self.voci[chiave] = (time.monotonic() + self.durata, righe)
+            self.voci.move_to_end(chiave)
+            while len(self.voci) > self.voci_massime:
+                self.voci.popitem(last=False)
+    
+    def invalida(self, tipo, difficolta=None, valore=None):
+        """Toglie le pagine che il nuovo valore di un giocatore può cambiare: quelle non piene e
+        quelle in cui si piazzerebbe prima dell'ultima riga (valore None: tutte quelle del tipo)"""
+        with self.blocco:
+            self.generazione += 1
+            for chiave, (_, righe) in list(self.voci.items()):
+                tipo_voce, difficolta_voce, limite, _ = chiave
+                if tipo_voce != tipo or (difficolta is not None and difficolta_voce != difficolta):
+                    continue
+                if valore is not None and len(righe) == limite:
+                    ultimo = righe[-1][1]
+                    # I tempi sono in ordine crescente, vittorie e partite decrescente
+                    if (valore > ultimo) if tipo == 'tempo' else (valore < ultimo):
+                        continue
+                del self.voci[chiave]
+                self.contatori['invalidate'] += 1
+    
+    def svuota(self):
+        with self.blocco:
+            self.generazione += 1
+            self.voci.clear()
+
+
+class ConnessioniDatabase:
+    """Connessioni al database divise per thread: ognuno ha la propria connessione di scrittura
+    e una in sola lettura (aperte al primo uso), così letture e scritture di thread diversi
+    procedono insieme senza condividere cursori"""
+    # Numera i database in memoria, così due GestoreDatabase non finiscono sullo stesso
+    numeratore_memoria = itertools.count()
+    
+    def __init__(self, nome_db, pragma, istruzioni_in_cache=ISTRUZIONI_IN_CACHE):
+        self.nome_db = nome_db
+        # ':memory:' darebbe a ogni thread un database vuoto e diverso: tutte le connessioni
+        # aprono invece lo stesso database in memoria a cache condivisa, che vive finché ne resta una
+        self.in_memoria = nome_db == ':memory:'
+        if self.in_memoria:
+            self.uri = f'file:campo_minato_{next(self.numeratore_memoria)}?mode=memory&cache=shared'
+        self.pragma = pragma
+        self.istruzioni_in_cache = istruzioni_in_cache
+        self.locale = threading.local()
+        # Tutte le connessioni aperte, per chiuderle anche se il loro thread è già terminato
+        self.aperte = []
+        self.blocco = threading.Lock()
+    
+    def apri(self, sola_lettura):
+        if sola_lettura:
+            # In autocommit nessuna transazione implicita resta aperta su una vecchia istantanea del WAL
+            connessione = sqlite3.connect(Path(self.nome_db).absolute().as_uri() + '?mode=ro', uri=True,
+                                          isolation_level=None, check_same_thread=False,
+                                          cached_statements=self.istruzioni_in_cache)
+        elif self.in_memoria:
+            connessione = sqlite3.connect(self.uri, uri=True, check_same_thread=False,
+                                          cached_statements=self.istruzioni_in_cache)
+            # Con la cache condivisa i blocchi sono per tabella: le letture non aspettano le scritture
+            connessione.execute('PRAGMA read_uncommitted = 1')
+        else:
+            connessione = sqlite3.connect(self.nome_db, check_same_thread=False,
+                                          cached_statements=self.istruzioni_in_cache)
+        for nome, valore in self.pragma.items():
+            # La modalità del journal è salvata nel file: la imposta chi scrive
+            if not (sola_lettura and nome == 'journal_mode'):
+                connessione.execute(f'PRAGMA {nome} = {valore}')
+        with self.blocco:
+            self.aperte.append(connessione)
+        return connessione
+    
+    def scrittura(self):
+        """Cursore di scrittura del thread corrente"""
+        cursore = getattr(self.locale, 'scrittura', None)
+        if cursore is None:
+            cursore = self.locale.scrittura = self.apri(sola_lettura=False).cursor()
+        return cursore
+    
+    def lettura(self):
+        """Cursore in sola lettura del thread corrente (un database in memoria ha solo quello di scrittura)"""
+        if self.in_memoria:
+            return self.scrittura()
+
+        cursore = getattr(self.locale, 'lettura', None)
+        if cursore is None:
+            cursore = self.locale.lettura = self.apri(sola_lettura=True).cursor()
+        return cursore
+    
+    def chiudi_thread(self):
+        """Chiude le connessioni del thread corrente: da chiamare alla fine dei thread in background"""
+        for tipo in ('scrittura', 'lettura'):
+            cursore = getattr(self.locale, tipo, None)
+            if cursore is not None:
+                setattr(self.locale, tipo, None)
+                with self.blocco:
+                    self.aperte.remove(cursore.connection)
+                cursore.connection.close()
+    
+    def chiudi(self):
+        with self.blocco:
+            aperte, self.aperte = self.aperte, []
+        self.locale = threading.local()
+        for connessione in aperte:
+            connessione.close()
 
 
 class GestoreDatabase:
-    """Gestisce tutte le operazioni del database SQLite"""
-    def __init__(self, nome_db='campo_minato.db'):
-        self.connessione = sqlite3.connect(nome_db)
-        self.cursore = self.connessione.cursor()
+    """Gestisce tutte le operazioni del database SQLite. Si può usare da più thread: ognuno
+    lavora con le proprie connessioni (vedi ConnessioniDatabase)"""
+    def __init__(self, nome_db=PERCORSO_DB, pragma=None, cache_classifiche=None):
+        self.nome_db = nome_db
+        self.pragma = dict(PRAGMA_DATABASE, **(pragma or {}))
+        self.connessioni = ConnessioniDatabase(nome_db, self.pragma)
+        # Operazioni ripetute perché il database era bloccato e secondi passati ad attendere
+        self.blocchi = {'ripetizioni': 0, 'attesa': 0.0}
+        self.blocco_contatori = threading.Lock()
+        # Gruppo di scritture aperto da gruppo_scritture, diverso per ogni thread
+        self.gruppo = threading.local()
+        self.cache_classifiche = cache_classifiche or CacheClassifiche()
+        self.scrittore = None
         self.crea_tabelle()
     
+    @property
+    def cursore(self):
+        """Cursore di scrittura del thread corrente"""
+        return self.connessioni.scrittura()
+    
+    @property
+    def connessione(self):
+        return self.connessioni.scrittura().connection
+    
+    @property
+    def lettore(self):
+        """Cursore in sola lettura del thread corrente, per le interrogazioni"""
+        return self.connessioni.lettura()
+    
+    @property
+    def gruppo_attivo(self):
+        return getattr(self.gruppo, 'invalidazioni', None) is not None
+    
+    def scritture(self):
+        """Scrittore in background sullo stesso database, avviato al primo uso"""
+        if self.scrittore is None:
+            self.scrittore = ScrittoreDatabase(self)
+        return self.scrittore
+    
+    def contatori_blocchi(self):
+        """Ripetizioni e attesa dovute ai blocchi, in tutti i thread"""
+        with self.blocco_contatori:
+            return dict(self.blocchi)
+    
+    # Migrazioni dello schema in ordine: dopo l'n-esima il database è alla versione n,
+    # salvata in PRAGMA user_version. Le nuove modifiche vanno aggiunte in fondo
+    MIGRAZIONI = ('migrazione_tabelle', 'migrazione_indici', 'migrazione_indici_spareggio')
+    
+    @con_ripetizioni
     def crea_tabelle(self):
-        """Crea le tabelle necessarie se non esistono"""
+        """Porta il database all'ultima versione dello schema, applicando solo le migrazioni mancanti"""
+        versione = self.cursore.execute('PRAGMA user_version').fetchone()[0]
+        for numero, migrazione in enumerate(self.MIGRAZIONI[versione:], versione + 1):
+            # Ogni migrazione è atomica insieme all'aggiornamento della versione
+            self.cursore.execute('BEGIN')
+            try:
+                getattr(self, migrazione)()
+                self.cursore.execute(f'PRAGMA user_version = {numero}')
+            except sqlite3.Error:
+                self.connessione.rollback()
+                raise
+            self.connessione.commit()
+    
+    def migrazione_tabelle(self):
+        """Versione 1: tabelle utenti, partite (con le mosse) e record"""
         # Tabella utenti
         self.cursore.execute('''
             CREATE TABLE IF NOT EXISTS utenti (
@@ -52,10 +363,16 @@ class GestoreDatabase:
                 mine INTEGER NOT NULL,
                 dimensione TEXT NOT NULL,
                 data_partita TEXT DEFAULT CURRENT_TIMESTAMP,
+                mosse BLOB,
                 FOREIGN KEY (id_utente) REFERENCES utenti(id)
             )
         ''')
         
+        # Database creati prima della registrazione delle mosse
+        colonne_partite = [colonna[1] for colonna in self.cursore.execute("PRAGMA table_info(partite)")]
+        if 'mosse' not in colonne_partite:
+            self.cursore.execute('ALTER TABLE partite ADD COLUMN mosse BLOB')
+        
         # Tabella record (per la leaderboard)
         self.cursore.execute('''
             CREATE TABLE IF NOT EXISTS record (
@@ -68,9 +385,29 @@ class GestoreDatabase:
                 UNIQUE(id_utente, difficolta)
             )
         ''')
-        
-        self.connessione.commit()
     
+    def migrazione_indici(self):
+        """Versione 2: indici per storico e classifiche, che altrimenti scorrono e ordinano tutta la tabella"""
+        # Storico di un utente, dal più recente
+        self.cursore.execute('CREATE INDEX IF NOT EXISTS indice_partite_utente_data ON partite(id_utente, data_partita)')
+        # Classifica delle ultime partite
+        self.cursore.execute('CREATE INDEX IF NOT EXISTS indice_partite_data ON partite(data_partita)')
+        # Migliori tempi per difficoltà
+        self.cursore.execute('CREATE INDEX IF NOT EXISTS indice_record_difficolta_tempo ON record(difficolta, tempo)')
+        # Classifiche per vittorie e partite giocate
+        self.cursore.execute('CREATE INDEX IF NOT EXISTS indice_utenti_vinte ON utenti(partite_vinte)')
+        self.cursore.execute('CREATE INDEX IF NOT EXISTS indice_utenti_giocate ON utenti(partite_giocate)')
+    
+    def migrazione_indici_spareggio(self):
+        """Versione 3: le classifiche a pagine ordinano a parità di valore per id, così LIMIT/OFFSET
+        non ripete né salta righe. Gli altri indici finiscono già con il rowid; questi servono perché
+        id va in ordine crescente dopo un valore decrescente"""
+        self.cursore.execute('DROP INDEX IF EXISTS indice_utenti_vinte')
+        self.cursore.execute('DROP INDEX IF EXISTS indice_utenti_giocate')
+        self.cursore.execute('CREATE INDEX IF NOT EXISTS indice_utenti_vinte_id ON utenti(partite_vinte DESC, id)')
+        self.cursore.execute('CREATE INDEX IF NOT EXISTS indice_utenti_giocate_id ON utenti(partite_giocate DESC, id)')
+    
+    @con_ripetizioni
     def aggiungi_utente(self, username, password, domanda, risposta):
         """Aggiunge un nuovo utente al database"""
         password_hash = self._hash_password(password)
@@ -81,57 +418,62 @@ class GestoreDatabase:
                 VALUES (?, ?, ?, ?)
             ''', (username, password_hash, domanda, risposta_hash))
             self.connessione.commit()
+            # Il nuovo giocatore entra con zero partite nelle classifiche non piene
+            self.cache_classifiche.invalida('vittorie', valore=0)
+            self.cache_classifiche.invalida('partite', valore=0)
             return True
         except sqlite3.IntegrityError:
+            self.connessione.rollback()
             return False
 
     def verifica_risposta_sicurezza(self, username, risposta):
         """Verifica se la risposta di sicurezza è corretta"""
-        self.cursore.execute('''
+        self.lettore.execute('''
             SELECT risposta_sicurezza FROM utenti 
             WHERE username = ?
         ''', (username,))
-        risultato = self.cursore.fetchone()
+        risultato = self.lettore.fetchone()
         if risultato:
             return self._hash_password(risposta.lower()) == risultato[0]
         return False
 
     def ottieni_domanda_sicurezza(self, username):
         """Ottiene la domanda di sicurezza per un utente"""
-        self.cursore.execute('''
+        self.lettore.execute('''
             SELECT domanda_sicurezza FROM utenti 
             WHERE username = ?
         ''', (username,))
-        risultato = self.cursore.fetchone()
+        risultato = self.lettore.fetchone()
         return risultato[0] if risultato else None
 
     def verifica_utente(self, username, password):
         """Verifica le credenziali dell'utente"""
         password_hash = self._hash_password(password)
-        self.cursore.execute('''
+        self.lettore.execute('''
             SELECT id, password FROM utenti 
             WHERE username = ?
         ''', (username,))
-        risultato = self.cursore.fetchone()
+        risultato = self.lettore.fetchone()
         return (risultato[0], risultato[1] == password_hash) if risultato else (None, False)
     
     def utente_esiste(self, username):
         """Controlla se un utente esiste"""
-        self.cursore.execute('''
+        self.lettore.execute('''
             SELECT 1 FROM utenti 
             WHERE username = ?
         ''', (username,))
-        return self.cursore.fetchone() is not None
+        return self.lettore.fetchone() is not None
     
     def ottieni_tema_preferito(self, username):
         """Ottiene il tema preferito dell'utente"""
-        self.cursore.execute('''
+        self.lettore.execute('''
             SELECT tema_preferito FROM utenti 
             WHERE username = ?
         ''', (username,))
-        risultato = self.cursore.fetchone()
+        risultato = self.lettore.fetchone()
         return risultato[0] if risultato else 'Classic'
     
+    @con_ripetizioni
     def imposta_tema_preferito(self, username, tema):
         """Imposta il tema preferito per l'utente"""
         self.cursore.execute('''
@@ -141,118 +483,176 @@ class GestoreDatabase:
         ''', (tema, username))
         self.connessione.commit()
     
-    def aggiorna_statistiche(self, id_utente, username, vinto=False, tempo_impiegato=0, difficolta='facile', mine=10, dimensione='9x9'):
-        """Aggiorna le statistiche del giocatore e lo storico partite"""
-        # Aggiorna statistiche generali
+    @con_ripetizioni
+    def aggiorna_statistiche(self, id_utente, username, vinto=False, tempo_impiegato=0, difficolta='facile', mine=10, dimensione='9x9',
+                             mosse=None):
+        """Aggiorna le statistiche del giocatore e lo storico partite (mosse: registrazione codificata)
+        in un'unica transazione"""
+        parametri = {'id_utente': id_utente, 'vinto': int(vinto), 'tempo': tempo_impiegato, 'difficolta': difficolta}
+        if not self.gruppo_attivo:
+            # Il blocco in scrittura viene preso subito: niente conflitti a metà transazione
+            self.cursore.execute('BEGIN IMMEDIATE')
+        
+        # Statistiche generali e miglior tempo, con una sola istruzione per ogni difficoltà
         self.cursore.execute('''
-            UPDATE utenti 
-            SET partite_giocate = partite_giocate + 1 
-            WHERE id = ?
-        ''', (id_utente,))
-        
-        if vinto:
+            UPDATE utenti SET
+                partite_giocate = partite_giocate + 1,
+                partite_vinte = partite_vinte + :vinto,
+                miglior_tempo_facile = CASE
+                    WHEN :vinto AND :difficolta = 'facile' AND (miglior_tempo_facile = 0 OR :tempo < miglior_tempo_facile)
+                    THEN :tempo ELSE miglior_tempo_facile END,
+                miglior_tempo_medio = CASE
+                    WHEN :vinto AND :difficolta = 'medio' AND (miglior_tempo_medio = 0 OR :tempo < miglior_tempo_medio)
+                    THEN :tempo ELSE miglior_tempo_medio END,
+                miglior_tempo_difficile = CASE
+                    WHEN :vinto AND :difficolta = 'difficile' AND (miglior_tempo_difficile = 0 OR :tempo < miglior_tempo_difficile)
+                    THEN :tempo ELSE miglior_tempo_difficile END,
+                miglior_tempo_personalizzata = CASE
+                    WHEN :vinto AND :difficolta NOT IN ('facile', 'medio', 'difficile')
+                         AND (miglior_tempo_personalizzata = 0 OR :tempo < miglior_tempo_personalizzata)
+                    THEN :tempo ELSE miglior_tempo_personalizzata END
+            WHERE id = :id_utente
+        ''', parametri)
+        
+        # Il record cambia solo se il nuovo tempo è migliore
+        record_migliorato = False
+        if vinto and difficolta in ['facile', 'medio', 'difficile']:
             self.cursore.execute('''
-                UPDATE utenti 
-                SET partite_vinte = partite_vinte + 1 
-                WHERE id = ?
-            ''', (id_utente,))
-
-            if difficolta in ['facile', 'medio', 'difficile']:
-                colonna_tempo = f'miglior_tempo_{difficolta}'
-                self.cursore.execute(f'''
-                    UPDATE utenti 
-                    SET {colonna_tempo} = CASE 
-                        WHEN {colonna_tempo} = 0 OR ? < {colonna_tempo} THEN ? 
-                        ELSE {colonna_tempo} 
-                    END 
-                    WHERE id = ?
-                ''', (tempo_impiegato, tempo_impiegato, id_utente))
-                
-                self.cursore.execute('''
-                    INSERT OR REPLACE INTO record (id_utente, difficolta, tempo)
-                    VALUES (?, ?, ?)
-                ''', (id_utente, difficolta, tempo_impiegato))
-
-            else:
-                self.cursore.execute('''
-                UPDATE utenti 
-                SET miglior_tempo_personalizzata = CASE 
-                    WHEN miglior_tempo_personalizzata = 0 OR ? < miglior_tempo_personalizzata THEN ? 
-                    ELSE miglior_tempo_personalizzata 
-                END 
-                WHERE id = ?
-            ''', (tempo_impiegato, tempo_impiegato, id_utente))
+                INSERT INTO record (id_utente, difficolta, tempo)
+                VALUES (:id_utente, :difficolta, :tempo)
+                ON CONFLICT (id_utente, difficolta) DO UPDATE
+                    SET tempo = excluded.tempo, data_record = CURRENT_TIMESTAMP
+                    WHERE excluded.tempo < record.tempo
+            ''', parametri)
+            record_migliorato = self.cursore.rowcount > 0
         
         # Aggiungi partita allo storico
         esito = 'vittoria' if vinto else 'sconfitta'
         self.cursore.execute('''
-            INSERT INTO partite (id_utente, difficolta, esito, tempo, mine, dimensione)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (id_utente, difficolta, esito, tempo_impiegato, mine, dimensione))
+            INSERT INTO partite (id_utente, difficolta, esito, tempo, mine, dimensione, mosse)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (id_utente, difficolta, esito, tempo_impiegato, mine, dimensione, mosse))
+        
+        # Classifiche che questa partita può aver cambiato, da invalidare a commit avvenuto
+        partite_giocate, partite_vinte = self.cursore.execute(
+            'SELECT partite_giocate, partite_vinte FROM utenti WHERE id = ?', (id_utente,)).fetchone()
+        invalidazioni = [('recente', None, None), ('partite', None, partite_giocate)]
+        if vinto:
+            invalidazioni.append(('vittorie', None, partite_vinte))
+        if record_migliorato:
+            invalidazioni.append(('tempo', difficolta, tempo_impiegato))
         
-        self.connessione.commit()
+        if self.gruppo_attivo:
+            self.gruppo.invalidazioni.extend(invalidazioni)
+        else:
+            self.connessione.commit()
+            for invalidazione in invalidazioni:
+                self.cache_classifiche.invalida(*invalidazione)
+    
+    @con_ripetizioni
+    def inizia_gruppo(self):
+        self.cursore.execute('BEGIN IMMEDIATE')
+    
+    @contextmanager
+    def gruppo_scritture(self):
+        """Raccoglie tutte le aggiorna_statistiche del blocco in una sola transazione, con un solo
+        commit: per importazioni e simulazioni che salvano molte partite di seguito"""
+        self.inizia_gruppo()
+        self.gruppo.invalidazioni = []
+        try:
+            yield self
+        except BaseException:
+            self.connessione.rollback()
+            raise
+        else:
+            self.connessione.commit()
+            for invalidazione in self.gruppo.invalidazioni:
+                self.cache_classifiche.invalida(*invalidazione)
+        finally:
+            self.gruppo.invalidazioni = None
 
     def ottieni_statistiche(self, username):
         """Ottiene le statistiche dell'utente"""
-        self.cursore.execute('''
+        self.lettore.execute('''
         SELECT partite_giocate, partite_vinte, 
                miglior_tempo_facile, miglior_tempo_medio, miglior_tempo_difficile,
                miglior_tempo_personalizzata 
             FROM utenti 
             WHERE username = ?
         ''', (username,))
-        return self.cursore.fetchone()
-        
-    def ottieni_leaderboard(self, tipo='tempo', difficolta='facile', limite=10):
-        """Ottiene la classifica in base al tipo e difficoltà"""
+        return self.lettore.fetchone()
+        
+    def ottieni_leaderboard(self, tipo='tempo', difficolta='facile', limite=10, offset=0):
+        """Ottiene la classifica in base al tipo e difficoltà (a partire dalla posizione offset)"""
+        cache = self.cache_classifiche
+        chiave = (tipo, difficolta if tipo == 'tempo' else None, limite, offset)
+        righe = cache.leggi(chiave)
+        if righe is None:
+            generazione = cache.generazione
+            righe = self.leggi_leaderboard(tipo, difficolta, limite, offset)
+            cache.scrivi(chiave, righe, generazione)
+        return righe
+    
+    def leggi_leaderboard(self, tipo, difficolta, limite, offset):
+        """Legge la classifica dal database, senza passare dalla cache"""
         if tipo == 'tempo':
             query = '''
                 SELECT u.username, r.tempo, r.data_record 
                 FROM record r
                 JOIN utenti u ON r.id_utente = u.id
                 WHERE r.difficolta = ?
-                ORDER BY r.tempo ASC
-                LIMIT ?
+                ORDER BY r.tempo ASC, r.id ASC
+                LIMIT ? OFFSET ?
             '''
-            return self.cursore.execute(query, (difficolta, limite)).fetchall()
+            return self.lettore.execute(query, (difficolta, limite, offset)).fetchall()
         elif tipo == 'vittorie':
             query = '''
                 SELECT username, partite_vinte 
                 FROM utenti
-                ORDER BY partite_vinte DESC
-                LIMIT ?
+                ORDER BY partite_vinte DESC, id ASC
+                LIMIT ? OFFSET ?
             '''
-            return self.cursore.execute(query, (limite,)).fetchall()
+            return self.lettore.execute(query, (limite, offset)).fetchall()
         elif tipo == 'partite':
             query = '''
                 SELECT username, partite_giocate 
                 FROM utenti
-                ORDER BY partite_giocate DESC
-                LIMIT ?
+                ORDER BY partite_giocate DESC, id ASC
+                LIMIT ? OFFSET ?
             '''
-            return self.cursore.execute(query, (limite,)).fetchall()
+            return self.lettore.execute(query, (limite, offset)).fetchall()
         elif tipo == 'recente':
             query = '''
                 SELECT u.username, p.difficolta, p.esito, p.tempo, p.data_partita
                 FROM partite p
                 JOIN utenti u ON p.id_utente = u.id
-                ORDER BY p.data_partita DESC
-                LIMIT ?
+                ORDER BY p.data_partita DESC, p.id DESC
+                LIMIT ? OFFSET ?
             '''
-            return self.cursore.execute(query, (limite,)).fetchall()
+            return self.lettore.execute(query, (limite, offset)).fetchall()
     
-    def ottieni_storico_utente(self, username, limite=10):
-        """Ottiene lo storico delle partite di un utente"""
+    def ottieni_storico_utente(self, username, limite=10, offset=0):
+        """Ottiene lo storico delle partite di un utente (saltando le prime offset)"""
         query = '''
             SELECT difficolta, esito, tempo, mine, dimensione, data_partita 
             FROM partite p
             JOIN utenti u ON p.id_utente = u.id
             WHERE u.username = ?
-            ORDER BY p.data_partita DESC
-            LIMIT ?
+            ORDER BY p.data_partita DESC, p.id DESC
+            LIMIT ? OFFSET ?
+
         '''
-        return self.cursore.execute(query, (username, limite)).fetchall()
+        return self.lettore.execute(query, (username, limite, offset)).fetchall()
     
+    def ottieni_registrazione(self, id_partita):
+        """Registrazione delle mosse di una partita (None per le partite salvate senza)"""
+        self.lettore.execute('SELECT mosse FROM partite WHERE id = ?', (id_partita,))
+        risultato = self.lettore.fetchone()
+        if risultato is None or risultato[0] is None:
+            return None
+        return RegistrazionePartita.decodifica(risultato[0])
+    
+    @con_ripetizioni
     def reimposta_password(self, username, nuova_password):
         """Reimposta la password per un utente"""
         password_hash = self._hash_password(nuova_password)
@@ -264,7 +664,10 @@ class GestoreDatabase:
             ''', (password_hash, username))
             self.connessione.commit()
             return self.cursore.rowcount > 0
-        except sqlite3.Error:
+        except sqlite3.Error as errore:
+            self.connessione.rollback()
+            if database_bloccato(errore):
+                raise
             return False
 
     def _hash_password(self, password):
@@ -272,16 +675,92 @@ class GestoreDatabase:
         return hashlib.sha256(password.encode()).hexdigest()
     
     def chiudi(self):
-        """Chiude la connessione al database"""
-        self.connessione.close()
+        """Chiude le connessioni al database di tutti i thread (dopo aver completato le scritture in coda)"""
+        if self.scrittore is not None:
+            self.scrittore.chiudi()
+            self.scrittore = None
+        self.connessioni.chiudi()
+
+
+class ScrittoreDatabase:
+    """Esegue in un thread dedicato, con la connessione di quel thread, i metodi di scrittura di
+    GestoreDatabase: così commit e fsync non bloccano l'interfaccia a fine partita"""
+    def __init__(self, db, dimensione_coda=SCRITTURE_IN_CODA_MASSIME):
+        self.db = db
+        self.coda = queue.Queue(maxsize=dimensione_coda)
+        # Callback delle scritture terminate, da chiamare nel thread di Tk
+        self.completate = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.esegui, name='scrittore-db', daemon=True)
+        self.thread.start()
+    
+    def esegui(self):
+        db = self.db
+        try:
+            while True:
+                lavoro = self.coda.get()
+                if lavoro is None:
+                    self.coda.task_done()
+                    break
+                metodo, args, kwargs, al_termine = lavoro
+                risultato, errore = None, None
+                try:
+                    risultato = getattr(db, metodo)(*args, **kwargs)
+                except Exception as e:
+                    # Qualunque errore va alla callback: il thread deve restare vivo per le altre scritture
+                    log.exception("Scrittura %s non riuscita", metodo)
+                    if db.connessione.in_transaction:
+                        db.connessione.rollback()
+                    errore = e
+                finally:
+                    if al_termine is not None:
+                        self.completate.put((al_termine, risultato, errore))
+                    self.coda.task_done()
+        finally:
+            db.connessioni.chiudi_thread()
+    
+    def accoda(self, metodo, *args, al_termine=None, **kwargs):
+        """Accoda db.metodo(*args, **kwargs); al_termine(risultato, errore) arriverà da consegna_completate"""
+        self.coda.put((metodo, args, kwargs, al_termine))
+    
+    def in_sospeso(self):
+        return self.coda.unfinished_tasks > 0 or not self.completate.empty()
+    
+    def consegna_completate(self):
+        """Da chiamare nel thread di Tk (con root.after): esegue le callback delle scritture finite"""
+        while not self.completate.empty():
+            al_termine, risultato, errore = self.completate.get()
+            al_termine(risultato, errore)
+    
+    def svuota(self, attesa_massima=ATTESA_MASSIMA_SCRITTURE):
+        """Attende che tutte le scritture in coda siano salvate, scartando le callback:
+        si usa quando la finestra che le aspettava viene chiusa. False se il tempo è scaduto prima"""
+        scadenza = time.monotonic() + attesa_massima
+        with self.coda.all_tasks_done:
+            while self.coda.unfinished_tasks:
+                rimanente = scadenza - time.monotonic()
+                if rimanente <= 0:
+                    log.warning("%d scritture ancora in coda dopo %s secondi", self.coda.unfinished_tasks, attesa_massima)
+                    return False
+                self.coda.all_tasks_done.wait(rimanente)
+        while not self.completate.empty():
+            self.completate.get()
+        return True
+    
+    def chiudi(self, attesa_massima=ATTESA_MASSIMA_SCRITTURE):
+        try:
+            self.coda.put(None, timeout=attesa_massima)
+        except queue.Full:
+            log.warning("Thread del database ancora occupato: chiusura senza attenderlo")
+            return
+        self.thread.join(attesa_massima)
 
 class FinestraLogin:
-    """Finestra di login/registrazione"""
-    def __init__(self, gestore_db):
+    """Finestra di login/registrazione, costruita nella finestra principale del gioco"""
+    def __init__(self, root, gestore_db):
         self.db = gestore_db
         self.utente_corrente = None
         
-        self.root = tk.Tk()
+        self.root = root
         self.root.title("Campo Minato - Login")
         self.root.geometry("350x250")
         self.root.resizable(False, False)
@@ -332,7 +811,15 @@ class FinestraLogin:
         self.etichetta_risposta = ttk.Label(self.frame, text="Risposta sicurezza:")
         self.campo_risposta = ttk.Entry(self.frame, show="*")
         
+        # Chiudere la finestra del login termina il gioco
+        self.root.protocol("WM_DELETE_WINDOW", self.root.quit)
+    
+    def esegui(self):
+        """Attende il login e restituisce l'utente (None se la finestra è stata chiusa)"""
         self.root.mainloop()
+        for figlio in self.root.winfo_children():
+            figlio.destroy()
+        return self.utente_corrente
 
     def centra_finestra(self):
         self.root.update_idletasks()
@@ -353,7 +840,7 @@ class FinestraLogin:
         id_utente, credenziali_valide = self.db.verifica_utente(username, password)
         if credenziali_valide:
             self.utente_corrente = username
-            self.root.destroy()
+            self.root.quit()
         else:
             messagebox.showerror("Errore", "Username o password errati!")
     
@@ -609,259 +1096,803 @@ class FinestraLogin:
         tk.Button(finestra_recupero, text="Reimposta", command=applica_cambi).pack(pady=10)
         self.centra_finestra(finestra_recupero)
 
-class ModelloCampoMinato:
-    """Gestisce la logica del gioco"""
-    def __init__(self):
-        self.righe = 9
-        self.colonne = 9
-        self.mine = 10
-        self.difficolta = 'facile'
-        self.reset_gioco()
+# Stile di una cella già risolto per il tema corrente
+Stile = namedtuple('Stile', ['sfondo', 'testo', 'colore_testo', 'rilievo', 'stato', 'bordo'])
+
+
+def compila_stili(tema):
+    """Traduce un tema nella tabella degli stili di cella.
+
+    Le chiavi sono 'coperta', 'bandierina', 'mina', 'bandierina_errata' e il
+    numero di mine adiacenti (0-8) per le celle scoperte.
+    """
+    def stile(sfondo, testo='', colore_testo=tema['testo_colore'], rilievo=tk.RAISED, stato='normal'):
+        return Stile(tema[sfondo], testo, colore_testo, rilievo, stato, tema['pulsante_sfondo'])
     
-    def reset_gioco(self):
-        self.gioco_iniziato = False
-        self.gioco_finito = False
-        self.primo_click = True
-        self.bandierine_piazzate = 0
-        self.tempo_inizio = 0
-        self.posizioni_mine = set()
-        self.mine_adiacenti = {}
-        self.celle_scoperte = set()
-        self.celle_segnate = set()
+    stili = {
+        'coperta': stile('cella_sfondo'),
+        'bandierina': stile('bandierina_sfondo', '🚩'),
+        'mina': stile('mina_sfondo', '💣', stato='disabled'),
+        'bandierina_errata': stile('bandierina_corretta_sfondo', '🚩', stato='disabled'),
+        0: stile('scoperta_sfondo', rilievo=tk.SUNKEN, stato='disabled'),
+    }
+    for numero, colore in tema['colori_numeri'].items():
+        stili[numero] = stile('scoperta_sfondo', str(numero), colore, tk.SUNKEN, 'disabled')
+    return stili
+
+
+class GrigliaPulsanti:
+    """Disegna la griglia con un tk.Button per cella.
+
+    I pulsanti sopravvivono tra una partita e l'altra: al reset si
+    ripristinano solo le celle modificate e, se cambia la dimensione,
+    si aggiungono o tolgono solo le righe e colonne di differenza.
+    Per ogni cella si ricorda l'ultimo stile applicato, così un config
+    parte solo quando lo stile cambia davvero.
+    """
+    def __init__(self, vista):
+        self.vista = vista
+        self.pulsanti = {}
+        self.righe = self.colonne = 0
+        # Celle non coperte: chiave dello stile e stile applicato (None se colorata a parte)
+        self.chiavi = {}
+        self.stili_applicati = {}
+        self.imposta_stili(vista.stili_correnti)
+        self.frame = tk.Frame(vista.root, bg=vista.temi[vista.tema_corrente]['sfondo'])
+        self.frame.pack(padx=10, pady=10)
     
-    def imposta_difficolta(self, difficolta):
-        self.difficolta = difficolta
-        if difficolta == 'facile':
-            self.righe, self.colonne, self.mine = 9, 9, 10
-        elif difficolta == 'medio':
-            self.righe, self.colonne, self.mine = 16, 16, 40
-        elif difficolta == 'difficile':
-            self.righe, self.colonne, self.mine = 16, 30, 99
-    
-    def piazza_mine(self, riga_sicura, colonna_sicura):
-        zona_sicura = set()
-        
-        for r in range(max(0, riga_sicura-1), min(self.righe, riga_sicura+2)):
-            for c in range(max(0, colonna_sicura-1), min(self.colonne, colonna_sicura+2)):
-                zona_sicura.add((r, c))
-        
-        posizioni_possibili = [
-            (r, c) for r in range(self.righe) 
-            for c in range(self.colonne) 
-            if (r, c) not in zona_sicura
+    def imposta_stili(self, stili):
+        self.stili = stili
+        self.opzioni = {
+            chiave: {'bg': stile.sfondo, 'activebackground': stile.sfondo, 'text': stile.testo,
+                     'fg': stile.colore_testo, 'disabledforeground': stile.colore_testo,
+                     'relief': stile.rilievo, 'state': stile.stato, 'highlightbackground': stile.bordo}
+            for chiave, stile in stili.items()
+        }
+    
+    def ridimensiona(self, righe, colonne):
+        for cella in [cella for cella in self.pulsanti if cella[0] >= righe or cella[1] >= colonne]:
+            self.pulsanti.pop(cella).destroy()
+            self.chiavi.pop(cella, None)
+            self.stili_applicati.pop(cella, None)
+        
+        for riga in range(righe):
+            # Nelle righe già presenti mancano solo le colonne nuove
+            for colonna in range(self.colonne if riga < self.righe else 0, colonne):
+                self.crea_pulsante(riga, colonna)
+        self.righe, self.colonne = righe, colonne
+    
+    def crea_pulsante(self, riga, colonna):
+        controller = self.vista.controller
+        pulsante = tk.Button(self.frame, width=2, height=1, font=('Arial', 9, 'bold'), bd=1,
+                             **self.opzioni['coperta'])
+        pulsante.grid(row=riga, column=colonna)
+        
+        pulsante.bind('<Button-1>', partial(controller.click_sinistro, riga, colonna))
+        pulsante.bind('<ButtonRelease-1>', partial(self.vista.rilascio_pulsante, riga, colonna))
+        pulsante.bind('<Button-3>', partial(controller.click_destro, riga, colonna))
+        pulsante.bind('<Button-2>', partial(controller.click_centrale, riga, colonna))
+        pulsante.bind('<B1-Motion>', partial(self.vista.trascinamento_pulsante, riga, colonna))
+        
+        self.pulsanti[(riga, colonna)] = pulsante
+    
+    def pulisci(self):
+        """Riporta allo stato iniziale le sole celle cambiate durante la partita"""
+        for cella in self.stili_applicati:
+            self.pulsanti[cella].config(**self.opzioni['coperta'])
+        self.chiavi.clear()
+        self.stili_applicati.clear()
+    
+    def distruggi(self):
+        self.frame.destroy()
+    
+    def esiste(self):
+        return self.frame.winfo_exists()
+    
+    def applica_tema(self, tema, stili):
+        self.frame.config(bg=tema['sfondo'])
+        coperta_precedente = self.stili['coperta']
+        self.imposta_stili(stili)
+        if stili['coperta'] != coperta_precedente:
+            celle = self.pulsanti
+        else:
+            celle = list(self.stili_applicati)
+        for cella in celle:
+            chiave = self.chiavi.get(cella, 'coperta')
+            if self.stili_applicati.get(cella, coperta_precedente) != stili[chiave]:
+                self.pulsanti[cella].config(**self.opzioni[chiave])
+            self.registra(cella, chiave)
+    
+    def applica_stile(self, riga, colonna, chiave):
+        cella = (riga, colonna)
+        if self.stili_applicati.get(cella, self.stili['coperta']) != self.stili[chiave]:
+            self.pulsanti[cella].config(**self.opzioni[chiave])
+        self.registra(cella, chiave)
+    
+    def registra(self, cella, chiave):
+        # Si tengono solo le celle diverse da una cella coperta
+        if chiave == 'coperta':
+            self.chiavi.pop(cella, None)
+            self.stili_applicati.pop(cella, None)
+        else:
+            self.chiavi[cella] = chiave
+            self.stili_applicati[cella] = self.stili[chiave]
+    
+    def colora_cella(self, riga, colonna, colore):
+        self.stili_applicati[(riga, colonna)] = None
+        self.pulsanti[(riga, colonna)].config(bg=colore)
+    
+    def premi_cella(self, riga, colonna, premuta):
+        self.stili_applicati[(riga, colonna)] = None
+        self.pulsanti[(riga, colonna)].config(relief=tk.SUNKEN if premuta else tk.RAISED)
+
+
+class GrigliaCanvas:
+    """Disegna la griglia su un unico tk.Canvas.
+
+    Ogni cella è un rettangolo; il testo viene creato solo per le celle che
+    ne hanno uno. Un aggiornamento tocca solo gli elementi della cella
+    interessata e Tk ridisegna soltanto l'area modificata. Al reset vengono
+    ripristinate solo le celle cambiate; gli elementi vanno ricreati solo
+    se cambia la dimensione, perché sono indicizzati per indice piatto.
+    """
+    LATO = 24
+    
+    def __init__(self, vista):
+        self.vista = vista
+        self.righe = self.colonne = 0
+        self.rettangoli = []
+        self.testi = {}
+        # Celle non coperte, per indice piatto: chiave dello stile e stile applicato (None se colorata a parte)
+        self.chiavi = {}
+        self.stili_applicati = {}
+        self.stili = vista.stili_correnti
+        self.premuta = None
+        self.sfondo = vista.temi[vista.tema_corrente]['sfondo']
+        self.canvas = tk.Canvas(vista.root, bg=self.sfondo, highlightthickness=0, bd=0)
+        self.canvas.pack(padx=10, pady=10)
+        
+        controller = vista.controller
+        self.canvas.bind('<Button-1>', self.pressione)
+        self.canvas.bind('<ButtonRelease-1>', self.rilascio)
+        self.canvas.bind('<B1-Motion>', self.trascinamento)
+        self.canvas.bind('<Button-3>', partial(self.inoltra, controller.click_destro))
+        self.canvas.bind('<Button-2>', partial(self.inoltra, controller.click_centrale))
+    
+    def ridimensiona(self, righe, colonne):
+        if (righe, colonne) == (self.righe, self.colonne):
+            return
+        self.canvas.delete('all')
+        self.testi = {}
+        self.chiavi = {}
+        self.stili_applicati = {}
+        self.premuta = None
+        self.righe, self.colonne = righe, colonne
+        lato = self.LATO
+        self.canvas.config(width=colonne * lato, height=righe * lato)
+        crea_rettangolo = self.canvas.create_rectangle
+        sfondo = self.stili['coperta'].sfondo
+        self.rettangoli = [
+            crea_rettangolo(colonna * lato, riga * lato, (colonna + 1) * lato - 1, (riga + 1) * lato - 1,
+                            fill=sfondo, outline=self.sfondo, tags='cella')
+            for riga in range(righe) for colonna in range(colonne)
         ]
-        
-        self.posizioni_mine = set(random.sample(posizioni_possibili, self.mine))
-        self.calcola_mine_adiacenti()
     
-    def calcola_mine_adiacenti(self):
-        self.mine_adiacenti = {}
-        
-        for riga in range(self.righe):
-            for colonna in range(self.colonne):
-                if (riga, colonna) in self.posizioni_mine:
-                    self.mine_adiacenti[(riga, colonna)] = -1
-                    continue
-                
-                conteggio = 0
-                for r in range(max(0, riga-1), min(self.righe, riga+2)):
-                    for c in range(max(0, colonna-1), min(self.colonne, colonna+2)):
-                        if (r, c) in self.posizioni_mine:
-                            conteggio += 1
-                self.mine_adiacenti[(riga, colonna)] = conteggio
-    
-    def scopri_cella(self, riga, colonna):
-        if (riga, colonna) in self.celle_scoperte or (riga, colonna) in self.celle_segnate:
-            return None
-        
-        if self.primo_click:
-            self.primo_click = False
-            self.gioco_iniziato = True
-            self.tempo_inizio = time.time()
-            self.piazza_mine(riga, colonna)
-        
-        self.celle_scoperte.add((riga, colonna))
-        
-        if (riga, colonna) in self.posizioni_mine:
-            self.gioco_finito = True
-            return 'mina'
-        
-        conteggio_mine = self.mine_adiacenti[(riga, colonna)]
-        
-        if conteggio_mine == 0:
-            return 'vuota'
-        return conteggio_mine
+    def pulisci(self):
+        """Riporta allo stato iniziale le sole celle cambiate durante la partita"""
+        for indice in self.stili_applicati:
+            self.disegna(indice, self.stili['coperta'])
+            self.canvas.itemconfig(self.rettangoli[indice], outline=self.sfondo)
+        self.chiavi.clear()
+        self.stili_applicati.clear()
+        self.premuta = None
     
-    def scopri_adiacenti(self, riga, colonna):
-        celle_da_scoprire = set()
-        self.scopri_adiacenti_ricorsivo(riga, colonna, celle_da_scoprire)
-        return celle_da_scoprire
+    def distruggi(self):
+        self.canvas.destroy()
     
-    def scopri_adiacenti_ricorsivo(self, riga, colonna, insieme_scoperte):
-        for r in range(max(0, riga-1), min(self.righe, riga+2)):
-            for c in range(max(0, colonna-1), min(self.colonne, colonna+2)):
-                if (r, c) != (riga, colonna) and (r, c) not in self.celle_scoperte and (r, c) not in self.celle_segnate:
-                    insieme_scoperte.add((r, c))
-                    self.celle_scoperte.add((r, c))
-                    if self.mine_adiacenti[(r, c)] == 0:
-                        self.scopri_adiacenti_ricorsivo(r, c, insieme_scoperte)
+    def esiste(self):
+        return self.canvas.winfo_exists()
     
-    def toggle_bandierina(self, riga, colonna):
-        if (riga, colonna) in self.celle_scoperte:
-            return False
-        
-        if (riga, colonna) in self.celle_segnate:
-            self.celle_segnate.remove((riga, colonna))
-            self.bandierine_piazzate -= 1
-            return 'rimossa'
+    def cella_da_evento(self, event):
+        riga = int(self.canvas.canvasy(event.y)) // self.LATO
+        colonna = int(self.canvas.canvasx(event.x)) // self.LATO
+        if 0 <= riga < self.righe and 0 <= colonna < self.colonne:
+            return riga, colonna
+        return None
+    
+    def inoltra(self, gestore, event):
+        cella = self.cella_da_evento(event)
+        if cella is not None:
+            gestore(*cella, event)
+    
+    def pressione(self, event):
+        cella = self.cella_da_evento(event)
+        if cella is None:
+            return
+        self.vista.controller.click_sinistro(*cella, event)
+        self.premuta = cella
+        self.vista.trascinamento_pulsante(*cella, event)
+    
+    def trascinamento(self, event):
+        cella = self.cella_da_evento(event)
+        if cella == self.premuta:
+            return
+        self.rilascio(event)
+        if cella is not None:
+            self.premuta = cella
+            self.vista.trascinamento_pulsante(*cella, event)
+    
+    def rilascio(self, event):
+        if self.premuta is not None:
+            self.vista.rilascio_pulsante(*self.premuta, event)
+            self.premuta = None
+    
+    def applica_tema(self, tema, stili):
+        coperta_precedente, self.stili = self.stili['coperta'], stili
+        if tema['sfondo'] != self.sfondo:
+            self.sfondo = tema['sfondo']
+            self.canvas.config(bg=self.sfondo)
+            self.canvas.itemconfig('cella', outline=self.sfondo)
+        if stili['coperta'] != coperta_precedente:
+            # Un solo comando per tutte le celle coperte; le altre vengono ridisegnate sotto
+            self.canvas.itemconfig('cella', fill=stili['coperta'].sfondo)
+            for indice in self.stili_applicati:
+                self.stili_applicati[indice] = None
+        for indice, stile in list(self.stili_applicati.items()):
+            chiave = self.chiavi.get(indice, 'coperta')
+            if stile != stili[chiave]:
+                self.disegna(indice, stili[chiave])
+            self.registra(indice, chiave)
+    
+    def applica_stile(self, riga, colonna, chiave):
+        indice = riga * self.colonne + colonna
+        if self.stili_applicati.get(indice, self.stili['coperta']) != self.stili[chiave]:
+            self.disegna(indice, self.stili[chiave])
+        self.registra(indice, chiave)
+    
+    def registra(self, indice, chiave):
+        # Si tengono solo le celle diverse da una cella coperta
+        if chiave == 'coperta':
+            self.chiavi.pop(indice, None)
+            self.stili_applicati.pop(indice, None)
         else:
-            self.celle_segnate.add((riga, colonna))
-            self.bandierine_piazzate += 1
-            return 'aggiunta'
-    
-    def controlla_vittoria(self):
-        for riga in range(self.righe):
-            for colonna in range(self.colonne):
-                if (riga, colonna) not in self.posizioni_mine and (riga, colonna) not in self.celle_scoperte:
-                    return False
-        self.gioco_finito = True
-        return True
+            self.chiavi[indice] = chiave
+            self.stili_applicati[indice] = self.stili[chiave]
+    
+    def disegna(self, indice, stile):
+        self.canvas.itemconfig(self.rettangoli[indice], fill=stile.sfondo)
+        id_testo = self.testi.get(indice)
+        if stile.testo:
+            if id_testo is None:
+                riga, colonna = divmod(indice, self.colonne)
+                self.testi[indice] = self.canvas.create_text(
+                    colonna * self.LATO + self.LATO // 2, riga * self.LATO + self.LATO // 2,
+                    text=stile.testo, fill=stile.colore_testo, font=('Arial', 9, 'bold'), tags='testo')
+            else:
+                self.canvas.itemconfig(id_testo, text=stile.testo, fill=stile.colore_testo)
+        elif id_testo is not None:
+            self.canvas.delete(id_testo)
+            del self.testi[indice]
+    
+    def colora_cella(self, riga, colonna, colore):
+        indice = riga * self.colonne + colonna
+        self.stili_applicati[indice] = None
+        self.canvas.itemconfig(self.rettangoli[indice], fill=colore)
+    
+    def premi_cella(self, riga, colonna, premuta):
+        indice = riga * self.colonne + colonna
+        self.stili_applicati[indice] = None
+        self.canvas.itemconfig(self.rettangoli[indice], outline=self.stili['coperta'].colore_testo
+                               if premuta else self.sfondo)
+
+
+class GrigliaVirtuale(GrigliaCanvas):
+    """Griglia su canvas che disegna solo le celle visibili.
+
+    Gli elementi del canvas sono un insieme fisso riusato a ogni
+    scorrimento, quindi il costo di un fotogramma dipende dalla finestra e
+    non dalla griglia. Lo stato delle celle viene letto dal modello; si
+    tengono a parte solo gli stati che il modello non conosce (mine
+    rivelate a fine partita, colori della mappa di probabilità). Supporta
+    barre di scorrimento, rotellina (Ctrl per lo zoom) e una minimappa.
+    Dalla griglia su canvas eredita la gestione del mouse.
+    """
+    LATO_MINIMO = 12
+    LATO_MASSIMO = 48
+    LARGHEZZA_MASSIMA = 900
+    ALTEZZA_MASSIMA = 600
+    MINIMAPPA = 160
+    
+    def __init__(self, vista):
+        self.vista = vista
+        self.stili = vista.stili_correnti
+        self.sfondo = vista.temi[vista.tema_corrente]['sfondo']
+        self.righe = self.colonne = 0
+        self.lato = self.LATO
+        self.font = None
+        # Origine della finestra visibile, in pixel della griglia intera
+        self.x0 = self.y0 = 0
+        self.finestra = (0, 0, 0, 0)
+        self.elementi = []
+        self.eccezioni = {}
+        self.colori = {}
+        # Colore delle celle coperte senza un colore proprio (mappa di probabilità), None: quello del tema
+        self.colore_coperte = None
+        self.premuta = None
+        self.cella_premuta = None
+        self.id_ridisegno = None
+        
+        self.frame = tk.Frame(vista.root, bg=self.sfondo)
+        self.frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(self.frame, bg=self.sfondo, highlightthickness=0, bd=0)
+        self.barra_x = ttk.Scrollbar(self.frame, orient=tk.HORIZONTAL, command=partial(self.scorri, 'x'))
+        self.barra_y = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=partial(self.scorri, 'y'))
+        self.minimappa = tk.Canvas(self.frame, highlightthickness=1, bd=0)
+        self.immagine = tk.PhotoImage(width=1, height=1)
+        self.minimappa.create_image(0, 0, anchor='nw', image=self.immagine)
+        self.riquadro = self.minimappa.create_rectangle(0, 0, 0, 0, outline='red')
+        
+        self.canvas.grid(row=0, column=0, sticky='nsew')
+        self.barra_y.grid(row=0, column=1, sticky='ns')
+        self.barra_x.grid(row=1, column=0, sticky='ew')
+        self.minimappa.grid(row=0, column=2, sticky='n', padx=(10, 0))
+        self.frame.grid_rowconfigure(0, weight=1)
+        self.frame.grid_columnconfigure(0, weight=1)
+        
+        controller = vista.controller
+        self.canvas.bind('<Button-1>', self.pressione)
+        self.canvas.bind('<ButtonRelease-1>', self.rilascio)
+        self.canvas.bind('<B1-Motion>', self.trascinamento)
+        self.canvas.bind('<Button-3>', partial(self.inoltra, controller.click_destro))
+        self.canvas.bind('<Button-2>', partial(self.inoltra, controller.click_centrale))
+        self.canvas.bind('<Configure>', lambda e: self.richiedi_ridisegno())
+        # Rotellina: Windows e macOS usano <MouseWheel>, X11 i pulsanti 4 e 5
+        self.canvas.bind('<MouseWheel>', lambda e: self.rotellina(e, -e.delta))
+        self.canvas.bind('<Shift-MouseWheel>', lambda e: self.rotellina(e, -e.delta, 'x'))
+        self.canvas.bind('<Control-MouseWheel>', lambda e: self.zoom(e, e.delta))
+        self.canvas.bind('<Button-4>', lambda e: self.rotellina(e, -1))
+        self.canvas.bind('<Button-5>', lambda e: self.rotellina(e, 1))
+        self.canvas.bind('<Shift-Button-4>', lambda e: self.rotellina(e, -1, 'x'))
+        self.canvas.bind('<Shift-Button-5>', lambda e: self.rotellina(e, 1, 'x'))
+        self.canvas.bind('<Control-Button-4>', lambda e: self.zoom(e, 1))
+        self.canvas.bind('<Control-Button-5>', lambda e: self.zoom(e, -1))
+        self.minimappa.bind('<Button-1>', self.salta)
+        self.minimappa.bind('<B1-Motion>', self.salta)
+    
+    def ridimensiona(self, righe, colonne):
+        if (righe, colonne) != (self.righe, self.colonne):
+            self.righe, self.colonne = righe, colonne
+            self.x0 = self.y0 = 0
+            self.canvas.config(width=min(colonne * self.lato, self.LARGHEZZA_MASSIMA),
+                               height=min(righe * self.lato, self.ALTEZZA_MASSIMA))
+            lato_mappa = max(righe, colonne)
+            self.larghezza_mappa = max(1, colonne * self.MINIMAPPA // lato_mappa)
+            self.altezza_mappa = max(1, righe * self.MINIMAPPA // lato_mappa)
+            self.immagine.config(width=self.larghezza_mappa, height=self.altezza_mappa)
+            self.minimappa.config(width=self.larghezza_mappa, height=self.altezza_mappa)
+        # Le celle già scoperte, se ci sono, arrivano poi una per una dalla vista
+        self.riempi_minimappa()
+        self.richiedi_ridisegno()
+    
+    def pulisci(self):
+        self.eccezioni.clear()
+        self.colori.clear()
+        self.colore_coperte = None
+        self.premuta = self.cella_premuta = None
+        self.riempi_minimappa()
+        self.richiedi_ridisegno()
+    
+    def distruggi(self):
+        if self.id_ridisegno is not None:
+            self.vista.root.after_cancel(self.id_ridisegno)
+        self.frame.destroy()
+    
+    def esiste(self):
+        return self.frame.winfo_exists()
+    
+    def applica_tema(self, tema, stili):
+        self.stili = stili
+        self.sfondo = tema['sfondo']
+        self.frame.config(bg=self.sfondo)
+        self.canvas.config(bg=self.sfondo)
+        self.colori.clear()
+        self.colore_coperte = None
+        self.disegna_minimappa()
+        self.richiedi_ridisegno()
+    
+    def chiave_cella(self, riga, colonna):
+        indice = riga * self.colonne + colonna
+        if indice in self.eccezioni:
+            return self.eccezioni[indice]
+        modello = self.vista.controller.modello
+        if modello.cella_scoperta(riga, colonna):
+            conteggio_mine = modello.ottieni_mine_adiacenti(riga, colonna)
+            return 'mina' if conteggio_mine < 0 else conteggio_mine
+        if modello.cella_segnata(riga, colonna):
+            return 'bandierina'
+        return 'coperta'
+    
+    def applica_stile(self, riga, colonna, chiave):
+        indice = riga * self.colonne + colonna
+        self.eccezioni.pop(indice, None)
+        self.colori.pop(indice, None)
+        if chiave != self.chiave_cella(riga, colonna):
+            self.eccezioni[indice] = chiave
+        self.colora_minimappa(riga, colonna, self.stili[chiave].sfondo)
+        self.disegna_cella(riga, colonna)
+    
+    def colora_cella(self, riga, colonna, colore):
+        self.colori[riga * self.colonne + colonna] = colore
+        self.disegna_cella(riga, colonna)
+    
+    def colora_coperte(self, colore):
+        """Colora tutte le celle coperte senza un colore proprio: costa solo il ridisegno di quelle visibili"""
+        self.colore_coperte = colore
+        self.richiedi_ridisegno()
+    
+    def premi_cella(self, riga, colonna, premuta):
+        self.cella_premuta = (riga, colonna) if premuta else None
+        self.disegna_cella(riga, colonna)
+    
+    # Finestra visibile
+    
+    def richiedi_ridisegno(self):
+        """Gli eventi di scorrimento e zoom di un fotogramma producono un solo ridisegno"""
+        if self.id_ridisegno is None:
+            self.id_ridisegno = self.vista.root.after_idle(self.ridisegna)
+    
+    def ridisegna(self):
+        self.id_ridisegno = None
+        larghezza, altezza = self.canvas.winfo_width(), self.canvas.winfo_height()
+        lato = self.lato
+        self.x0 = max(0, min(self.x0, self.colonne * lato - larghezza))
+        self.y0 = max(0, min(self.y0, self.righe * lato - altezza))
+        
+        prima_riga, prima_colonna = self.y0 // lato, self.x0 // lato
+        ultima_riga = min(self.righe, (self.y0 + altezza) // lato + 1)
+        ultima_colonna = min(self.colonne, (self.x0 + larghezza) // lato + 1)
+        self.finestra = (prima_riga, prima_colonna, ultima_riga, ultima_colonna)
+        necessari = max(0, ultima_riga - prima_riga) * max(0, ultima_colonna - prima_colonna)
+        
+        # Il font cambia solo con lo zoom: si applica con un solo comando a tutti i testi,
+        # anche a quelli nascosti che torneranno in uso ingrandendo la finestra
+        font = ('Arial', max(6, lato * 9 // 24), 'bold')
+        if font != self.font:
+            self.font = font
+            self.canvas.itemconfig('testo', font=font)
+        while len(self.elementi) < necessari:
+            self.elementi.append((self.canvas.create_rectangle(0, 0, 0, 0),
+                                  self.canvas.create_text(0, 0, font=self.font, tags='testo')))
+        for rettangolo, testo in self.elementi[necessari:]:
+            self.canvas.itemconfig(rettangolo, state='hidden')
+            self.canvas.itemconfig(testo, state='hidden')
+        
+        for riga in range(prima_riga, ultima_riga):
+            for colonna in range(prima_colonna, ultima_colonna):
+                self.disegna_cella(riga, colonna)
+        self.aggiorna_barre()
+    
+    def disegna_cella(self, riga, colonna):
+        prima_riga, prima_colonna, ultima_riga, ultima_colonna = self.finestra
+        if not (prima_riga <= riga < ultima_riga and prima_colonna <= colonna < ultima_colonna):
+            return
+        rettangolo, testo = self.elementi[(riga - prima_riga) * (ultima_colonna - prima_colonna)
+                                          + colonna - prima_colonna]
+        chiave = self.chiave_cella(riga, colonna)
+        stile = self.stili[chiave]
+        sfondo = self.colore_coperte if chiave == 'coperta' and self.colore_coperte else stile.sfondo
+        x = colonna * self.lato - self.x0
+        y = riga * self.lato - self.y0
+        contorno = stile.colore_testo if (riga, colonna) == self.cella_premuta else self.sfondo
+        self.canvas.coords(rettangolo, x, y, x + self.lato - 1, y + self.lato - 1)
+        self.canvas.itemconfig(rettangolo, state='normal', outline=contorno,
+                               fill=self.colori.get(riga * self.colonne + colonna, sfondo))
+        self.canvas.coords(testo, x + self.lato // 2, y + self.lato // 2)
+        self.canvas.itemconfig(testo, state='normal', text=stile.testo, fill=stile.colore_testo)
+
+    
+    def aggiorna_barre(self):
+        larghezza, altezza = self.canvas.winfo_width(), self.canvas.winfo_height()
+        totale_x = max(1, self.colonne * self.lato)
+        totale_y = max(1, self.righe * self.lato)
+        self.barra_x.set(self.x0 / totale_x, min(1, (self.x0 + larghezza) / totale_x))
+        self.barra_y.set(self.y0 / totale_y, min(1, (self.y0 + altezza) / totale_y))
+        scala_x = self.larghezza_mappa / totale_x
+        scala_y = self.altezza_mappa / totale_y
+        self.minimappa.coords(self.riquadro, self.x0 * scala_x, self.y0 * scala_y,
+                              (self.x0 + larghezza) * scala_x, (self.y0 + altezza) * scala_y)
+    
+    def scorri(self, asse, azione, quantita, unita=None):
+        """Comando delle barre di scorrimento ('moveto' frazione oppure 'scroll' n units/pages)"""
+        dimensione = self.canvas.winfo_width() if asse == 'x' else self.canvas.winfo_height()
+        totale = (self.colonne if asse == 'x' else self.righe) * self.lato
+        if azione == 'moveto':
+            posizione = float(quantita) * totale
+        else:
+            passo = dimensione if unita == 'pages' else self.lato
+            posizione = (self.x0 if asse == 'x' else self.y0) + int(quantita) * passo
+        if asse == 'x':
+            self.x0 = int(posizione)
+        else:
+            self.y0 = int(posizione)
+        self.richiedi_ridisegno()
     
-    def ottieni_tempo_gioco(self):
-        if not self.gioco_iniziato:
-            return 0
-        if self.gioco_finito:
-            return self.tempo_fine - self.tempo_inizio
-        return time.time() - self.tempo_inizio
+    def rotellina(self, event, verso, asse='y'):
+        self.scorri(asse, 'scroll', 3 if verso > 0 else -3, 'units')
     
-    def gioco_perso(self):
-        self.gioco_finito = True
-        self.tempo_fine = time.time()
+    def zoom(self, event, verso):
+        """Cambia la dimensione delle celle tenendo ferma la cella sotto il puntatore"""
+        lato = self.lato * 5 // 4 if verso > 0 else self.lato * 4 // 5
+        lato = max(self.LATO_MINIMO, min(self.LATO_MASSIMO, lato))
+        if lato == self.lato:
+            return
+        self.x0 = (self.x0 + event.x) * lato // self.lato - event.x
+        self.y0 = (self.y0 + event.y) * lato // self.lato - event.y
+        self.lato = lato
+        self.richiedi_ridisegno()
+    
+    # Minimappa
+    
+    def riempi_minimappa(self):
+        self.immagine.put(self.stili['coperta'].sfondo, to=(0, 0, self.larghezza_mappa, self.altezza_mappa))
+    
+    def disegna_minimappa(self):
+        if not self.righe or not self.colonne:
+            return
+        righe_mappa = []
+        for y in range(self.altezza_mappa):
+            riga = y * self.righe // self.altezza_mappa
+            righe_mappa.append('{' + ' '.join(
+                self.stili[self.chiave_cella(riga, x * self.colonne // self.larghezza_mappa)].sfondo
+                for x in range(self.larghezza_mappa)) + '}')
+        self.immagine.put(' '.join(righe_mappa))
+    
+    def colora_minimappa(self, riga, colonna, colore):
+        x = colonna * self.larghezza_mappa // self.colonne
+        y = riga * self.altezza_mappa // self.righe
+        self.immagine.put(colore, to=(x, y, max(x + 1, (colonna + 1) * self.larghezza_mappa // self.colonne),
+                                      max(y + 1, (riga + 1) * self.altezza_mappa // self.righe)))
     
-    def gioco_vinto(self):
-        self.gioco_finito = True
-        self.tempo_fine = time.time()
+    def salta(self, event):
+        """Centra la finestra visibile sul punto cliccato della minimappa"""
+        self.x0 = int(event.x / self.larghezza_mappa * self.colonne * self.lato) - self.canvas.winfo_width() // 2
+        self.y0 = int(event.y / self.altezza_mappa * self.righe * self.lato) - self.canvas.winfo_height() // 2
+        self.richiedi_ridisegno()
+    
+    # Eventi del mouse
+    
+    def cella_da_evento(self, event):
+        riga = (event.y + self.y0) // self.lato
+        colonna = (event.x + self.x0) // self.lato
+        if 0 <= riga < self.righe and 0 <= colonna < self.colonne:
+            return riga, colonna
+        return None
+
+
+# Modi di disegnare la griglia selezionabili dalla vista
+GRIGLIE = {
+    'pulsanti': GrigliaPulsanti,
+    'canvas': GrigliaCanvas,
+    'virtuale': GrigliaVirtuale,
+}
+
+
+class TabellaPaginata:
+    """Riempie un Treeview a pagine: le righe vengono lette e formattate solo quando lo
+    scorrimento si avvicina a un bordo, e ne restano in memoria al massimo righe_massime"""
+    def __init__(self, tree, scrollbar, carica, formatta, dimensione_pagina=RIGHE_PAGINA,
+                 righe_massime=RIGHE_RESIDENTI_MASSIME):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.carica = carica          # carica(offset, limite) -> righe del database
+        self.formatta = formatta      # formatta(posizione, riga) -> valori per il Treeview
+        self.dimensione_pagina = dimensione_pagina
+        # Con meno di tre pagine i caricamenti ai due bordi si inseguirebbero
+        self.righe_massime = max(righe_massime, 3 * dimensione_pagina)
+        self.inizio = 0               # Posizione nella query della prima riga presente
+        self.fine_raggiunta = False
+        self.id_controllo = None
+        
+        tree.configure(yscrollcommand=self.scorrimento)
+        scrollbar.configure(command=tree.yview)
+        self.carica_successiva(0)
+    
+    def scorrimento(self, primo, ultimo):
+        self.scrollbar.set(primo, ultimo)
+        # Tk chiama questa funzione anche durante gli insert: si controlla a inserimenti finiti
+        if self.id_controllo is None:
+            self.id_controllo = self.tree.after_idle(self.controlla_bordi)
+    
+    def controlla_bordi(self):
+        self.id_controllo = None
+        if not self.tree.winfo_exists():
+            return
+        primo, ultimo = (float(valore) for valore in self.tree.yview())
+        prima_visibile = round(primo * len(self.tree.get_children()))
+        if ultimo >= 0.9 and not self.fine_raggiunta:
+            self.carica_successiva(prima_visibile)
+        elif primo <= 0.1 and self.inizio > 0:
+            self.carica_precedente(prima_visibile)
+    
+    def carica_successiva(self, prima_visibile):
+        righe = self.tree.get_children()
+        offset = self.inizio + len(righe)
+        nuove = self.carica(offset, self.dimensione_pagina)
+        if len(nuove) < self.dimensione_pagina:
+            self.fine_raggiunta = True
+        for i, riga in enumerate(nuove):
+            self.tree.insert('', 'end', values=self.formatta(offset + i, riga))
+        
+        eccesso = len(righe) + len(nuove) - self.righe_massime
+        if eccesso > 0:
+            self.tree.delete(*righe[:eccesso])
+            self.inizio += eccesso
+            self.mostra_da(prima_visibile - eccesso)
+    
+    def carica_precedente(self, prima_visibile):
+        quante = min(self.dimensione_pagina, self.inizio)
+        self.inizio -= quante
+        nuove = self.carica(self.inizio, quante)
+        for i, riga in enumerate(nuove):
+            self.tree.insert('', i, values=self.formatta(self.inizio + i, riga))
+        
+        righe = self.tree.get_children()
+        eccesso = len(righe) - self.righe_massime
+        if eccesso > 0:
+            self.tree.delete(*righe[-eccesso:])
+            self.fine_raggiunta = False
+        self.mostra_da(prima_visibile + len(nuove))
+    
+    def mostra_da(self, indice):
+        """Riporta in cima la riga che era visibile prima di aggiungere o togliere righe"""
+        totale = len(self.tree.get_children())
+        if totale:
+            self.tree.yview_moveto(max(0, indice) / totale)
+
+
+# Temi grafici selezionabili dal menu Tema
+TEMI = {
+    "Classic": {
+        'sfondo': '#f0f0f0',
+        'cella_sfondo': '#e0e0e0',
+        'scoperta_sfondo': '#d0d0d0',
+        'bandierina_sfondo': '#ffcccc',
+        'bandierina_corretta_sfondo': '#99ff99',
+        'mina_sfondo': '#ff9999',
+        'testo_colore': 'black',
+        'colori_numeri': {
+            1: 'blue',
+            2: 'green',
+            3: 'red',
+            4: 'navy',
+            5: 'brown',
+            6: 'teal',
+            7: 'black',
+            8: 'gray'
+        },
+        'pulsante_sfondo': '#e0e0e0',
+        'controlli_sfondo': '#f0f0f0'
+    },
+    "Dark": {
+        'sfondo': '#2d2d2d',
+        'cella_sfondo': '#3d3d3d',
+        'scoperta_sfondo': '#4d4d4d',
+        'bandierina_sfondo': '#5c2a2a',
+        'bandierina_corretta_sfondo': '#2a5c2a',
+        'mina_sfondo': '#5c2a2a',
+        'testo_colore': 'white',
+        'colori_numeri': {
+            1: '#4a8fe7',
+            2: '#4ae74a',
+            3: '#e74a4a',
+            4: '#8f4ae7',
+            5: '#e7a84a',
+            6: '#4ae7e7',
+            7: '#ffffff',
+            8: '#a8a8a8'
+        },
+        'pulsante_sfondo': '#3d3d3d',
+        'controlli_sfondo': '#2d2d2d'
+    },
+    "Fresh Mint": {
+        'sfondo': '#F8F4EA',
+        'cella_sfondo': '#D4E2D4',
+        'scoperta_sfondo': '#A2B29F',
+        'bandierina_sfondo': '#F5F0BB',
+        'bandierina_corretta_sfondo': '#A2B29F',
+        'mina_sfondo': '#FF9B9B',
+        'testo_colore': '#3A3A3A',
+        'colori_numeri': {
+            1: '#3A7BDA',  
+            2: '#2AA876',  
+            3: '#E74C3C',  
+            4: '#8E44AD',  
+            5: '#A8433E',  
+            6: '#16A085',  
+            7: '#2C3E50',  
+            8: '#7F8C8D'   
+        },
+        'pulsante_sfondo': '#D4E2D4',
+        'controlli_sfondo': '#F8F4EA'
+    },
+    "Ocean Breeze": {
+        'sfondo': '#E1F0DA',
+        'cella_sfondo': '#B8D5CD',
+        'scoperta_sfondo': '#99A98C',
+        'bandierina_sfondo': '#D1E7DD',
+        'bandierina_corretta_sfondo': '#99A98C',
+        'mina_sfondo': '#FF8787',
+        'testo_colore': '#2C3333',
+        'colori_numeri': {
+            1: '#2980B9',
+            2: '#27AE60',
+            3: '#E74C3C',
+            4: '#9B59B6',
+            5: '#D35400',
+            6: '#3498DB',
+            7: '#34495E',
+            8: '#7F8C8D'
+        },
+        'pulsante_sfondo': '#B8D5CD',
+        'controlli_sfondo': '#E1F0DA'
+    },
+    "Vintage Rose": {
+        'sfondo': '#F8ECD1',
+        'cella_sfondo': '#AC7D88',
+        'scoperta_sfondo': '#855F56',
+        'bandierina_sfondo': '#DEB6AB',
+        'bandierina_corretta_sfondo': '#855F56',
+        'mina_sfondo': '#FF8787',
+        'testo_colore': '#3A3A3A',
+        'colori_numeri': {
+            1: '#6A8CAF',
+            2: '#58D68D',
+            3: '#D4B483',
+            4: '#A67C52',
+            5: '#BD8E83',
+            6: '#7A9CC6',
+            7: '#5D535E',
+            8: '#9E8B8E'
+        },
+        'pulsante_sfondo': '#AC7D88',
+        'controlli_sfondo': '#F8ECD1'
+    }
+}
+
 
 class VistaCampoMinato:
     """Gestisce l'interfaccia grafica con leaderboard"""
-    def __init__(self, root, controller, username):
+    def __init__(self, root, controller, username, griglia='pulsanti'):
         self.root = root
         self.controller = controller
         self.username = username
+        self.tipo_griglia = griglia
         self.root.title(f"Campo Minato - {username}")
         
-        self.temi = {
-            "Classic": {
-                'sfondo': '#f0f0f0',
-                'cella_sfondo': '#e0e0e0',
-                'scoperta_sfondo': '#d0d0d0',
-                'bandierina_sfondo': '#ffcccc',
-                'bandierina_corretta_sfondo': '#99ff99',
-                'mina_sfondo': '#ff9999',
-                'testo_colore': 'black',
-                'colori_numeri': {
-                    1: 'blue',
-                    2: 'green',
-                    3: 'red',
-                    4: 'navy',
-                    5: 'brown',
-                    6: 'teal',
-                    7: 'black',
-                    8: 'gray'
-                },
-                'pulsante_sfondo': '#e0e0e0',
-                'controlli_sfondo': '#f0f0f0'
-            },
-            "Dark": {
-                'sfondo': '#2d2d2d',
-                'cella_sfondo': '#3d3d3d',
-                'scoperta_sfondo': '#4d4d4d',
-                'bandierina_sfondo': '#5c2a2a',
-                'bandierina_corretta_sfondo': '#2a5c2a',
-                'mina_sfondo': '#5c2a2a',
-                'testo_colore': 'white',
-                'colori_numeri': {
-                    1: '#4a8fe7',
-                    2: '#4ae74a',
-                    3: '#e74a4a',
-                    4: '#8f4ae7',
-                    5: '#e7a84a',
-                    6: '#4ae7e7',
-                    7: '#ffffff',
-                    8: '#a8a8a8'
-                },
-                'pulsante_sfondo': '#3d3d3d',
-                'controlli_sfondo': '#2d2d2d'
-            },
-            "Fresh Mint": {
-                'sfondo': '#F8F4EA',
-                'cella_sfondo': '#D4E2D4',
-                'scoperta_sfondo': '#A2B29F',
-                'bandierina_sfondo': '#F5F0BB',
-                'bandierina_corretta_sfondo': '#A2B29F',
-                'mina_sfondo': '#FF9B9B',
-                'testo_colore': '#3A3A3A',
-                'colori_numeri': {
-                    1: '#3A7BDA',  
-                    2: '#2AA876',  
-                    3: '#E74C3C',  
-                    4: '#8E44AD',  
-                    5: '#A8433E',  
-                    6: '#16A085',  
-                    7: '#2C3E50',  
-                    8: '#7F8C8D'   
-                },
-                'pulsante_sfondo': '#D4E2D4',
-                'controlli_sfondo': '#F8F4EA'
-            },
-            "Ocean Breeze": {
-                'sfondo': '#E1F0DA',
-                'cella_sfondo': '#B8D5CD',
-                'scoperta_sfondo': '#99A98C',
-                'bandierina_sfondo': '#D1E7DD',
-                'bandierina_corretta_sfondo': '#99A98C',
-                'mina_sfondo': '#FF8787',
-                'testo_colore': '#2C3333',
-                'colori_numeri': {
-                    1: '#2980B9',
-                    2: '#27AE60',
-                    3: '#E74C3C',
-                    4: '#9B59B6',
-                    5: '#D35400',
-                    6: '#3498DB',
-                    7: '#34495E',
-                    8: '#7F8C8D'
-                },
-                'pulsante_sfondo': '#B8D5CD',
-                'controlli_sfondo': '#E1F0DA'
-            },
-            "Vintage Rose": {
-                'sfondo': '#F8ECD1',
-                'cella_sfondo': '#AC7D88',
-                'scoperta_sfondo': '#855F56',
-                'bandierina_sfondo': '#DEB6AB',
-                'bandierina_corretta_sfondo': '#855F56',
-                'mina_sfondo': '#FF8787',
-                'testo_colore': '#3A3A3A',
-                'colori_numeri': {
-                    1: '#6A8CAF',
-                    2: '#58D68D',
-                    3: '#D4B483',
-                    4: '#A67C52',
-                    5: '#BD8E83',
-                    6: '#7A9CC6',
-                    7: '#5D535E',
-                    8: '#9E8B8E'
-                },
-                'pulsante_sfondo': '#AC7D88',
-                'controlli_sfondo': '#F8ECD1'
-            }
-        }
+        self.temi = TEMI
         
         self.tema_corrente = controller.db.ottieni_tema_preferito(username)
-        self.pulsanti = {}
+        # Tabelle degli stili di cella, compilate una volta per tema
+        self.tabelle_stili = {}
+        self.stili_correnti = self.stili_tema(self.tema_corrente)
+        self.griglia = None
+        # Aggiornamenti di cella in attesa del prossimo passaggio di disegno: (riga, colonna) → (tipo, valore)
+        self.coda_disegno = {}
+        self.id_svuotamento = None
+        self.budget_fotogramma = BUDGET_FOTOGRAMMA_MS
+        # Messaggi (titolo, testo) da mostrare quando la coda di disegno sarà vuota
+        self.messaggi_in_attesa = []
+        self.contatori_disegno = {'richiesti': 0, 'accorpati': 0, 'passaggi': 0}
+        self.finestra_profiler = None
+        # Cresce a ogni nuova partita: gli effetti temporanei di una partita precedente vengono ignorati
+        self.generazione = 0
         self.setup_interfaccia()
     
+    def stili_tema(self, nome_tema):
+        if nome_tema not in self.tabelle_stili:
+            self.tabelle_stili[nome_tema] = compila_stili(self.temi[nome_tema])
+        return self.tabelle_stili[nome_tema]
+    
     def setup_interfaccia(self):
         self.crea_menu_con_leaderboard()
         self.crea_pannello_controllo()
@@ -883,6 +1914,10 @@ class VistaCampoMinato:
                                  command=lambda: self.controller.imposta_difficolta('difficile'))
         menu_difficolta.add_command(label="Personalizzato...", 
                                  command=self.controller.difficolta_personalizzata)
+        menu_difficolta.add_separator()
+        self.var_senza_indovinare = tk.BooleanVar(value=self.controller.modello.senza_indovinare)
+        menu_difficolta.add_checkbutton(label="Senza indovinare", variable=self.var_senza_indovinare,
+                                 command=lambda: self.controller.imposta_senza_indovinare(self.var_senza_indovinare.get()))
         menubar.add_cascade(label="Difficoltà", menu=menu_difficolta)
         
         # Menu Tema
@@ -890,25 +1925,19 @@ class VistaCampoMinato:
         for nome_tema in self.temi.keys():
             menu_tema.add_command(label=nome_tema, 
                                  command=lambda t=nome_tema: self.cambia_tema(t))
+        menu_tema.add_separator()
+        self.var_griglia = tk.StringVar(value=self.tipo_griglia)
+        menu_tema.add_radiobutton(label="Griglia a pulsanti", value='pulsanti', variable=self.var_griglia,
+                                  command=lambda: self.cambia_griglia(self.var_griglia.get()))
+        menu_tema.add_radiobutton(label="Griglia su canvas (più veloce)", value='canvas', variable=self.var_griglia,
+                                  command=lambda: self.cambia_griglia(self.var_griglia.get()))
+        menu_tema.add_radiobutton(label="Griglia virtuale (griglie enormi)", value='virtuale', variable=self.var_griglia,
+                                  command=lambda: self.cambia_griglia(self.var_griglia.get()))
         menubar.add_cascade(label="Tema", menu=menu_tema)
         
-        # Menu Leaderboard
-        menu_leaderboard = tk.Menu(menubar, tearoff=0)
-        
-        # Sottomenu per la classifica tempi
-        menu_tempi = tk.Menu(menu_leaderboard, tearoff=0)
-        menu_tempi.add_command(label="Facile", command=lambda: self.mostra_leaderboard('tempo', 'facile'))
-        menu_tempi.add_command(label="Intermedio", command=lambda: self.mostra_leaderboard('tempo', 'medio'))
-        menu_tempi.add_command(label="Difficile", command=lambda: self.mostra_leaderboard('tempo', 'difficile'))
-        menu_leaderboard.add_cascade(label="Migliori tempi", menu=menu_tempi)
-        
-        # Altre classifiche
-        menu_leaderboard.add_command(label="Più vittorie", command=lambda: self.mostra_leaderboard('vittorie'))
-        menu_leaderboard.add_command(label="Più partite giocate", command=lambda: self.mostra_leaderboard('partite'))
-        menu_leaderboard.add_command(label="Ultime partite", command=lambda: self.mostra_leaderboard('recente'))
-        menu_leaderboard.add_command(label="Mio storico", command=self.mostra_storico_personale)
-        
-        menubar.add_cascade(label="Leaderboard", menu=menu_leaderboard)
+        # Menu Leaderboard: le voci vengono create alla prima apertura
+        self.menu_leaderboard = tk.Menu(menubar, tearoff=0, postcommand=self.popola_menu_leaderboard)
+        menubar.add_cascade(label="Leaderboard", menu=self.menu_leaderboard)
         
         # Menu Statistiche
         menu_statistiche = tk.Menu(menubar, tearoff=0)
@@ -917,6 +1946,16 @@ class VistaCampoMinato:
         
         # Menu Aiuto
         menu_aiuto = tk.Menu(menubar, tearoff=0)
+        menu_aiuto.add_command(label="Suggerimento (H)", command=self.controller.mostra_suggerimento)
+        self.var_probabilita = tk.BooleanVar(value=False)
+        menu_aiuto.add_checkbutton(label="Mappa probabilità (P)", variable=self.var_probabilita,
+                                   command=lambda: self.controller.imposta_mappa_probabilita(self.var_probabilita.get()))
+        self.var_contatori_disegno = tk.BooleanVar(value=False)
+        menu_aiuto.add_checkbutton(label="Contatori di disegno", variable=self.var_contatori_disegno,
+                                   command=self.mostra_contatori_disegno)
+        self.var_profiler = tk.BooleanVar(value=False)
+        menu_aiuto.add_checkbutton(label="Profiler latenze (F12)", variable=self.var_profiler,
+                                   command=lambda: self.imposta_profiler(self.var_profiler.get()))
         menu_aiuto.add_command(label="Come giocare", command=self.controller.mostra_istruzioni)
         menu_aiuto.add_command(label="Informazioni", command=self.controller.mostra_info)
         menubar.add_cascade(label="Aiuto", menu=menu_aiuto)
@@ -924,10 +1963,43 @@ class VistaCampoMinato:
         # Menu Account
         menu_account = tk.Menu(menubar, tearoff=0)
         menu_account.add_command(label="Logout", command=self.controller.logout)
-        menu_account.add_command(label="Esci", command=self.root.quit)
+        menu_account.add_command(label="Esci", command=self.controller.esci)
         menubar.add_cascade(label="Account", menu=menu_account)
         
         self.root.config(menu=menubar)
+        self.root.bind('<KeyPress-h>', lambda e: self.controller.mostra_suggerimento())
+        self.root.bind('<KeyPress-p>', lambda e: self.alterna_probabilita())
+        self.root.bind('<F12>', lambda e: self.alterna_profiler())
+    
+    def popola_menu_leaderboard(self):
+        menu_leaderboard = self.menu_leaderboard
+        if menu_leaderboard.index('end') is not None:
+            return
+        
+        # Sottomenu per la classifica tempi
+        menu_tempi = tk.Menu(menu_leaderboard, tearoff=0)
+        menu_tempi.add_command(label="Facile", command=lambda: self.mostra_leaderboard('tempo', 'facile'))
+        menu_tempi.add_command(label="Intermedio", command=lambda: self.mostra_leaderboard('tempo', 'medio'))
+        menu_tempi.add_command(label="Difficile", command=lambda: self.mostra_leaderboard('tempo', 'difficile'))
+        menu_leaderboard.add_cascade(label="Migliori tempi", menu=menu_tempi)
+        
+        # Altre classifiche
+        menu_leaderboard.add_command(label="Più vittorie", command=lambda: self.mostra_leaderboard('vittorie'))
+        menu_leaderboard.add_command(label="Più partite giocate", command=lambda: self.mostra_leaderboard('partite'))
+        menu_leaderboard.add_command(label="Ultime partite", command=lambda: self.mostra_leaderboard('recente'))
+        menu_leaderboard.add_command(label="Mio storico", command=self.mostra_storico_personale)
+    
+    def distruggi(self):
+        """Toglie dalla finestra principale tutto ciò che la vista ha creato, per tornare al login"""
+        self.chiudi_profiler()
+        # Come farebbe root.destroy(): nessuna attesa deve scattare su widget ormai distrutti
+        for id_attesa in self.root.tk.splitlist(self.root.tk.call('after', 'info')):
+            self.root.tk.call('after', 'cancel', id_attesa)
+        for sequenza in ('<KeyPress-h>', '<KeyPress-p>', '<F12>'):
+            self.root.unbind(sequenza)
+        self.root.config(menu='')
+        for figlio in self.root.winfo_children():
+            figlio.destroy()
     
     def crea_pannello_controllo(self):
         self.frame_controllo = tk.Frame(self.root, padx=10, pady=5)
@@ -977,42 +2049,59 @@ class VistaCampoMinato:
                                   font=('Arial', 10))
         self.etichetta_statistiche.pack(side=tk.LEFT)
         
+        self.var_disegno = tk.StringVar(value='')
+        self.etichetta_disegno = tk.Label(self.frame_statistiche, textvariable=self.var_disegno, font=('Arial', 8))
+        
         self.separatore2 = ttk.Separator(self.root, orient=tk.HORIZONTAL)
         self.separatore2.pack(fill=tk.X)
     
     def crea_griglia(self):
-        if hasattr(self, 'frame_griglia'):
-            self.frame_griglia.destroy()
+        """Prepara la griglia per una nuova partita, riusando quella esistente se possibile"""
+        self.colori_probabilita = {}
+        self.colore_interne = None
+        self.coda_disegno = {}
+        # I messaggi non ancora mostrati riguardano la partita precedente
+        self.messaggi_in_attesa = []
+        self.generazione += 1
         
-        tema = self.temi[self.tema_corrente]
-        self.frame_griglia = tk.Frame(self.root, bg=tema['sfondo'])
-        self.frame_griglia.pack(padx=10, pady=10)
-        
-        self.pulsanti = {}
         modello = self.controller.modello
-        tema = self.temi[self.tema_corrente]
-        
-        for riga in range(modello.righe):
-            for colonna in range(modello.colonne):
-                pulsante = tk.Button(self.frame_griglia, text='', width=2, height=1,
-                              font=('Arial', 9, 'bold'), bd=1, relief=tk.RAISED,
-                              bg=tema['cella_sfondo'], fg=tema['testo_colore'])
-                pulsante.grid(row=riga, column=colonna)
-                
-                pulsante.bind('<Button-1>', partial(self.controller.click_sinistro, riga, colonna))
-                pulsante.bind('<ButtonRelease-1>', partial(self.rilascio_pulsante, riga, colonna))
-                pulsante.bind('<Button-3>', partial(self.controller.click_destro, riga, colonna))
-                pulsante.bind('<B1-Motion>', partial(self.trascinamento_pulsante, riga, colonna))
-                
-                self.pulsanti[(riga, colonna)] = pulsante
+        classe = GRIGLIE[self.tipo_griglia]
+        if classe is GrigliaPulsanti and modello.righe * modello.colonne > CELLE_MASSIME_PULSANTI:
+            classe = GrigliaCanvas
+        # type e non isinstance: la griglia virtuale è una sottoclasse di quella su canvas
+        if type(self.griglia) is classe:
+            self.griglia.pulisci()
+        else:
+            if self.griglia is not None:
+                self.griglia.distruggi()
+            self.griglia = classe(self)
+        self.griglia.ridimensiona(modello.righe, modello.colonne)
+    
+    def cambia_griglia(self, tipo_griglia):
+        if tipo_griglia == self.tipo_griglia:
+            return
+        modello = self.controller.modello
+        if tipo_griglia != 'virtuale' and (modello.righe > RIGHE_MASSIME or modello.colonne > COLONNE_MASSIME):
+            messagebox.showerror("Errore", f"Oltre {RIGHE_MASSIME}×{COLONNE_MASSIME} celle serve la griglia virtuale")
+            self.var_griglia.set(self.tipo_griglia)
+            return
+        self.tipo_griglia = tipo_griglia
+        self.crea_griglia()
+        self.ripristina_celle()
+        self.controller.aggiorna_probabilita()
+        self.centra_finestra(self.root)
     
     def cambia_tema(self, nome_tema):
         self.tema_corrente = nome_tema
-        self.controller.db.imposta_tema_preferito(self.username, nome_tema)
+        self.controller.db.scritture().accoda('imposta_tema_preferito', self.username, nome_tema)
         self.applica_tema()
+        self.controller.aggiorna_probabilita()
     
+    @misura_latenza('applica_tema')
     def applica_tema(self):
         tema = self.temi[self.tema_corrente]
+        self.colori_probabilita = {}
+        self.colore_interne = None
         
         self.root.config(bg=tema['sfondo'])
         self.frame_controllo.config(bg=tema['controlli_sfondo'])
@@ -1020,77 +2109,272 @@ class VistaCampoMinato:
         self.etichetta_mine.config(bg=tema['controlli_sfondo'], fg=tema['testo_colore'])
         self.etichetta_tempo.config(bg=tema['controlli_sfondo'], fg=tema['testo_colore'])
         self.etichetta_statistiche.config(bg=tema['controlli_sfondo'], fg=tema['testo_colore'])
+        self.etichetta_disegno.config(bg=tema['controlli_sfondo'], fg=tema['testo_colore'])
         self.pulsante_reset.config(bg=tema['pulsante_sfondo'], fg=tema['testo_colore'],
                             activebackground=tema['pulsante_sfondo'])
         
         stile = ttk.Style()
         stile.configure('Separator.TSeparator', background=tema['testo_colore'])
         
-        for (riga, colonna), pulsante in self.pulsanti.items():
-            pulsante.config(bg=tema['cella_sfondo'], fg=tema['testo_colore'],
-                      activebackground=tema['cella_sfondo'],
-                      highlightbackground=tema['pulsante_sfondo'])
-        
+        # La griglia ricorda lo stile di ogni cella: cambia solo quello che cambia davvero
+        self.stili_correnti = self.stili_tema(self.tema_corrente)
+        self.griglia.applica_tema(tema, self.stili_correnti)
+    
+    def ripristina_celle(self):
+        """Ridisegna una griglia appena creata a partire dallo stato del modello"""
         modello = self.controller.modello
         for (riga, colonna) in modello.celle_scoperte:
-            if (riga, colonna) in modello.posizioni_mine:
+            conteggio_mine = modello.ottieni_mine_adiacenti(riga, colonna)
+            if conteggio_mine < 0:
                 self.aggiorna_pulsante(riga, colonna, 'mina')
             else:
-                conteggio_mine = modello.mine_adiacenti[(riga, colonna)]
                 self.aggiorna_pulsante(riga, colonna, 'scoperta', conteggio_mine)
         
         for (riga, colonna) in modello.celle_segnate:
             self.aggiorna_pulsante(riga, colonna, 'bandierina')
     
     def aggiorna_pulsante(self, riga, colonna, stato, conteggio_mine=None):
-        pulsante = self.pulsanti[(riga, colonna)]
-        tema = self.temi[self.tema_corrente]
-        
         if stato == 'scoperta':
-            pulsante.config(
-                state='disabled',
-                relief=tk.SUNKEN,
-                bg=tema['scoperta_sfondo'],
-                text=str(conteggio_mine) if conteggio_mine > 0 else '',
-                disabledforeground=tema['colori_numeri'][conteggio_mine] if conteggio_mine > 0 else tema['testo_colore']
-            )
-        elif stato == 'bandierina':
-            pulsante.config(
-                text='🚩',
-                bg=tema['bandierina_sfondo'],
-                fg=tema['testo_colore']
-            )
+            chiave = conteggio_mine
         elif stato == 'rimuovi_bandierina':
-            pulsante.config(
-                text='',
-                bg=tema['cella_sfondo'],
-                fg=tema['testo_colore'],
-                state='normal'
-            )
-        elif stato == 'mina':
-            pulsante.config(
-                text='💣',
-                bg=tema['mina_sfondo'],
-                fg=tema['testo_colore'],
-                state='disabled'
-            )
-        elif stato == 'bandierina_errata':
-            pulsante.config(
-                text='🚩',
-                bg=tema['bandierina_corretta_sfondo'],
-                fg=tema['testo_colore'],
-                state='disabled'
-            )
+            chiave = 'coperta'
+        else:
+            chiave = stato
+        self.accoda(riga, colonna, 'stile', chiave)
+        # Con la mappa di probabilità una cella che torna coperta prende il colore delle interne
+        # (la griglia virtuale lo applica da sola); quelle di frontiera lo ricevono poi da mostra_probabilita
+        if chiave == 'coperta' and self.colore_interne is not None and not isinstance(self.griglia, GrigliaVirtuale):
+            self.accoda(riga, colonna, 'colore', self.colore_interne)
+    
+    def accoda(self, riga, colonna, tipo, valore):
+        """Mette in coda l'aggiornamento di una cella ('stile' o 'colore').
+
+        Gli aggiornamenti di un'azione vengono applicati insieme quando Tk è
+        inattivo; se la stessa cella cambia più volte conta solo l'ultimo stile
+        e l'ultimo colore, applicato dopo lo stile (un nuovo stile lo annulla).
+        """
+        cella = (riga, colonna)
+        self.contatori_disegno['richiesti'] += 1
+        stile, colore = None, None
+        if cella in self.coda_disegno:
+            self.contatori_disegno['accorpati'] += 1
+            stile, colore = self.coda_disegno[cella]
+        if tipo == 'stile':
+            stile, colore = valore, None
+        else:
+            colore = valore
+        self.coda_disegno[cella] = (stile, colore)
+        if self.id_svuotamento is None:
+            self.id_svuotamento = self.root.after_idle(self.svuota_coda)
+    
+    def svuota_coda(self):
+        """Applica gli aggiornamenti in coda entro il budget del fotogramma; a coda vuota mostra
+        i messaggi in attesa"""
+        if self.id_svuotamento is not None:
+            self.root.after_cancel(self.id_svuotamento)
+            self.id_svuotamento = None
+        voci = list(self.coda_disegno.items())
+        self.coda_disegno = {}
+        if not voci:
+            self.mostra_messaggi_in_attesa()
+            return
+        
+        scadenza = None
+        if self.budget_fotogramma is not None:
+            scadenza = time.perf_counter() + self.budget_fotogramma / 1000
+        griglia = self.griglia
+        for i, ((riga, colonna), (stile, colore)) in enumerate(voci):
+            # Il tempo si controlla a blocchi: per cella costerebbe quanto il disegno
+            if scadenza is not None and i % 64 == 63 and time.perf_counter() > scadenza:
+                self.coda_disegno = dict(voci[i:])
+                self.id_svuotamento = self.root.after(1, self.svuota_coda)
+                break
+            if stile is not None:
+                griglia.applica_stile(riga, colonna, stile)
+            if colore is not None:
+                griglia.colora_cella(riga, colonna, colore)
+        
+        self.contatori_disegno['passaggi'] += 1
+        if self.var_contatori_disegno.get():
+            self.aggiorna_contatori_disegno()
+        if not self.coda_disegno:
+            self.mostra_messaggi_in_attesa()
+    
+    def alterna_profiler(self):
+        self.var_profiler.set(not self.var_profiler.get())
+        self.imposta_profiler(self.var_profiler.get())
+    
+    def imposta_profiler(self, attivo):
+        if attivo:
+            self.mostra_profiler()
+        else:
+            self.chiudi_profiler()
+    
+    def mostra_profiler(self):
+        """Finestra in primo piano con p50/p95/max delle latenze, raccolte finché resta aperta"""
+        if self.finestra_profiler is not None:
+            return
+        PROFILER.attivo = True
+        
+        finestra = tk.Toplevel(self.root)
+        finestra.title("Profiler latenze")
+        finestra.attributes('-topmost', True)
+        finestra.protocol("WM_DELETE_WINDOW", lambda: (self.var_profiler.set(False), self.chiudi_profiler()))
+        
+        colonne = ['Misura', 'Campioni', 'p50 (ms)', 'p95 (ms)', 'max (ms)']
+        larghezze = [220, 80, 80, 80, 80]
+        tree = ttk.Treeview(finestra, columns=colonne, show='headings', height=10)
+        for col, larghezza in zip(colonne, larghezze):
+            tree.heading(col, text=col)
+            tree.column(col, width=larghezza, anchor='center')
+        tree.pack(fill='both', expand=True, padx=10, pady=5)
+        
+        pulsanti = ttk.Frame(finestra)
+        pulsanti.pack(pady=5)
+        ttk.Button(pulsanti, text="Azzera", command=PROFILER.azzera).pack(side=tk.LEFT, padx=5)
+        ttk.Button(pulsanti, text="Esporta CSV...", command=self.esporta_profiler).pack(side=tk.LEFT, padx=5)
+        
+        self.finestra_profiler = finestra
+        self.tabella_profiler = tree
+        self.aggiorna_profiler()
+    
+    def aggiorna_profiler(self):
+        if self.finestra_profiler is None or not self.finestra_profiler.winfo_exists():
+            return
+        tree = self.tabella_profiler
+        tree.delete(*tree.get_children())
+        for nome, campioni, p50, p95, massimo in PROFILER.riepilogo():
+            tree.insert('', 'end', values=(nome, campioni, f"{p50:.1f}", f"{p95:.1f}", f"{massimo:.1f}"))
+        self.id_profiler = self.root.after(500, self.aggiorna_profiler)
+    
+    def chiudi_profiler(self):
+        PROFILER.attivo = False
+        if self.finestra_profiler is None:
+            return
+        self.root.after_cancel(self.id_profiler)
+        if self.finestra_profiler.winfo_exists():
+            self.finestra_profiler.destroy()
+        self.finestra_profiler = None
+    
+    def esporta_profiler(self):
+        with PROFILER.pausa():
+            percorso = filedialog.asksaveasfilename(parent=self.finestra_profiler, defaultextension='.csv',
+                                                    filetypes=[("CSV", "*.csv")], initialfile='latenze.csv')
+        if percorso:
+            PROFILER.esporta_csv(percorso)
+    
+    def mostra_contatori_disegno(self):
+        if self.var_contatori_disegno.get():
+            self.aggiorna_contatori_disegno()
+            self.etichetta_disegno.pack(side=tk.RIGHT)
+        else:
+            self.etichetta_disegno.pack_forget()
+    
+    def aggiorna_contatori_disegno(self):
+        contatori = self.contatori_disegno
+        self.var_disegno.set(f"Disegno: {contatori['richiesti']} aggiornamenti, "
+                             f"{contatori['accorpati']} accorpati, {contatori['passaggi']} passaggi")
+    
+    def scopri_celle(self, celle):
+        """Mette in coda la visualizzazione delle celle scoperte, disegnate poi in un solo passaggio"""
+        modello = self.controller.modello
+        for riga, colonna in celle:
+            conteggio_mine = modello.ottieni_mine_adiacenti(riga, colonna)
+            if conteggio_mine < 0:
+                self.aggiorna_pulsante(riga, colonna, 'mina')
+            else:
+                self.aggiorna_pulsante(riga, colonna, 'scoperta', conteggio_mine)
+    
+    def ridisegna_cella(self, riga, colonna):
+        """Ridisegna la cella in base allo stato attuale del modello"""
+        modello = self.controller.modello
+        self.colori_probabilita.pop((riga, colonna), None)
+        if modello.cella_scoperta(riga, colonna):
+            conteggio_mine = modello.ottieni_mine_adiacenti(riga, colonna)
+            if conteggio_mine < 0:
+                self.aggiorna_pulsante(riga, colonna, 'mina')
+            else:
+                self.aggiorna_pulsante(riga, colonna, 'scoperta', conteggio_mine)
+        elif modello.cella_segnata(riga, colonna):
+            self.aggiorna_pulsante(riga, colonna, 'bandierina')
+        else:
+            self.aggiorna_pulsante(riga, colonna, 'rimuovi_bandierina')
+    
+    def alterna_probabilita(self):
+        self.var_probabilita.set(not self.var_probabilita.get())
+        self.controller.imposta_mappa_probabilita(self.var_probabilita.get())
+    
+    def mostra_probabilita(self, probabilita, probabilita_interne):
+        """Colora le celle coperte dal verde (nessun rischio) al rosso (mina certa).
+
+        A ogni mossa si ricolorano solo le celle di frontiera il cui colore è
+        cambiato; le celle interne, che hanno tutte la stessa probabilità,
+        vengono ridisegnate solo quando cambia il loro colore.
+        """
+        modello = self.controller.modello
+        nuovi_colori = {}
+        for indice, valore in probabilita.items():
+            riga, colonna = divmod(indice, modello.colonne)
+            if modello.cella_scoperta(riga, colonna) or modello.cella_segnata(riga, colonna):
+                continue
+            colore = self.colore_probabilita(valore)
+            nuovi_colori[(riga, colonna)] = colore
+            if self.colori_probabilita.get((riga, colonna)) != colore:
+                self.accoda(riga, colonna, 'colore', colore)
+        uscite = [cella for cella in self.colori_probabilita if cella not in nuovi_colori]
+        self.colori_probabilita = nuovi_colori
+        
+        colore_interne = None if probabilita_interne is None else self.colore_probabilita(probabilita_interne)
+        if colore_interne != self.colore_interne:
+            self.colore_interne = colore_interne
+            self.colora_interne()
+        for riga, colonna in uscite:
+            # Non più di frontiera: se è ancora coperta torna al colore delle interne
+            if not modello.cella_scoperta(riga, colonna) and not modello.cella_segnata(riga, colonna):
+                self.aggiorna_pulsante(riga, colonna, 'rimuovi_bandierina')
+    
+    @staticmethod
+    def colore_probabilita(valore):
+        # A passi del 5%: piccole variazioni non giustificano un nuovo config
+        return mescola_colori(COLORE_SUGGERIMENTO_SICURA, COLORE_SUGGERIMENTO_MINA, round(valore * 20) / 20)
+    
+    def colora_interne(self):
+        """Applica colore_interne alle celle coperte fuori dalla frontiera"""
+        if isinstance(self.griglia, GrigliaVirtuale):
+            self.griglia.colora_coperte(self.colore_interne)
+            return
+        modello = self.controller.modello
+        for riga, colonna in chiavi_griglia(modello.righe, modello.colonne):
+            if ((riga, colonna) not in self.colori_probabilita and not modello.cella_scoperta(riga, colonna)
+                    and not modello.cella_segnata(riga, colonna)):
+                self.aggiorna_pulsante(riga, colonna, 'rimuovi_bandierina')
+    
+    def nascondi_probabilita(self):
+        # ridisegna_cella toglie la cella da colori_probabilita: si scorre una copia
+        for riga, colonna in list(self.colori_probabilita):
+            self.ridisegna_cella(riga, colonna)
+        self.colori_probabilita = {}
+        if self.colore_interne is not None:
+            self.colore_interne = None
+            self.colora_interne()
+    
+    def evidenzia_cella(self, riga, colonna, colore, durata=1200):
+        """Colora temporaneamente una cella, poi la riporta al suo stato"""
+        self.accoda(riga, colonna, 'colore', colore)
+        generazione = self.generazione
+        # Se nel frattempo è iniziata un'altra partita non c'è nulla da ripristinare
+        self.root.after(durata, lambda: generazione == self.generazione and self.griglia.esiste()
+                        and self.ridisegna_cella(riga, colonna))
     
     def rilascio_pulsante(self, riga, colonna, event):
         modello = self.controller.modello
-        if not modello.gioco_finito and (riga, colonna) not in modello.celle_scoperte and (riga, colonna) not in modello.celle_segnate:
-            self.pulsanti[(riga, colonna)].config(relief=tk.RAISED)
+        if not modello.gioco_finito and not modello.cella_scoperta(riga, colonna) and not modello.cella_segnata(riga, colonna):
+            self.griglia.premi_cella(riga, colonna, False)
     
     def trascinamento_pulsante(self, riga, colonna, event):
         modello = self.controller.modello
-        if not modello.gioco_finito and (riga, colonna) not in modello.celle_scoperte and (riga, colonna) not in modello.celle_segnate:
-            self.pulsanti[(riga, colonna)].config(relief=tk.SUNKEN)
+        if not modello.gioco_finito and not modello.cella_scoperta(riga, colonna) and not modello.cella_segnata(riga, colonna):
+            self.griglia.premi_cella(riga, colonna, True)
     
     def centra_finestra(self, finestra):
         finestra.update_idletasks()
@@ -1144,11 +2428,25 @@ class VistaCampoMinato:
                 self.aggiorna_pulsante(riga, colonna, 'mina')
     
     def mostra_messaggio(self, titolo, messaggio):
-        messagebox.showinfo(titolo, messaggio)
+        # La griglia deve essere completa prima che il messaggio blocchi la finestra: con celle
+        # ancora in coda lo mostra svuota_coda, a fine disegno, senza saltare il budget dei passaggi
+        self.messaggi_in_attesa.append((titolo, messaggio))
+        if self.coda_disegno:
+            if self.id_svuotamento is None:
+                self.id_svuotamento = self.root.after_idle(self.svuota_coda)
+            return
+        self.mostra_messaggi_in_attesa()
+    
+    def mostra_messaggi_in_attesa(self):
+        while self.messaggi_in_attesa:
+            # Tolto prima di mostrarlo: durante la finestra modale svuota_coda può tornare qui
+            titolo, messaggio = self.messaggi_in_attesa.pop(0)
+            with PROFILER.pausa():
+                messagebox.showinfo(titolo, messaggio)
+
     
+    @misura_latenza('mostra_leaderboard')
     def mostra_leaderboard(self, tipo, difficolta=None):
-        leaderboard = self.controller.db.ottieni_leaderboard(tipo, difficolta, limite=20)
-        
         finestra = tk.Toplevel(self.root)
         
         if tipo == 'tempo':
@@ -1198,21 +2496,20 @@ class VistaCampoMinato:
             tree.heading(col, text=col)
             tree.column(col, width=larghezza, anchor='center')
 
-        for i, record in enumerate(leaderboard, 1):
+        def formatta(posizione, record):
             if tipo == 'tempo':
-                data = datetime.strptime(record[2], '%Y-%m-%d %H:%M:%S').strftime('%d/%m/%Y %H:%M')
-                tree.insert('', 'end', values=(i, record[0], record[1], data))
-            elif tipo == 'vittorie':
-                tree.insert('', 'end', values=(i, record[0], record[1]))
-            elif tipo == 'partite':
-                tree.insert('', 'end', values=(i, record[0], record[1]))
+                return (posizione + 1, record[0], record[1], formatta_data(record[2]))
             elif tipo == 'recente':
                 esito = "✅ Vittoria" if record[2] == 'vittoria' else "❌ Sconfitta"
-                data = datetime.strptime(record[4], '%Y-%m-%d %H:%M:%S').strftime('%d/%m/%Y %H:%M')
-                tree.insert('', 'end', values=(i, record[0], record[1].capitalize(), esito, record[3], data))
+                return (posizione + 1, record[0], record[1].capitalize(), esito, record[3], formatta_data(record[4]))
+            return (posizione + 1, record[0], record[1])
+        
+        def carica(offset, limite):
+            return self.controller.db.ottieni_leaderboard(tipo, difficolta, limite=limite, offset=offset)
         
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=vsb.set)
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        # La prima pagina è la classifica dei primi 20, le altre arrivano scorrendo
+        TabellaPaginata(tree, vsb, carica, formatta, dimensione_pagina=20)
         
         tree.grid(row=0, column=0, sticky='nsew')
         vsb.grid(row=0, column=1, sticky='ns')
@@ -1225,8 +2522,6 @@ class VistaCampoMinato:
         self.centra_finestra(finestra)
 
     def mostra_storico_personale(self):
-        storico = self.controller.db.ottieni_storico_utente(self.username, limite=10000)
-        
         finestra = tk.Toplevel(self.root)
         finestra.title(f"Storico partite - {self.username}")
         finestra.resizable(False, False)
@@ -1262,29 +2557,15 @@ class VistaCampoMinato:
             tree.heading(col, text=col)
             tree.column(col, width=larghezza, anchor='center')
         
-        for partita in storico:
+        def formatta(posizione, partita):
             esito = "✅ Vittoria" if partita[1] == 'vittoria' else "❌ Sconfitta"
-            try:
-                data_partita = partita[5]
-                if isinstance(data_partita, str):
-                    data_obj = datetime.strptime(data_partita, '%Y-%m-%d %H:%M:%S')
-                    data_formattata = data_obj.strftime('%d/%m/%Y %H:%M')
-                else:
-                    data_formattata = data_partita.strftime('%d/%m/%Y %H:%M')
-            except (ValueError, TypeError, AttributeError):
-                data_formattata = str(data_partita)
-            
-            tree.insert('', 'end', values=(
-                data_formattata,
-                partita[0].capitalize(),
-                esito,
-                partita[2],
-                partita[3],
-                partita[4]
-            ))
-        
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=vsb.set)
+            return (formatta_data(partita[5]), partita[0].capitalize(), esito, partita[2], partita[3], partita[4])
+        
+        def carica(offset, limite):
+            return self.controller.db.ottieni_storico_utente(self.username, limite=limite, offset=offset)
+        
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        TabellaPaginata(tree, vsb, carica, formatta)
         
         tree.grid(row=0, column=0, sticky='nsew')
         vsb.grid(row=0, column=1, sticky='ns')
@@ -1339,6 +2620,11 @@ class VistaCampoMinato:
         colonne_correnti = colonne
         mine_correnti = mine
         
+        if self.tipo_griglia == 'virtuale':
+            righe_massime, colonne_massime = RIGHE_MASSIME_VIRTUALE, COLONNE_MASSIME_VIRTUALE
+        else:
+            righe_massime, colonne_massime = RIGHE_MASSIME, COLONNE_MASSIME
+        
         finestra_personalizzata = tk.Toplevel(self.root)
         finestra_personalizzata.title("Difficoltà Personalizzata")
         finestra_personalizzata.resizable(False, False)
@@ -1350,12 +2636,12 @@ class VistaCampoMinato:
         
         comando_validazione = (finestra_personalizzata.register(valida), '%P')
         
-        tk.Label(finestra_personalizzata, text="Righe (max 30):").grid(row=0, column=0, padx=5, pady=5)
+        tk.Label(finestra_personalizzata, text=f"Righe (max {righe_massime}):").grid(row=0, column=0, padx=5, pady=5)
         campo_righe = tk.Entry(finestra_personalizzata, validate='key', validatecommand=comando_validazione, width=5)
         campo_righe.grid(row=0, column=1, padx=5, pady=5)
         campo_righe.insert(0, str(righe_correnti))
         
-        tk.Label(finestra_personalizzata, text="Colonne (max 40):").grid(row=1, column=0, padx=5, pady=5)
+        tk.Label(finestra_personalizzata, text=f"Colonne (max {colonne_massime}):").grid(row=1, column=0, padx=5, pady=5)
         campo_colonne = tk.Entry(finestra_personalizzata, validate='key', validatecommand=comando_validazione, width=5)
         campo_colonne.grid(row=1, column=1, padx=5, pady=5)
         campo_colonne.insert(0, str(colonne_correnti))
@@ -1369,8 +2655,8 @@ class VistaCampoMinato:
         
         def applica_impostazioni():
             try:
-                righe = min(30, int(campo_righe.get() or righe_correnti))
-                colonne = min(40, int(campo_colonne.get() or colonne_correnti))
+                righe = min(righe_massime, int(campo_righe.get() or righe_correnti))
+                colonne = min(colonne_massime, int(campo_colonne.get() or colonne_correnti))
                 mine = int(campo_mine.get() or mine_correnti)
                 
                 if righe < 4 or colonne < 4:
@@ -1401,13 +2687,22 @@ class VistaCampoMinato:
 
 class ControlloreCampoMinato:
     """Gestisce l'interazione tra Modello e Vista"""
-    def __init__(self, root, gestore_db, username):
+    def __init__(self, root, gestore_db, username, motore='automatico', griglia='pulsanti'):
         self.root = root
         self.db = gestore_db
         self.username = username
         self.id_utente, _ = self.db.verifica_utente(username, '')
-        self.modello = ModelloCampoMinato()
-        self.vista = VistaCampoMinato(root, self, username)
+        # Un nome di MOTORI, oppure 'automatico' per sceglierlo in base alla dimensione della griglia
+        self.motore = motore
+        self.modello = MOTORI[self.motore_per(9, 9)]()
+        # Mosse della partita in corso, salvate con il risultato per poterla rigiocare
+        self.registrazione = RegistrazionePartita(self.modello.righe, self.modello.colonne)
+        self.risolutore = None
+        self.probabilita = None
+        self.prossimo_tick = None
+        self.id_scritture = None
+        self.uscita = False
+        self.vista = VistaCampoMinato(root, self, username, griglia)
         self.aggiorna_timer()
         self.aggiorna_statistiche()
         self.root.protocol("WM_DELETE_WINDOW", self.logout)
@@ -1417,6 +2712,17 @@ class ControlloreCampoMinato:
         self.reset_gioco()
         self.aggiorna_statistiche()
 
+    def imposta_senza_indovinare(self, attiva):
+        self.modello.senza_indovinare = attiva
+        # La riserva genera le griglie in altri processi mentre si gioca
+        if attiva and self.modello.riserva is None:
+            self.modello.riserva = RiservaGriglie()
+        elif not attiva and self.modello.riserva is not None:
+            # Senza la modalità i processi resterebbero inutilizzati fino all'uscita
+            self.modello.riserva.chiudi()
+            self.modello.riserva = None
+        self.reset_gioco()
+    
     def difficolta_personalizzata(self):
         impostazioni_correnti = {
             'righe': self.modello.righe,
@@ -1432,81 +2738,165 @@ class ControlloreCampoMinato:
         self.modello.difficolta = 'personalizzata'
         self.reset_gioco()
     
+    def motore_per(self, righe, colonne):
+        if self.motore != 'automatico':
+            return self.motore
+        return 'compatto' if righe * colonne >= CELLE_MOTORE_COMPATTO else 'insiemi'
+    
+    def adatta_motore(self):
+        """Passa al motore adatto alla dimensione corrente, conservando le impostazioni della partita"""
+        precedente = self.modello
+        classe = MOTORI[self.motore_per(precedente.righe, precedente.colonne)]
+        if type(precedente) is classe:
+            return
+        self.modello = classe()
+        for attributo in ('righe', 'colonne', 'mine', 'difficolta', 'senza_indovinare', 'riserva'):
+            setattr(self.modello, attributo, getattr(precedente, attributo))
+    
+    @misura_latenza('reset_gioco')
     def reset_gioco(self):
+        self.adatta_motore()
         self.modello.reset_gioco()
+        self.registrazione = RegistrazionePartita(self.modello.righe, self.modello.colonne)
+        self.risolutore = None
+        if self.probabilita is not None:
+            self.probabilita = ProbabilitaMine(self.ottieni_risolutore())
         self.vista.crea_griglia()
         self.vista.aggiorna_contatore_bandierine(self.modello.mine)
         self.vista.aggiorna_timer(0)
         self.vista.aggiorna_pulsante_reset('giocando')
         self.vista.centra_finestra(self.root)
-        self.vista.applica_tema()
+        self.aggiorna_probabilita()
     
+    @misura_latenza('click_sinistro')
     def click_sinistro(self, riga, colonna, event):
         if self.modello.gioco_finito:
             return
         
-        if (riga, colonna) in self.modello.celle_scoperte or (riga, colonna) in self.modello.celle_segnate:
+        # Sinistro con il destro già premuto: accordo
+        if event is not None and event.state & MASCHERA_TASTO_DESTRO:
+            self.accordo(riga, colonna)
             return
         
+        if self.modello.cella_scoperta(riga, colonna) or self.modello.cella_segnata(riga, colonna):
+            return
+        
+        self.registrazione.registra('scopri', riga, colonna)
+        primo_click = self.modello.primo_click
         risultato = self.modello.scopri_cella(riga, colonna)
         
         if risultato is None:
             return
         
         if risultato == 'mina':
-            self.modello.gioco_perso()
-            self.vista.aggiorna_pulsante_reset('perso')
-            self.vista.aggiorna_pulsante(riga, colonna, 'mina')
-            self.vista.rivela_tutte_mine(self.modello.posizioni_mine, self.modello.celle_segnate)
-            dimensione = f"{self.modello.righe}x{self.modello.colonne}"
-            self.db.aggiorna_statistiche(
-                self.id_utente,
-                self.username,
-                vinto=False,
-                tempo_impiegato=int(self.modello.ottieni_tempo_gioco()),
-                difficolta=self.modello.difficolta,
-                mine=self.modello.mine,
-                dimensione=dimensione
-            )
-            self.aggiorna_statistiche()
-            self.vista.mostra_messaggio("Game Over", "Hai calpestato una mina!")
+            self.partita_persa(riga, colonna)
             return
         
+        celle_scoperte = [(riga, colonna)]
         if risultato == 'vuota':
-            self.vista.aggiorna_pulsante(riga, colonna, 'scoperta', 0)
-            celle_da_scoprire = self.modello.scopri_adiacenti(riga, colonna)
-            for r, c in celle_da_scoprire:
-                conteggio_adiacenti = self.modello.mine_adiacenti[(r, c)]
-                self.vista.aggiorna_pulsante(r, c, 'scoperta', conteggio_adiacenti)
-        else:
-            self.vista.aggiorna_pulsante(riga, colonna, 'scoperta', risultato)
+            celle_scoperte.extend(self.modello.scopri_adiacenti(riga, colonna))
+        self.vista.scopri_celle(celle_scoperte)
+        self.dopo_scoperta(celle_scoperte)
+        
+        if (primo_click and self.modello.senza_indovinare and not self.modello.griglia_garantita
+                and not self.modello.gioco_finito):
+            self.vista.mostra_messaggio("Senza indovinare",
+                                        "Non è stata trovata una griglia risolvibile senza indovinare:\n"
+                                        "in questa partita potrebbe servire tentare la sorte.")
+
+    
+    @misura_latenza('click_centrale')
+    def click_centrale(self, riga, colonna, event):
+        self.accordo(riga, colonna)
+    
+    def accordo(self, riga, colonna):
+        """Accordo: su un numero con attorno tante bandierine quante mine scopre tutte le altre vicine.
+        Non è misurato: la latenza conta nel gestore del click che lo ha chiesto"""
+        risultato = self.modello.scopri_accordo(riga, colonna)
+        if risultato is None:
+            return
+        
+        self.registrazione.registra('accordo', riga, colonna)
+        celle_scoperte, mina = risultato
+        self.vista.scopri_celle(celle_scoperte)
+        if mina is not None:
+            self.partita_persa(*mina)
+            return
+        self.dopo_scoperta(celle_scoperte)
+    
+    def partita_persa(self, riga, colonna):
+        self.modello.gioco_perso()
+        self.vista.aggiorna_pulsante_reset('perso')
+        self.vista.aggiorna_pulsante(riga, colonna, 'mina')
+        self.vista.rivela_tutte_mine(self.modello.posizioni_mine, self.modello.celle_segnate)
+        self.salva_partita(False, int(self.modello.ottieni_tempo_gioco()))
+        self.vista.mostra_messaggio("Game Over", "Hai calpestato una mina!")
+    
+    def dopo_scoperta(self, celle_scoperte):
+        """Aggiorna risolutore e mappa delle probabilità, poi controlla la vittoria"""
+        if self.risolutore is not None:
+            self.risolutore.aggiorna(celle_scoperte)
+        self.aggiorna_probabilita()
         
         if self.modello.controlla_vittoria():
             self.modello.gioco_vinto()
             self.vista.aggiorna_pulsante_reset('vinto')
             self.vista.rivela_tutte_mine(self.modello.posizioni_mine, self.modello.celle_segnate)
             tempo_impiegato = int(self.modello.ottieni_tempo_gioco())
-            dimensione = f"{self.modello.righe}x{self.modello.colonne}"
-            self.db.aggiorna_statistiche(
-                self.id_utente,
-                self.username,
-                vinto=True,
-                tempo_impiegato=tempo_impiegato,
-                difficolta=self.modello.difficolta,
-                mine=self.modello.mine,
-                dimensione=dimensione
-            )
-            self.aggiorna_statistiche()
+            self.salva_partita(True, tempo_impiegato)
             self.vista.mostra_messaggio("Vittoria!", f"Complimenti! Hai vinto in {tempo_impiegato} secondi!")
     
+    def salva_partita(self, vinto, tempo_impiegato):
+        """Il salvataggio avviene nel thread del database: le statistiche si aggiornano a scrittura finita"""
+        dimensione = f"{self.modello.righe}x{self.modello.colonne}"
+        colonne = self.modello.colonne
+        self.registrazione.indici_mine = sorted(r * colonne + c for r, c in self.modello.posizioni_mine)
+        self.db.scritture().accoda(
+            'aggiorna_statistiche',
+            self.id_utente,
+            self.username,
+            vinto=vinto,
+            tempo_impiegato=tempo_impiegato,
+            difficolta=self.modello.difficolta,
+            mine=self.modello.mine,
+            dimensione=dimensione,
+            mosse=self.registrazione.codifica(),
+            al_termine=self.partita_salvata
+        )
+        if self.id_scritture is None:
+            self.controlla_scritture()
+    
+    def partita_salvata(self, risultato, errore):
+        if errore is not None:
+            self.vista.mostra_messaggio("Errore", f"Impossibile salvare la partita: {errore}")
+        self.aggiorna_statistiche()
+    
+    def controlla_scritture(self):
+        """Consegna le callback delle scritture finite finché ce ne sono in sospeso"""
+        self.id_scritture = None
+        scrittore = self.db.scrittore
+        if scrittore is None:
+            return
+        scrittore.consegna_completate()
+        if scrittore.in_sospeso():
+            self.id_scritture = self.root.after(20, self.controlla_scritture)
+    
+    @misura_latenza('click_destro')
     def click_destro(self, riga, colonna, event):
         if self.modello.gioco_finito or not self.modello.gioco_iniziato:
             return
         
-        if (riga, colonna) in self.modello.celle_scoperte:
+        # Destro con il sinistro già premuto: accordo
+        if event is not None and event.state & MASCHERA_TASTO_SINISTRO:
+            self.accordo(riga, colonna)
+            return
+
+        
+        if self.modello.cella_scoperta(riga, colonna):
             return
         
         risultato = self.modello.toggle_bandierina(riga, colonna)
+        self.registrazione.registra('bandierina', riga, colonna)
         
         if risultato == 'aggiunta':
             self.vista.aggiorna_pulsante(riga, colonna, 'bandierina')
@@ -1515,13 +2905,18 @@ class ControlloreCampoMinato:
         
         rimanenti = self.modello.mine - self.modello.bandierine_piazzate
         self.vista.aggiorna_contatore_bandierine(rimanenti)
+        self.aggiorna_probabilita()
     
     def aggiorna_timer(self):
         if not self.root.winfo_exists():  
             return
+        if PROFILER.attivo and self.prossimo_tick is not None:
+            # Quanto in ritardo arriva il tick rispetto al secondo richiesto
+            PROFILER.registra('timer (ritardo)', time.perf_counter() - self.prossimo_tick)
         if self.modello.gioco_iniziato and not self.modello.gioco_finito:
             tempo_trascorso = self.modello.ottieni_tempo_gioco()
             self.vista.aggiorna_timer(tempo_trascorso)
+        self.prossimo_tick = time.perf_counter() + 1
         self.timer_id = self.root.after(1000, self.aggiorna_timer)
     
     def aggiorna_statistiche(self):
@@ -1534,12 +2929,48 @@ class ControlloreCampoMinato:
         if statistiche:
             self.vista.mostra_finestra_statistiche(statistiche)
     
+    def ottieni_risolutore(self):
+        # Il risolutore nasce alla prima richiesta e poi segue la partita mossa per mossa
+        if self.risolutore is None:
+            self.risolutore = RisolutoreCampoMinato(self.modello)
+        return self.risolutore
+    
+    def imposta_mappa_probabilita(self, attiva):
+        if attiva:
+            self.probabilita = ProbabilitaMine(self.ottieni_risolutore())
+            self.aggiorna_probabilita()
+        else:
+            self.probabilita = None
+            self.vista.nascondi_probabilita()
+    
+    def aggiorna_probabilita(self):
+        if self.probabilita is None or self.modello.gioco_finito:
+            return
+        self.vista.mostra_probabilita(*self.probabilita.calcola())
+    
+    def mostra_suggerimento(self):
+        if self.modello.gioco_finito:
+            return
+        suggerimento = self.ottieni_risolutore().suggerimento()
+        if suggerimento is None:
+            self.vista.mostra_messaggio("Suggerimento", "Nessuna mossa certa: questa volta bisogna tentare la sorte!")
+            return
+        
+        azione, riga, colonna = suggerimento
+        colore = COLORE_SUGGERIMENTO_MINA if azione == 'bandierina' else COLORE_SUGGERIMENTO_SICURA
+        self.vista.evidenzia_cella(riga, colonna, colore)
+    
     def mostra_istruzioni(self):
         istruzioni = """
         COME GIOCARE A CAMPO MINATO:
         
         • Clic sinistro: Rivela una cella
         • Clic destro: Posiziona/Rimuovi una bandierina
+        • Clic centrale (o sinistro+destro) su un numero: se attorno
+          ci sono tante bandierine quante mine, rivela le altre celle vicine
+        • Tasto H: Evidenzia una mossa sicura
+        • Tasto P: Mostra/Nasconde la probabilità di mina di ogni cella
+        • Tasto F12: Mostra/Nasconde il profiler delle latenze
         • L'obiettivo è rivelare tutte le celle senza mine
         
         I numeri rivelati indicano quante mine ci sono nelle 
@@ -1554,28 +2985,54 @@ class ControlloreCampoMinato:
         self.vista.mostra_messaggio("Informazioni", info)
     
     def logout(self):
+        self.termina(uscita=False)
+    
+    def esci(self):
+        self.termina(uscita=True)
+    
+    def termina(self, uscita):
+        """Chiude la partita e torna a main(), che mostra il login o esce"""
         if hasattr(self, 'timer_id'):
             self.root.after_cancel(self.timer_id)
-        if hasattr(self, 'tooltip') and self.tooltip.winfo_exists():
-            self.tooltip.destroy()
-        self.root.destroy()
-        main()
+        if self.id_scritture is not None:
+            self.root.after_cancel(self.id_scritture)
+        # Nessuna partita deve andare persa: si attende che le scritture in coda siano salvate
+        if self.db.scrittore is not None:
+            self.db.scrittore.svuota()
+        if self.modello.riserva is not None:
+            self.modello.riserva.chiudi()
+        self.uscita = uscita
+        self.root.quit()
+
+
+def avvia_gioco(root, db, username):
+    """Trasforma la finestra del login in quella del gioco, senza creare un secondo Tk"""
+    root.style.theme_use('clam')
+    root.resizable(True, True)
+    root.geometry('')
+    root.minsize(300, 200)
+    return ControlloreCampoMinato(root, db, username)
 
 
 def main():
     db = GestoreDatabase()
+    # Un solo Tk per tutta la sessione: login e gioco si alternano nella stessa finestra
+    root = tk.Tk()
+    root.style = ttk.Style()
+    tema_login = root.style.theme_use()
     while True: 
-        finestra_login = FinestraLogin(db)
+        root.style.theme_use(tema_login)
+        utente = FinestraLogin(root, db).esegui()
         
-        if not finestra_login.utente_corrente: 
+        if not utente: 
             break             
-        root = tk.Tk()
-        root.style = ttk.Style()
-        root.style.theme_use('clam')
-        root.minsize(300, 200)
-        controllore = ControlloreCampoMinato(root, db, finestra_login.utente_corrente)
+        controllore = avvia_gioco(root, db, utente)
         root.mainloop()
+        controllore.vista.distruggi()
+        if controllore.uscita:
+            break
     
+    root.destroy()
     db.chiudi()
 
 if __name__ == "__main__":
@@ -0,0 +1,1472 @@
+"""Logica di Campo Minato indipendente dall'interfaccia grafica.
+
+Il modulo non importa tkinter: modello, sessioni di gioco e simulatore
+si possono usare anche senza display, per esempio in processi separati.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+try:
+    import numpy as np
+except ImportError:  # NumPy è opzionale: senza si usa il calcolo in Python puro
+    np = None
+
+
+# Oltre questa densità di mine il campionamento per scarto lascia il posto a Floyd
+DENSITA_MASSIMA_SCARTO = 0.5
+
+# Griglie estratte al massimo per cercarne una risolvibile senza indovinare
+TENTATIVI_SENZA_INDOVINARE = 500
+
+# Limiti dell'enumerazione esatta delle probabilità: oltre si passa al campionamento
+CELLE_MASSIME_ENUMERAZIONE = 64
+NODI_MASSIMI_ENUMERAZIONE = 200000
+CAMPIONI_PROBABILITA = 500
+
+# Azioni di una registrazione, nell'ordine del loro codice, e versione del formato
+AZIONI_REGISTRAZIONE = ('scopri', 'bandierina', 'accordo')
+VERSIONE_REGISTRAZIONE = 1
+
+
+def calcola_conteggi(righe, colonne, indici_mine, valore_mina=-1):
+    """Calcola le mine adiacenti di ogni cella della griglia.
+
+    indici_mine contiene gli indici piatti (riga * colonne + colonna) delle mine.
+    Restituisce una lista riga per riga con il conteggio di ogni cella e
+    valore_mina al posto delle celle minate.
+    """
+    indici_mine = list(indici_mine)
+    
+    if np is not None:
+        # Somma della maschera delle mine traslata nelle 9 posizioni della finestra 3×3
+        maschera = np.zeros((righe + 2, colonne + 2), dtype=np.int8)
+        r, c = np.divmod(np.array(indici_mine, dtype=np.int64), colonne)
+        maschera[r + 1, c + 1] = 1
+        conteggi = np.zeros((righe, colonne), dtype=np.int16)
+        for dr in range(3):
+            for dc in range(3):
+                conteggi += maschera[dr:dr + righe, dc:dc + colonne]
+        conteggi[maschera[1:-1, 1:-1] == 1] = valore_mina
+        return conteggi.ravel().tolist()
+    
+    # Senza NumPy si parte dalle mine invece che dalle celle: O(mine) anziché O(celle)
+    conteggi = [0] * (righe * colonne)
+    for indice in indici_mine:
+        riga, colonna = divmod(indice, colonne)
+        for r in range(max(0, riga-1), min(righe, riga+2)):
+            base = r * colonne
+            for c in range(max(0, colonna-1), min(colonne, colonna+2)):
+                conteggi[base + c] += 1
+    for indice in indici_mine:
+        conteggi[indice] = valore_mina
+    return conteggi
+
+
+@lru_cache(maxsize=4)
+def chiavi_griglia(righe, colonne):
+    """Coordinate (riga, colonna) di tutte le celle, nello stesso ordine degli indici piatti"""
+    return tuple((r, c) for r in range(righe) for c in range(colonne))
+
+
+def campiona_mine(righe, colonne, mine, riga_sicura, colonna_sicura, generatore=random):
+    """Sceglie gli indici piatti delle mine escludendo la zona 3×3 attorno al primo click.
+
+    Non costruisce la lista delle celle candidate: con densità bassa estrae
+    indici a caso scartando quelli già presi o nella zona sicura, altrimenti
+    usa l'algoritmo di Floyd, che richiede esattamente un'estrazione per mina.
+    A parità di generatore il risultato è sempre lo stesso.
+    """
+    zona_sicura = sorted(
+        r * colonne + c
+        for r in range(max(0, riga_sicura-1), min(righe, riga_sicura+2))
+        for c in range(max(0, colonna_sicura-1), min(colonne, colonna_sicura+2))
+    )
+    disponibili = righe * colonne - len(zona_sicura)
+    if mine > disponibili:
+        raise ValueError(f"Troppe mine: {mine} su {disponibili} celle disponibili")
+    
+    if mine <= disponibili * DENSITA_MASSIMA_SCARTO:
+        escluse = set(zona_sicura)
+        indici_mine = set()
+        while len(indici_mine) < mine:
+            indice = generatore.randrange(righe * colonne)
+            if indice not in escluse:
+                indici_mine.add(indice)
+                escluse.add(indice)
+        return indici_mine
+    
+    # Floyd sugli indici delle sole celle disponibili, poi riportati sulla griglia
+    scelti = set()
+    for j in range(disponibili - mine, disponibili):
+        t = generatore.randrange(j + 1)
+        scelti.add(j if t in scelti else t)
+    
+    indici_mine = set()
+    for indice in scelti:
+        for sicura in zona_sicura:
+            if indice >= sicura:
+                indice += 1
+        indici_mine.add(indice)
+    return indici_mine
+
+
+class ModelloCampoMinato:
+    """Gestisce la logica del gioco"""
+    def __init__(self, seme=None):
+        self.righe = 9
+        self.colonne = 9
+        self.mine = 10
+        self.difficolta = 'facile'
+        # Con lo stesso seme si ottiene la stessa sequenza di disposizioni delle mine
+        self.generatore = random.Random(seme)
+        # Modalità senza indovinare: le mine vengono disposte in modo che la partita
+        # sia risolvibile con sole deduzioni; la riserva fornisce griglie già pronte
+        self.senza_indovinare = False
+        self.riserva = None
+        # Disposizione delle mine da usare al primo clic invece di estrarla (per le riproduzioni)
+        self.mine_prefissate = None
+        self.reset_gioco()
+    
+    def reset_gioco(self):
+        self.gioco_iniziato = False
+        self.gioco_finito = False
+        self.primo_click = True
+        self.bandierine_piazzate = 0
+        self.tempo_inizio = 0
+        self.posizioni_mine = set()
+        self.mine_adiacenti = {}
+        self.celle_scoperte = set()
+        self.celle_segnate = set()
+        self.celle_sicure_rimanenti = self.righe * self.colonne - self.mine
+        # True se al primo click è stata trovata una disposizione risolvibile senza indovinare
+        self.griglia_garantita = False
+        self.prepara_riserva()
+    
+    def prepara_riserva(self):
+        """Fa generare in anticipo le griglie senza indovinare per la configurazione corrente"""
+        if self.senza_indovinare and self.riserva is not None:
+            self.riserva.prepara(self.righe, self.colonne, self.mine)
+    
+    def imposta_difficolta(self, difficolta):
+        self.difficolta = difficolta
+        if difficolta == 'facile':
+            self.righe, self.colonne, self.mine = 9, 9, 10
+        elif difficolta == 'medio':
+            self.righe, self.colonne, self.mine = 16, 16, 40
+        elif difficolta == 'difficile':
+            self.righe, self.colonne, self.mine = 16, 30, 99
+    
+    def piazza_mine(self, riga_sicura, colonna_sicura):
+        indici_mine = self.mine_prefissate
+        if indici_mine is None and self.senza_indovinare:
+            if self.riserva is not None:
+                indici_mine = self.riserva.preleva(self.righe, self.colonne, self.mine, riga_sicura, colonna_sicura)
+            if indici_mine is None:
+                griglia = genera_griglia_senza_indovinare(self.righe, self.colonne, self.mine,
+                                                          riga_sicura, colonna_sicura, self.generatore)
+                if griglia is not None:
+                    indici_mine = griglia[0]
+            # Nessuna griglia risolvibile entro i tentativi: si gioca una disposizione qualsiasi,
+            # ma chi usa il modello lo sa da griglia_garantita
+            self.griglia_garantita = indici_mine is not None
+        if indici_mine is None:
+            indici_mine = campiona_mine(self.righe, self.colonne, self.mine,
+                                        riga_sicura, colonna_sicura, self.generatore)
+        self.imposta_mine(indici_mine)
+    
+    def imposta_mine(self, indici_mine):
+        """Dispone le mine negli indici piatti indicati e calcola i conteggi"""
+        self.posizioni_mine = {divmod(i, self.colonne) for i in indici_mine}
+        self.calcola_mine_adiacenti()
+    
+    def calcola_mine_adiacenti(self):
+        indici_mine = [r * self.colonne + c for r, c in self.posizioni_mine]
+        conteggi = calcola_conteggi(self.righe, self.colonne, indici_mine)
+        self.mine_adiacenti = dict(zip(chiavi_griglia(self.righe, self.colonne), conteggi))
+    
+    def scopri_cella(self, riga, colonna):
+        if (riga, colonna) in self.celle_scoperte or (riga, colonna) in self.celle_segnate:
+            return None
+        
+        if self.primo_click:
+            self.primo_click = False
+            self.gioco_iniziato = True
+            self.tempo_inizio = time.time()
+            self.piazza_mine(riga, colonna)
+        
+        self.celle_scoperte.add((riga, colonna))
+        
+        if (riga, colonna) in self.posizioni_mine:
+            self.gioco_finito = True
+            return 'mina'
+        
+        self.celle_sicure_rimanenti -= 1
+        conteggio_mine = self.mine_adiacenti[(riga, colonna)]
+        
+        if conteggio_mine == 0:
+            return 'vuota'
+        return conteggio_mine
+    
+    def scopri_adiacenti(self, riga, colonna):
+        """Scopre l'area vuota attorno alla cella con una visita in ampiezza.
+
+        Ogni cella entra in coda al massimo una volta, quindi il costo è
+        lineare nella dimensione dell'area e non dipende dal limite di ricorsione.
+        """
+        celle_da_scoprire = set()
+        coda = deque([(riga, colonna)])
+        
+        while coda:
+            riga, colonna = coda.popleft()
+            for r in range(max(0, riga-1), min(self.righe, riga+2)):
+                for c in range(max(0, colonna-1), min(self.colonne, colonna+2)):
+                    if (r, c) in self.celle_scoperte or (r, c) in self.celle_segnate:
+                        continue
+                    celle_da_scoprire.add((r, c))
+                    self.celle_scoperte.add((r, c))
+                    if self.mine_adiacenti[(r, c)] == 0:
+                        coda.append((r, c))
+        # L'area vuota contiene solo celle sicure
+        self.celle_sicure_rimanenti -= len(celle_da_scoprire)
+        return celle_da_scoprire
+
+    def scopri_accordo(self, riga, colonna):
+        """Scopre in un colpo solo le vicine di un numero già circondato da altrettante bandierine.
+
+        Restituisce None se l'accordo non si applica, altrimenti la coppia
+        (celle scoperte, mina calpestata o None). Le aree vuote raggiunte
+        sono già espanse.
+        """
+        if self.gioco_finito or (riga, colonna) not in self.celle_scoperte:
+            return None
+        conteggio_mine = self.mine_adiacenti[(riga, colonna)]
+        vicine = [(r, c) for r in range(max(0, riga-1), min(self.righe, riga+2))
+                  for c in range(max(0, colonna-1), min(self.colonne, colonna+2))]
+        if conteggio_mine <= 0 or sum(cella in self.celle_segnate for cella in vicine) != conteggio_mine:
+            return None
+
+        celle_scoperte = []
+        mina = None
+        for cella in vicine:
+            if cella in self.celle_scoperte or cella in self.celle_segnate:
+                continue
+            self.celle_scoperte.add(cella)
+            celle_scoperte.append(cella)
+            if cella in self.posizioni_mine:
+                mina = cella
+                continue
+            self.celle_sicure_rimanenti -= 1
+            if self.mine_adiacenti[cella] == 0:
+                celle_scoperte.extend(self.scopri_adiacenti(*cella))
+        if mina is not None:
+            self.gioco_finito = True
+        return celle_scoperte, mina
+
+    def cella_scoperta(self, riga, colonna):
+        return (riga, colonna) in self.celle_scoperte
+    
+    def cella_segnata(self, riga, colonna):
+        return (riga, colonna) in self.celle_segnate
+    
+    def ottieni_mine_adiacenti(self, riga, colonna):
+        return self.mine_adiacenti[(riga, colonna)]
+    
+    def toggle_bandierina(self, riga, colonna):
+        if (riga, colonna) in self.celle_scoperte:
+            return False
+        
+        if (riga, colonna) in self.celle_segnate:
+            self.celle_segnate.remove((riga, colonna))
+            self.bandierine_piazzate -= 1
+            return 'rimossa'
+        else:
+            self.celle_segnate.add((riga, colonna))
+            self.bandierine_piazzate += 1
+            return 'aggiunta'
+    
+    def controlla_vittoria(self):
+        """Vittoria quando non restano celle sicure da scoprire, in tempo costante"""
+        if self.celle_sicure_rimanenti > 0:
+            return False
+        self.gioco_finito = True
+        return True
+    
+    def controlla_vittoria_scansione(self):
+        """Verifica la vittoria scorrendo tutta la griglia, senza modificare lo stato"""
+        for riga in range(self.righe):
+            for colonna in range(self.colonne):
+                if (riga, colonna) not in self.posizioni_mine and (riga, colonna) not in self.celle_scoperte:
+                    return False
+        return True
+    
+    def ottieni_tempo_gioco(self):
+        if not self.gioco_iniziato:
+            return 0
+        if self.gioco_finito:
+            return self.tempo_fine - self.tempo_inizio
+        return time.time() - self.tempo_inizio
+    
+    def gioco_perso(self):
+        self.gioco_finito = True
+        self.tempo_fine = time.time()
+    
+    def gioco_vinto(self):
+        self.gioco_finito = True
+        self.tempo_fine = time.time()
+
+class ModelloCampoMinatoCompatto(ModelloCampoMinato):
+    """Logica del gioco su una griglia piatta, un byte per cella.
+
+    I 4 bit bassi contengono il numero di mine adiacenti, i bit alti lo stato
+    della cella (mina, scoperta, bandierina). La cella (riga, colonna) si trova
+    all'indice riga * colonne + colonna.
+    """
+    MINA = 0x10
+    SCOPERTA = 0x20
+    BANDIERINA = 0x40
+    CONTEGGIO = 0x0F
+
+    def reset_gioco(self):
+        self.gioco_iniziato = False
+        self.gioco_finito = False
+        self.primo_click = True
+        self.bandierine_piazzate = 0
+        self.tempo_inizio = 0
+        self.celle = bytearray(self.righe * self.colonne)
+        self.indici_mine = set()
+        self.celle_sicure_rimanenti = self.righe * self.colonne - self.mine
+        self.griglia_garantita = False
+        self.prepara_riserva()
+
+    # Viste compatibili con ModelloCampoMinato: costruite al volo, da usare
+    # solo fuori dai percorsi caldi (fine partita, cambio tema)
+    @property
+    def posizioni_mine(self):
+        return {divmod(i, self.colonne) for i in self.indici_mine}
+
+    @property
+    def celle_scoperte(self):
+        return self._celle_con_bit(self.SCOPERTA)
+
+    @property
+    def celle_segnate(self):
+        return self._celle_con_bit(self.BANDIERINA)
+
+    def _celle_con_bit(self, bit):
+        colonne = self.colonne
+        return {divmod(i, colonne) for i, valore in enumerate(self.celle) if valore & bit}
+
+    def imposta_mine(self, indici_mine):
+        self.indici_mine = set(indici_mine)
+        self.calcola_mine_adiacenti()
+
+    def calcola_mine_adiacenti(self):
+        conteggi = bytearray(calcola_conteggi(self.righe, self.colonne, self.indici_mine, self.MINA))
+        # Le mine vengono piazzate al primo click: gli unici bit di stato
+        # da conservare sono le eventuali bandierine già messe
+        if self.bandierine_piazzate:
+            for i, valore in enumerate(self.celle):
+                conteggi[i] |= valore & self.BANDIERINA
+        self.celle = conteggi
+
+    def scopri_cella(self, riga, colonna):
+        i = riga * self.colonne + colonna
+        if self.celle[i] & (self.SCOPERTA | self.BANDIERINA):
+            return None
+
+        if self.primo_click:
+            self.primo_click = False
+            self.gioco_iniziato = True
+            self.tempo_inizio = time.time()
+            self.piazza_mine(riga, colonna)
+
+        self.celle[i] |= self.SCOPERTA
+        valore = self.celle[i]
+
+        if valore & self.MINA:
+            self.gioco_finito = True
+            return 'mina'
+
+        self.celle_sicure_rimanenti -= 1
+        conteggio_mine = valore & self.CONTEGGIO
+
+        if conteggio_mine == 0:
+            return 'vuota'
+        return conteggio_mine
+
+    def scopri_adiacenti(self, riga, colonna):
+        celle = self.celle
+        righe, colonne = self.righe, self.colonne
+        bloccata = self.SCOPERTA | self.BANDIERINA
+        celle_da_scoprire = []
+        coda = deque([riga * colonne + colonna])
+
+        while coda:
+            riga, colonna = divmod(coda.popleft(), colonne)
+            for r in range(max(0, riga-1), min(righe, riga+2)):
+                base = r * colonne
+                for c in range(max(0, colonna-1), min(colonne, colonna+2)):
+                    i = base + c
+                    if celle[i] & bloccata:
+                        continue
+                    celle[i] |= self.SCOPERTA
+                    celle_da_scoprire.append((r, c))
+                    if celle[i] & self.CONTEGGIO == 0:
+                        coda.append(i)
+        self.celle_sicure_rimanenti -= len(celle_da_scoprire)
+        return celle_da_scoprire
+
+    def scopri_accordo(self, riga, colonna):
+        celle = self.celle
+        colonne = self.colonne
+        valore = celle[riga * colonne + colonna]
+        if self.gioco_finito or not valore & self.SCOPERTA or valore & self.MINA:
+            return None
+        vicine = [r * colonne + c for r in range(max(0, riga-1), min(self.righe, riga+2))
+                  for c in range(max(0, colonna-1), min(colonne, colonna+2))]
+        conteggio_mine = valore & self.CONTEGGIO
+        if conteggio_mine == 0 or sum(1 for i in vicine if celle[i] & self.BANDIERINA) != conteggio_mine:
+            return None
+
+        bloccata = self.SCOPERTA | self.BANDIERINA
+        celle_scoperte = []
+        mina = None
+        for i in vicine:
+            if celle[i] & bloccata:
+                continue
+            celle[i] |= self.SCOPERTA
+            cella = divmod(i, colonne)
+            celle_scoperte.append(cella)
+            if celle[i] & self.MINA:
+                mina = cella
+                continue
+            self.celle_sicure_rimanenti -= 1
+            if celle[i] & self.CONTEGGIO == 0:
+                celle_scoperte.extend(self.scopri_adiacenti(*cella))
+        if mina is not None:
+            self.gioco_finito = True
+        return celle_scoperte, mina
+
+    def cella_scoperta(self, riga, colonna):
+        return bool(self.celle[riga * self.colonne + colonna] & self.SCOPERTA)
+
+    def cella_segnata(self, riga, colonna):
+        return bool(self.celle[riga * self.colonne + colonna] & self.BANDIERINA)
+
+    def ottieni_mine_adiacenti(self, riga, colonna):
+        valore = self.celle[riga * self.colonne + colonna]
+        return -1 if valore & self.MINA else valore & self.CONTEGGIO
+
+    def toggle_bandierina(self, riga, colonna):
+        i = riga * self.colonne + colonna
+        if self.celle[i] & self.SCOPERTA:
+            return False
+
+        self.celle[i] ^= self.BANDIERINA
+        if self.celle[i] & self.BANDIERINA:
+            self.bandierine_piazzate += 1
+            return 'aggiunta'
+        self.bandierine_piazzate -= 1
+        return 'rimossa'
+
+    def controlla_vittoria_scansione(self):
+        for valore in self.celle:
+            if not valore & (self.MINA | self.SCOPERTA):
+                return False
+        return True
+
+
+# Motori di gioco selezionabili dal controllore
+MOTORI = {
+    'insiemi': ModelloCampoMinato,
+    'compatto': ModelloCampoMinatoCompatto,
+}
+
+
+class RisolutoreCampoMinato:
+    """Deduce celle sicure e mine certe dalla frontiera scoperta di un modello.
+
+    Ogni numero scoperto con celle coperte attorno diventa un vincolo
+    (celle incognite, mine rimanenti). Le regole applicate sono quella del
+    singolo vincolo (0 mine rimanenti: tutte sicure; tante mine quante
+    incognite: tutte mine) e quella dei sottoinsiemi tra coppie di vincoli
+    che condividono celle. Dopo ogni mossa si riesaminano solo i vincoli
+    toccati, quindi il costo non dipende dalla dimensione della griglia.
+
+    Le bandierine del giocatore non entrano nelle deduzioni perché potrebbero
+    essere sbagliate; vengono consultate solo per formulare i suggerimenti.
+    """
+    def __init__(self, modello):
+        self.modello = modello
+        self.righe = modello.righe
+        self.colonne = modello.colonne
+        self.vincoli = {}
+        self.vincoli_cella = {}
+        self.sicure = set()
+        self.mine = set()
+        self.da_esaminare = set()
+
+        if modello.gioco_iniziato:
+            self.aggiorna(list(modello.celle_scoperte))
+
+    def _vicini(self, indice):
+        riga, colonna = divmod(indice, self.colonne)
+        return [r * self.colonne + c
+                for r in range(max(0, riga-1), min(self.righe, riga+2))
+                for c in range(max(0, colonna-1), min(self.colonne, colonna+2))
+                if r != riga or c != colonna]
+
+    def aggiorna(self, celle_scoperte):
+        """Aggiorna le deduzioni dopo che le celle indicate sono state scoperte"""
+        indici = [r * self.colonne + c for r, c in celle_scoperte]
+        for indice in indici:
+            self.sicure.discard(indice)
+            self._rimuovi_incognita(indice, mina=False)
+        for indice in indici:
+            self._aggiungi_vincolo(indice)
+        self._propaga()
+
+    def _aggiungi_vincolo(self, indice):
+        conteggio = self.modello.ottieni_mine_adiacenti(*divmod(indice, self.colonne))
+        if conteggio <= 0:
+            # Le celle vuote non aggiungono informazione: il flood fill scopre già i vicini
+            return
+
+        incognite = set()
+        for vicino in self._vicini(indice):
+            if vicino in self.mine:
+                conteggio -= 1
+            elif vicino not in self.sicure and not self.modello.cella_scoperta(*divmod(vicino, self.colonne)):
+                incognite.add(vicino)
+        if not incognite:
+            return
+
+        self.vincoli[indice] = [incognite, conteggio]
+        for incognita in incognite:
+            self.vincoli_cella.setdefault(incognita, set()).add(indice)
+        self.da_esaminare.add(indice)
+
+    def _rimuovi_incognita(self, indice, mina):
+        for chiave in self.vincoli_cella.pop(indice, ()):
+            vincolo = self.vincoli[chiave]
+            vincolo[0].discard(indice)
+            if mina:
+                vincolo[1] -= 1
+            if vincolo[0]:
+                self.da_esaminare.add(chiave)
+            else:
+                del self.vincoli[chiave]
+
+    def _segna(self, indici, mina):
+        for indice in indici:
+            if indice in self.mine or indice in self.sicure:
+                continue
+            (self.mine if mina else self.sicure).add(indice)
+            self._rimuovi_incognita(indice, mina)
+
+    def _propaga(self):
+        while self.da_esaminare:
+            chiave = self.da_esaminare.pop()
+            vincolo = self.vincoli.get(chiave)
+            if vincolo is None:
+                continue
+            incognite, mine_rimanenti = vincolo
+
+            if mine_rimanenti == 0:
+                self._segna(list(incognite), mina=False)
+                continue
+            if mine_rimanenti == len(incognite):
+                self._segna(list(incognite), mina=True)
+                continue
+
+            # Regola dei sottoinsiemi con i vincoli che condividono almeno una cella
+            collegati = set()
+            for incognita in incognite:
+                collegati |= self.vincoli_cella[incognita]
+            collegati.discard(chiave)
+
+            for altra in collegati:
+                altro = self.vincoli.get(altra)
+                if altro is None or chiave not in self.vincoli:
+                    continue
+                for piccolo, grande in ((vincolo, altro), (altro, vincolo)):
+                    if piccolo[0] < grande[0]:
+                        differenza = grande[0] - piccolo[0]
+                        mine_differenza = grande[1] - piccolo[1]
+                        if mine_differenza == 0:
+                            self._segna(differenza, mina=False)
+                        elif mine_differenza == len(differenza):
+                            self._segna(differenza, mina=True)
+                        break
+
+    def mossa_sicura(self):
+        """Una cella coperta e non segnata che di sicuro non contiene una mina"""
+        for indice in self.sicure:
+            riga, colonna = divmod(indice, self.colonne)
+            if not self.modello.cella_segnata(riga, colonna):
+                return 'scopri', riga, colonna
+        return None
+
+    def suggerimento(self):
+        """Restituisce il suggerimento più utile come (azione, riga, colonna), o None.
+
+        Le azioni possibili sono 'scopri' (cella sicura), 'togli_bandierina'
+        (bandierina su una cella sicura) e 'bandierina' (mina certa non segnata).
+        """
+        if not self.modello.gioco_iniziato:
+            return 'scopri', self.righe // 2, self.colonne // 2
+
+        for indice in self.sicure:
+            riga, colonna = divmod(indice, self.colonne)
+            if self.modello.cella_segnata(riga, colonna):
+                return 'togli_bandierina', riga, colonna
+
+        mossa = self.mossa_sicura()
+        if mossa:
+            return mossa
+
+        for indice in self.mine:
+            riga, colonna = divmod(indice, self.colonne)
+            if not self.modello.cella_segnata(riga, colonna):
+                return 'bandierina', riga, colonna
+        return None
+
+
+class _LimiteSuperato(Exception):
+    """Una visita delle configurazioni ha superato il numero massimo di nodi"""
+
+
+def _log_combinazioni(n, k):
+    if k < 0 or k > n:
+        return None
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+def _convoluzione(prima, seconda):
+    risultato = {}
+    for mine_a, peso_a in prima.items():
+        for mine_b, peso_b in seconda.items():
+            risultato[mine_a + mine_b] = risultato.get(mine_a + mine_b, 0.0) + peso_a * peso_b
+    return risultato
+
+
+class ProbabilitaMine:
+    """Probabilità che ogni cella coperta contenga una mina.
+
+    Parte dai vincoli ridotti del risolutore (le celle già dedotte valgono 0
+    o 1), divide la frontiera in componenti indipendenti e per ognuna conta
+    le configurazioni valide per numero di mine. Le componenti vengono poi
+    combinate pesando le celle interne, quelle coperte lontane dai numeri,
+    con il coefficiente binomiale delle mine rimaste.
+
+    Il risultato di ogni componente resta in memoria finché i suoi vincoli non
+    cambiano: dopo una mossa si rienumerano solo le componenti toccate. Le
+    componenti troppo grandi da enumerare vengono stimate per campionamento,
+    e in quel caso approssimata diventa True.
+    """
+    def __init__(self, risolutore, generatore=None):
+        self.risolutore = risolutore
+        self.modello = risolutore.modello
+        self.memoria = {}
+        self.generatore = generatore or random.Random(0)
+        self.approssimata = False
+
+    def calcola(self):
+        """Restituisce (probabilità per indice di cella, probabilità delle celle interne).
+
+        Il dizionario copre le celle di frontiera e quelle già dedotte dal
+        risolutore; ogni altra cella coperta ha la probabilità delle interne,
+        che è None quando non restano celle interne.
+        """
+        risolutore = self.risolutore
+        modello = self.modello
+        if not modello.gioco_iniziato:
+            return {}, modello.mine / (modello.righe * modello.colonne)
+
+        probabilita = dict.fromkeys(risolutore.mine, 1.0)
+        probabilita.update(dict.fromkeys(risolutore.sicure, 0.0))
+
+        self.approssimata = False
+        memoria = {}
+        risultati = []
+        for componente in self._componenti():
+            risultato = self.memoria.get(componente)
+            if risultato is None:
+                risultato = self._enumera(componente)
+            memoria[componente] = risultato
+            risultati.append(risultato)
+            self.approssimata = self.approssimata or risultato[3]
+        self.memoria = memoria
+
+        mine_rimaste = modello.mine - len(risolutore.mine)
+        coperte = modello.mine + modello.celle_sicure_rimanenti
+        frontiera = sum(len(risultato[2]) for risultato in risultati)
+        interne = coperte - frontiera - len(risolutore.mine) - len(risolutore.sicure)
+
+        prefissi = [{0: 1.0}]
+        for pesi, _, _, _ in risultati:
+            prefissi.append(_convoluzione(prefissi[-1], pesi))
+        suffissi = [{0: 1.0}]
+        for pesi, _, _, _ in reversed(risultati):
+            suffissi.append(_convoluzione(suffissi[-1], pesi))
+        suffissi.reverse()
+
+        # Peso delle celle interne quando la frontiera contiene s mine: C(interne, mine_rimaste - s)
+        logaritmi = {}
+        for mine_frontiera in prefissi[-1]:
+            logaritmo = _log_combinazioni(interne, mine_rimaste - mine_frontiera)
+            if logaritmo is not None:
+                logaritmi[mine_frontiera] = logaritmo
+        if not logaritmi:
+            # Vincoli incoerenti col numero di mine: nessuna stima possibile
+            return probabilita, mine_rimaste / interne if interne > 0 else None
+        massimo = max(logaritmi.values())
+        peso_interne = {s: math.exp(logaritmo - massimo) for s, logaritmo in logaritmi.items()}
+
+        totale = sum(peso * peso_interne.get(s, 0.0) for s, peso in prefissi[-1].items())
+        for posizione, (pesi, conteggi, celle, _) in enumerate(risultati):
+            resto = _convoluzione(prefissi[posizione], suffissi[posizione + 1])
+            for cella in celle:
+                probabilita[cella] = 0.0
+            for mine_componente in pesi:
+                fattore = sum(peso * peso_interne.get(mine_componente + s, 0.0) for s, peso in resto.items())
+                if not fattore:
+                    continue
+                for cella, conteggio in zip(celle, conteggi[mine_componente]):
+                    probabilita[cella] += conteggio * fattore / totale
+
+        if interne <= 0:
+            return probabilita, None
+        mine_attese = sum(peso * peso_interne.get(s, 0.0) * (mine_rimaste - s)
+                          for s, peso in prefissi[-1].items())
+        return probabilita, mine_attese / (totale * interne)
+
+    def _componenti(self):
+        """Raggruppa i vincoli del risolutore in componenti che non condividono celle"""
+        vincoli = list(self.risolutore.vincoli.values())
+        padre = {}
+
+        def radice(cella):
+            while padre[cella] != cella:
+                padre[cella] = padre[padre[cella]]
+                cella = padre[cella]
+            return cella
+
+        for incognite, _ in vincoli:
+            celle = iter(incognite)
+            prima = next(celle)
+            padre.setdefault(prima, prima)
+            principale = radice(prima)
+            for cella in celle:
+                padre.setdefault(cella, cella)
+                altra = radice(cella)
+                if altra != principale:
+                    padre[altra] = principale
+
+        gruppi = {}
+        for incognite, mine in vincoli:
+            gruppi.setdefault(radice(next(iter(incognite))), set()).add((frozenset(incognite), mine))
+        return [frozenset(gruppo) for gruppo in gruppi.values()]
+
+    def _enumera(self, componente):
+        """Conta le configurazioni valide della componente per numero di mine.
+
+        Restituisce (pesi, conteggi, celle, approssimata): pesi[k] è il numero
+        (normalizzato) di configurazioni con k mine, conteggi[k][j] quante di
+        queste hanno una mina nella cella celle[j].
+        """
+        celle = tuple(sorted(set().union(*(incognite for incognite, _ in componente))))
+        posizione = {cella: j for j, cella in enumerate(celle)}
+        obiettivi = []
+        vincoli_cella = [[] for _ in celle]
+        for numero, (incognite, mine) in enumerate(componente):
+            obiettivi.append(mine)
+            for cella in incognite:
+                vincoli_cella[posizione[cella]].append(numero)
+        libere = [len(incognite) for incognite, _ in componente]
+
+        pesi = {}
+        conteggi = {}
+        approssimata = False
+        try:
+            if len(celle) > CELLE_MASSIME_ENUMERAZIONE:
+                raise _LimiteSuperato
+            soluzioni = self._cerca(vincoli_cella, obiettivi, libere, NODI_MASSIMI_ENUMERAZIONE)
+            for assegnazione in soluzioni:
+                self._registra(assegnazione, pesi, conteggi)
+        except _LimiteSuperato:
+            approssimata = True
+            pesi, conteggi = {}, {}
+            limite_campione = max(1000, 20 * len(celle))
+            for _ in range(CAMPIONI_PROBABILITA):
+                try:
+                    assegnazione = next(self._cerca(vincoli_cella, obiettivi, libere, limite_campione,
+                                                    self.generatore))
+                except (StopIteration, _LimiteSuperato):
+                    continue
+                self._registra(assegnazione, pesi, conteggi)
+
+        if not pesi:
+            # Nessuna configurazione trovata: densità locale dei vincoli come stima
+            densita = [sum(obiettivi[v] / libere[v] for v in vincoli) / len(vincoli) for vincoli in vincoli_cella]
+            return {round(sum(densita)): 1.0}, {round(sum(densita)): densita}, celle, True
+
+        massimo = max(pesi.values())
+        pesi = {mine: peso / massimo for mine, peso in pesi.items()}
+        conteggi = {mine: [c / massimo for c in conteggio] for mine, conteggio in conteggi.items()}
+        return pesi, conteggi, celle, approssimata
+
+    @staticmethod
+    def _registra(assegnazione, pesi, conteggi):
+        mine = sum(assegnazione)
+        pesi[mine] = pesi.get(mine, 0) + 1
+        conteggio = conteggi.setdefault(mine, [0] * len(assegnazione))
+        for j, valore in enumerate(assegnazione):
+            if valore:
+                conteggio[j] += 1
+
+    @staticmethod
+    def _cerca(vincoli_cella, obiettivi, libere, nodi_massimi, generatore=None):
+        """Visita in profondità (senza ricorsione) le assegnazioni che rispettano i vincoli.
+
+        Genera ogni soluzione trovata; con un generatore casuale l'ordine dei
+        valori provati è casuale, e la prima soluzione è un campione.
+        """
+        n = len(vincoli_cella)
+        assegnate = [0] * len(obiettivi)
+        libere = list(libere)
+        assegnazione = [0] * n
+        ordini = [None] * n
+        tentativi = [0] * n
+        nodi = 0
+
+        def ordine():
+            if generatore is not None and generatore.random() < 0.5:
+                return (1, 0)
+            return (0, 1)
+
+        if n == 0:
+            yield assegnazione
+            return
+
+        profondita = 0
+        ordini[0] = ordine()
+        while profondita >= 0:
+            vincoli = vincoli_cella[profondita]
+            if tentativi[profondita]:
+                # Annulla il valore provato in precedenza a questa profondità
+                valore = ordini[profondita][tentativi[profondita] - 1]
+                for v in vincoli:
+                    libere[v] += 1
+                    assegnate[v] -= valore
+            if tentativi[profondita] == 2:
+                tentativi[profondita] = 0
+                profondita -= 1
+                continue
+
+            valore = ordini[profondita][tentativi[profondita]]
+            tentativi[profondita] += 1
+            nodi += 1
+            if nodi > nodi_massimi:
+                raise _LimiteSuperato
+            for v in vincoli:
+                libere[v] -= 1
+                assegnate[v] += valore
+            if not all(assegnate[v] <= obiettivi[v] <= assegnate[v] + libere[v] for v in vincoli):
+                continue
+
+            assegnazione[profondita] = valore
+            if profondita == n - 1:
+                yield assegnazione
+                continue
+            profondita += 1
+            ordini[profondita] = ordine()
+
+
+def griglia_risolvibile(righe, colonne, indici_mine, riga, colonna):
+    """Verifica se il risolutore finisce la partita partendo dalla cella indicata.
+
+    Restituisce l'insieme degli indici delle celle vuote scoperte dalla prima
+    apertura (da ognuna si ottiene la stessa apertura, quindi la stessa partita),
+    oppure None se a un certo punto servirebbe tirare a indovinare.
+    """
+    modello = ModelloCampoMinatoCompatto()
+    modello.righe, modello.colonne, modello.mine = righe, colonne, len(indici_mine)
+    modello.reset_gioco()
+    modello.imposta_mine(indici_mine)
+    modello.primo_click = False
+    modello.gioco_iniziato = True
+
+    if modello.scopri_cella(riga, colonna) != 'vuota':
+        return None
+    prima_apertura = [(riga, colonna)] + modello.scopri_adiacenti(riga, colonna)
+    avvii = {r * colonne + c for r, c in prima_apertura if modello.ottieni_mine_adiacenti(r, c) == 0}
+
+    risolutore = RisolutoreCampoMinato(modello)
+    while modello.celle_sicure_rimanenti:
+        mossa = risolutore.mossa_sicura()
+        if mossa is None:
+            return None
+        _, r, c = mossa
+        scoperte = [(r, c)]
+        if modello.scopri_cella(r, c) == 'vuota':
+            scoperte.extend(modello.scopri_adiacenti(r, c))
+        risolutore.aggiorna(scoperte)
+    return avvii
+
+
+def genera_griglia_senza_indovinare(righe, colonne, mine, riga, colonna, generatore=random,
+                                    tentativi=None):
+    """Estrae griglie finché ne trova una risolvibile senza indovinare dalla cella indicata.
+
+    Restituisce (indici_mine, avvii) come griglia_risolvibile, oppure None se
+    nessuna delle griglie provate è risolvibile.
+    """
+    for _ in range(tentativi or TENTATIVI_SENZA_INDOVINARE):
+        indici_mine = campiona_mine(righe, colonne, mine, riga, colonna, generatore)
+        avvii = griglia_risolvibile(righe, colonne, indici_mine, riga, colonna)
+        if avvii is not None:
+            return indici_mine, avvii
+    return None
+
+
+def _genera_per_riserva(righe, colonne, mine, riga, colonna, seme):
+    return genera_griglia_senza_indovinare(righe, colonne, mine, riga, colonna, random.Random(seme))
+
+
+class RiservaGriglie:
+    """Scorta di griglie senza indovinare generate in anticipo da processi separati.
+
+    Le griglie sono raccolte per configurazione (righe, colonne, mine) e per
+    regione del primo click, con la griglia divisa in REGIONI × REGIONI zone.
+    Una griglia vale per qualunque primo click su una delle celle vuote della
+    sua prima apertura; di ogni griglia generata si conservano anche le tre
+    immagini speculari, che valgono per le regioni opposte.
+    """
+    REGIONI = 3
+
+    def __init__(self, processi=1, scorta=2):
+        self.processi = processi
+        self.scorta = scorta
+        self.griglie = {}
+        self.in_corso = {}
+        self.lavori = set()
+        self.lucchetto = threading.Lock()
+        self.generatore = random.Random()
+        self.esecutore = None
+
+    def regione(self, righe, colonne, riga, colonna):
+        return riga * self.REGIONI // righe, colonna * self.REGIONI // colonne
+
+    def disponibili(self, righe, colonne, mine):
+        """Numero di griglie pronte per la configurazione"""
+        with self.lucchetto:
+            return sum(len(lista) for lista in self.griglie.get((righe, colonne, mine), {}).values())
+
+    def prepara(self, righe, colonne, mine):
+        """Avvia la generazione delle griglie che mancano alla scorta di ogni regione"""
+        configurazione = (righe, colonne, mine)
+        with self.lucchetto:
+            if self.esecutore is None:
+                # spawn: i processi non devono ereditare lo stato dell'interfaccia grafica
+                self.esecutore = ProcessPoolExecutor(max_workers=self.processi,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            per_regione = self.griglie.setdefault(configurazione, {})
+
+            for riga_regione in range(self.REGIONI):
+                for colonna_regione in range(self.REGIONI):
+                    regione = (riga_regione, colonna_regione)
+                    chiave = (configurazione, regione)
+                    mancanti = self.scorta - len(per_regione.get(regione, ())) - self.in_corso.get(chiave, 0)
+                    # Il primo click parte dal centro della regione
+                    riga = (2 * riga_regione + 1) * righe // (2 * self.REGIONI)
+                    colonna = (2 * colonna_regione + 1) * colonne // (2 * self.REGIONI)
+                    for _ in range(mancanti):
+                        lavoro = self.esecutore.submit(_genera_per_riserva, righe, colonne, mine,
+                                                       riga, colonna, self.generatore.getrandbits(64))
+                        self.in_corso[chiave] = self.in_corso.get(chiave, 0) + 1
+                        self.lavori.add(lavoro)
+                        lavoro.add_done_callback(partial(self._aggiungi, chiave, riga * colonne + colonna))
+
+    def _aggiungi(self, chiave, avvio, lavoro):
+        configurazione, _ = chiave
+        righe, colonne, _ = configurazione
+        with self.lucchetto:
+            self.lavori.discard(lavoro)
+            self.in_corso[chiave] -= 1
+            if lavoro.cancelled() or lavoro.exception() is not None or lavoro.result() is None:
+                return
+            indici_mine, avvii = lavoro.result()
+            per_regione = self.griglie.setdefault(configurazione, {})
+
+            for specchia_righe in (False, True):
+                for specchia_colonne in (False, True):
+                    def trasforma(indice):
+                        riga, colonna = divmod(indice, colonne)
+                        if specchia_righe:
+                            riga = righe - 1 - riga
+                        if specchia_colonne:
+                            colonna = colonne - 1 - colonna
+                        return riga * colonne + colonna
+                    avvii_trasformati = {trasforma(i) for i in avvii}
+                    riga, colonna = divmod(trasforma(avvio), colonne)
+                    lista = per_regione.setdefault(self.regione(righe, colonne, riga, colonna), [])
+                    if len(lista) < 4 * self.scorta:
+                        lista.append(({trasforma(i) for i in indici_mine}, avvii_trasformati))
+
+    def preleva(self, righe, colonne, mine, riga, colonna):
+        """Toglie dalla scorta una griglia valida per il primo click indicato.
+
+        Restituisce gli indici delle mine, oppure None se nessuna griglia pronta
+        va bene per quella cella.
+        """
+        configurazione = (righe, colonne, mine)
+        indice = riga * colonne + colonna
+        indici_mine = None
+        with self.lucchetto:
+            per_regione = self.griglie.get(configurazione, {})
+            regione = self.regione(righe, colonne, riga, colonna)
+            # Prima la regione del click, poi le altre: le aperture possono sconfinare
+            for chiave in [regione] + [r for r in per_regione if r != regione]:
+                lista = per_regione.get(chiave, [])
+                for posizione, (mine_griglia, avvii) in enumerate(lista):
+                    if indice in avvii:
+                        indici_mine = mine_griglia
+                        del lista[posizione]
+                        break
+                if indici_mine is not None:
+                    break
+        if indici_mine is not None:
+            self.prepara(righe, colonne, mine)
+        return indici_mine
+
+    def chiudi(self):
+        """Annulla le generazioni in attesa e libera i processi"""
+        with self.lucchetto:
+            lavori = list(self.lavori)
+            esecutore, self.esecutore = self.esecutore, None
+        # Fuori dal lucchetto: cancel() chiama subito _aggiungi, che lo deve prendere
+        for lavoro in lavori:
+            lavoro.cancel()
+        if esecutore is not None:
+            esecutore.shutdown(wait=False, cancel_futures=True)
+
+
+class SessioneCampoMinato:
+    """Partita di Campo Minato pilotabile da codice, senza interfaccia grafica.
+
+    Riproduce il flusso del controllore grafico: scopre la cella, espande le
+    aree vuote, riconosce vittoria e sconfitta.
+    """
+    def __init__(self, difficolta='facile', righe=None, colonne=None, mine=None, motore='compatto', seme=None,
+                 senza_indovinare=False, indici_mine=None):
+        self.modello = MOTORI[motore](seme)
+        self.modello.senza_indovinare = senza_indovinare
+        self.modello.mine_prefissate = indici_mine
+        self.modello.imposta_difficolta(difficolta)
+        if righe is not None:
+            self.modello.righe = righe
+            self.modello.colonne = colonne
+            self.modello.mine = mine
+            self.modello.difficolta = 'personalizzata'
+        self.modello.reset_gioco()
+        self.mosse = 0
+        self.esito = None
+        self._risolutore = None
+        self._probabilita = None
+
+    @property
+    def risolutore(self):
+        """Risolutore della partita, creato al primo uso e poi aggiornato a ogni mossa"""
+        if self._risolutore is None:
+            self._risolutore = RisolutoreCampoMinato(self.modello)
+        return self._risolutore
+
+    @property
+    def probabilita(self):
+        """Calcolo delle probabilità di mina, che riusa i risultati tra una mossa e l'altra"""
+        if self._probabilita is None:
+            self._probabilita = ProbabilitaMine(self.risolutore)
+        return self._probabilita
+
+    @property
+    def righe(self):
+        return self.modello.righe
+
+    @property
+    def colonne(self):
+        return self.modello.colonne
+
+    @property
+    def terminata(self):
+        return self.modello.gioco_finito
+
+    def scopri(self, riga, colonna):
+        """Scopre una cella e restituisce la lista delle celle scoperte"""
+        modello = self.modello
+        self.mosse += 1
+        if modello.gioco_finito:
+            return []
+
+        risultato = modello.scopri_cella(riga, colonna)
+        if risultato is None:
+            return []
+
+        if risultato == 'mina':
+            modello.gioco_perso()
+            self.esito = 'sconfitta'
+            return [(riga, colonna)]
+
+        scoperte = [(riga, colonna)]
+        if risultato == 'vuota':
+            scoperte.extend(modello.scopri_adiacenti(riga, colonna))
+
+        if modello.controlla_vittoria():
+            modello.gioco_vinto()
+            self.esito = 'vittoria'
+        elif self._risolutore is not None:
+            self._risolutore.aggiorna(scoperte)
+        return scoperte
+
+    def accordo(self, riga, colonna):
+        """Scopre le vicine di un numero già soddisfatto dalle bandierine e restituisce la lista delle celle scoperte"""
+        modello = self.modello
+        self.mosse += 1
+        risultato = modello.scopri_accordo(riga, colonna)
+        if risultato is None:
+            return []
+
+        scoperte, mina = risultato
+        if mina is not None:
+            modello.gioco_perso()
+            self.esito = 'sconfitta'
+        elif modello.controlla_vittoria():
+            modello.gioco_vinto()
+            self.esito = 'vittoria'
+        elif self._risolutore is not None:
+            self._risolutore.aggiorna(scoperte)
+        return scoperte
+
+    def bandierina(self, riga, colonna):
+        """Mette o toglie una bandierina: restituisce 'aggiunta', 'rimossa' o False"""
+        self.mosse += 1
+        if self.modello.gioco_finito:
+            return False
+        return self.modello.toggle_bandierina(riga, colonna)
+
+    def mossa(self, azione, riga, colonna):
+        """Esegue una mossa ('scopri', 'bandierina' o 'accordo') e restituisce il risultato del metodo relativo"""
+        if azione == 'scopri':
+            return self.scopri(riga, colonna)
+        elif azione == 'bandierina':
+            return self.bandierina(riga, colonna)
+        elif azione == 'accordo':
+            return self.accordo(riga, colonna)
+        raise ValueError(f"Mossa sconosciuta: {azione}")
+
+    def stato_cella(self, riga, colonna):
+        """None se la cella è coperta, 'bandierina' se segnata, altrimenti le mine adiacenti (-1 per una mina)"""
+        if self.modello.cella_scoperta(riga, colonna):
+            return self.modello.ottieni_mine_adiacenti(riga, colonna)
+        if self.modello.cella_segnata(riga, colonna):
+            return 'bandierina'
+        return None
+
+    def celle_coperte(self):
+        """Celle né scoperte né segnate"""
+        for riga in range(self.righe):
+            for colonna in range(self.colonne):
+                if self.stato_cella(riga, colonna) is None:
+                    yield riga, colonna
+
+    def progresso(self):
+        """Frazione delle celle sicure già scoperte"""
+        sicure = self.righe * self.colonne - self.modello.mine
+        return 1 - self.modello.celle_sicure_rimanenti / sicure if sicure else 1.0
+
+
+def scrivi_varint(buffer, numero):
+    """Aggiunge al bytearray un intero non negativo, 7 bit per byte"""
+    while numero >= 0x80:
+        buffer.append(numero & 0x7f | 0x80)
+        numero >>= 7
+    buffer.append(numero)
+
+
+def leggi_varint(dati, posizione):
+    """Legge un intero scritto con scrivi_varint: restituisce (numero, posizione successiva)"""
+    numero = spostamento = 0
+    while True:
+        byte = dati[posizione]
+        posizione += 1
+        numero |= (byte & 0x7f) << spostamento
+        if byte < 0x80:
+            return numero, posizione
+        spostamento += 7
+
+
+class RegistrazionePartita:
+    """Mosse di una partita con i tempi e la disposizione delle mine, per poterla rigiocare.
+
+    codifica() produce pochi byte: versione, righe, colonne, numero di mine,
+    indici delle mine ordinati (come differenze dal precedente) e, per ogni
+    mossa, indice * 3 + azione e i millisecondi dalla mossa precedente, tutti
+    come varint. Una partita facile occupa tipicamente meno di 200 byte.
+    """
+    def __init__(self, righe, colonne, indici_mine=(), mosse=None):
+        self.righe = righe
+        self.colonne = colonne
+        self.indici_mine = sorted(indici_mine)
+        self.mosse = mosse if mosse is not None else []  # (azione, riga, colonna, millisecondi)
+        self.ultimo_istante = None
+
+    def registra(self, azione, riga, colonna, istante=None):
+        """Aggiunge una mossa: il tempo conta dalla mossa precedente (la prima vale 0)"""
+        if istante is None:
+            istante = time.perf_counter()
+        millisecondi = 0 if self.ultimo_istante is None else round((istante - self.ultimo_istante) * 1000)
+        self.ultimo_istante = istante
+        self.mosse.append((azione, riga, colonna, millisecondi))
+
+    def durata(self):
+        """Secondi tra la prima e l'ultima mossa"""
+        return sum(mossa[3] for mossa in self.mosse) / 1000
+
+    def codifica(self):
+        dati = bytearray()
+        for numero in (VERSIONE_REGISTRAZIONE, self.righe, self.colonne, len(self.indici_mine)):
+            scrivi_varint(dati, numero)
+        precedente = 0
+        for indice in self.indici_mine:
+            scrivi_varint(dati, indice - precedente)
+            precedente = indice
+        for azione, riga, colonna, millisecondi in self.mosse:
+            scrivi_varint(dati, (riga * self.colonne + colonna) * 3 + AZIONI_REGISTRAZIONE.index(azione))
+            scrivi_varint(dati, millisecondi)
+        return bytes(dati)
+
+    @classmethod
+    def decodifica(cls, dati):
+        versione, posizione = leggi_varint(dati, 0)
+        if versione != VERSIONE_REGISTRAZIONE:
+            raise ValueError(f"Versione della registrazione non supportata: {versione}")
+        righe, posizione = leggi_varint(dati, posizione)
+        colonne, posizione = leggi_varint(dati, posizione)
+        mine, posizione = leggi_varint(dati, posizione)
+        indici_mine = []
+        indice = 0
+        for _ in range(mine):
+            differenza, posizione = leggi_varint(dati, posizione)
+            indice += differenza
+            indici_mine.append(indice)
+        mosse = []
+        while posizione < len(dati):
+            codice, posizione = leggi_varint(dati, posizione)
+            millisecondi, posizione = leggi_varint(dati, posizione)
+            riga, colonna = divmod(codice // 3, colonne)
+            mosse.append((AZIONI_REGISTRAZIONE[codice % 3], riga, colonna, millisecondi))
+        return cls(righe, colonne, indici_mine, mosse)
+
+
+def riproduci_partita(registrazione, velocita=None, motore='compatto', ad_ogni_mossa=None):
+    """Rigioca una registrazione su una sessione senza interfaccia e la restituisce a fine partita.
+
+    velocita 1 rispetta i tempi originali, valori maggiori li accorciano,
+    None esegue tutte le mosse subito. ad_ogni_mossa(azione, riga, colonna,
+    risultato) viene chiamata dopo ogni mossa.
+    """
+    sessione = SessioneCampoMinato(righe=registrazione.righe, colonne=registrazione.colonne,
+                                   mine=len(registrazione.indici_mine), motore=motore,
+                                   indici_mine=registrazione.indici_mine)
+    for azione, riga, colonna, millisecondi in registrazione.mosse:
+        if velocita:
+            time.sleep(millisecondi / 1000 / velocita)
+        risultato = sessione.mossa(azione, riga, colonna)
+        if ad_ogni_mossa is not None:
+            ad_ogni_mossa(azione, riga, colonna, risultato)
+    return sessione
+
+
+# Un bot riceve la sessione e un generatore casuale e restituisce la mossa
+# successiva come ('scopri' | 'bandierina' | 'accordo', riga, colonna).
+
+def bot_casuale(sessione, generatore):
+    """Scopre una cella coperta a caso"""
+    while True:
+        riga = generatore.randrange(sessione.righe)
+        colonna = generatore.randrange(sessione.colonne)
+        if sessione.stato_cella(riga, colonna) is None:
+            return 'scopri', riga, colonna
+
+
+class BotCopione:
+    """Ripete una sequenza prefissata di mosse, poi continua con un altro bot"""
+    def __init__(self, mosse, bot_successivo=bot_casuale):
+        self.mosse = list(mosse)
+        self.bot_successivo = bot_successivo
+
+    def __call__(self, sessione, generatore):
+        if sessione.mosse < len(self.mosse):
+            return self.mosse[sessione.mosse]
+        return self.bot_successivo(sessione, generatore)
+
+
+def bot_risolutore(sessione, generatore):
+    """Gioca le mosse certe del risolutore e tira a indovinare solo quando mancano"""
+    if not sessione.modello.gioco_iniziato:
+        return 'scopri', sessione.righe // 2, sessione.colonne // 2
+
+    risolutore = sessione.risolutore
+    mossa = risolutore.mossa_sicura()
+    if mossa:
+        return mossa
+    while True:
+        azione, riga, colonna = bot_casuale(sessione, generatore)
+        if riga * sessione.colonne + colonna not in risolutore.mine:
+            return azione, riga, colonna
+
+
+def bot_probabilita(sessione, generatore):
+    """Come il bot risolutore, ma quando deve tentare sceglie la cella meno rischiosa"""
+    if not sessione.modello.gioco_iniziato:
+        return 'scopri', sessione.righe // 2, sessione.colonne // 2
+
+    mossa = sessione.risolutore.mossa_sicura()
+    if mossa:
+        return mossa
+
+    probabilita, probabilita_interne = sessione.probabilita.calcola()
+    candidate = [(valore, indice) for indice, valore in probabilita.items()
+                 if sessione.stato_cella(*divmod(indice, sessione.colonne)) is None]
+    migliore = min(candidate, default=None)
+    if probabilita_interne is not None and (migliore is None or probabilita_interne < migliore[0]):
+        # Una cella interna a caso, lontana dalla frontiera
+        while True:
+            azione, riga, colonna = bot_casuale(sessione, generatore)
+            if riga * sessione.colonne + colonna not in probabilita:
+                return azione, riga, colonna
+    return ('scopri',) + divmod(migliore[1], sessione.colonne)
+
+
+# Bot selezionabili per nome (utile per passarli ai processi del simulatore)
+BOT = {
+    'casuale': bot_casuale,
+    'risolutore': bot_risolutore,
+    'probabilita': bot_probabilita,
+}
+
+
+def gioca_partita(sessione, bot, generatore, mosse_massime=None):
+    """Fa giocare al bot una partita completa e restituisce l'esito (None se interrotta)"""
+    if mosse_massime is None:
+        mosse_massime = 4 * sessione.righe * sessione.colonne
+
+    while not sessione.terminata and sessione.mosse < mosse_massime:
+        sessione.mossa(*bot(sessione, generatore))
+    return sessione.esito
+
+
+def _simula_blocco(impostazioni, bot, semi):
+    """Gioca un gruppo di partite in un processo del simulatore e ne somma i risultati"""
+    bot = BOT.get(bot, bot)
+    totali = {'vittorie': 0, 'sconfitte': 0, 'interrotte': 0, 'mosse': 0, 'progresso': 0.0}
+
+    for seme in semi:
+        sessione = SessioneCampoMinato(seme=2 * seme, **impostazioni)
+        esito = gioca_partita(sessione, bot, random.Random(2 * seme + 1))
+        if esito == 'vittoria':
+            totali['vittorie'] += 1
+        elif esito == 'sconfitta':
+            totali['sconfitte'] += 1
+        else:
+            totali['interrotte'] += 1
+        totali['mosse'] += sessione.mosse
+        totali['progresso'] += sessione.progresso()
+    return totali
+
+
+def simula_partite(partite, difficolta='facile', bot='casuale', processi=None, seme=0,
+                   motore='compatto', righe=None, colonne=None, mine=None, senza_indovinare=False):
+    """Gioca molte partite in parallelo su un ProcessPoolExecutor.
+
+    bot è il nome di un bot in BOT oppure una funzione importabile dai processi.
+    La partita i-esima ha numero n = seme + i: la sua griglia usa il seme 2n e
+    le mosse del bot il seme 2n + 1, così le due sequenze casuali restano
+    distinte e i risultati non dipendono dal numero di processi. Con
+    processi=1 tutto gira nel processo corrente.
+    """
+    impostazioni = {'difficolta': difficolta, 'righe': righe, 'colonne': colonne,
+                    'mine': mine, 'motore': motore, 'senza_indovinare': senza_indovinare}
+    processi = processi or os.cpu_count() or 1
+    dimensione_blocco = max(1, -(-partite // (processi * 4)))
+    blocchi = [range(inizio, min(inizio + dimensione_blocco, seme + partite))
+               for inizio in range(seme, seme + partite, dimensione_blocco)]
+
+    inizio = time.perf_counter()
+    if processi == 1:
+        parziali = [_simula_blocco(impostazioni, bot, semi) for semi in blocchi]
+    else:
+        with ProcessPoolExecutor(max_workers=processi) as esecutore:
+            parziali = list(esecutore.map(_simula_blocco, [impostazioni] * len(blocchi),
+                                          [bot] * len(blocchi), blocchi))
+    durata = time.perf_counter() - inizio
+
+    # Un blocco senza partite dà i totali a zero: il risultato ha tutte le chiavi anche con 0 partite
+    risultato = _simula_blocco(impostazioni, bot, ())
+    for parziale in parziali:
+        for chiave in risultato:
+            risultato[chiave] += parziale[chiave]
+    risultato.update({
+        'partite': partite,
+        'processi': processi,
+        'durata': durata,
+        'partite_al_secondo': partite / durata if durata else 0.0,
+        'percentuale_vittorie': 100 * risultato['vittorie'] / partite if partite else 0.0,
+        'mosse_medie': risultato['mosse'] / partite if partite else 0.0,
+        'progresso_medio': risultato['progresso'] / partite if partite else 0.0,
+    })
+    return risultato
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulatore di partite di Campo Minato senza interfaccia")
+    parser.add_argument('--partite', type=int, default=1000)
+    parser.add_argument('--difficolta', default='facile', choices=['facile', 'medio', 'difficile'])
+    parser.add_argument('--righe', type=int, help="griglia personalizzata (richiede anche --colonne e --mine)")
+    parser.add_argument('--colonne', type=int)
+    parser.add_argument('--mine', type=int)
+    parser.add_argument('--bot', default='casuale', choices=sorted(BOT))
+    parser.add_argument('--processi', type=int, help="processi da usare (predefinito: uno per CPU)")
+    parser.add_argument('--seme', type=int, default=0)
+    parser.add_argument('--motore', default='compatto', choices=sorted(MOTORI))
+    parser.add_argument('--senza-indovinare', action='store_true', help="solo griglie risolvibili senza tentativi")
+    args = parser.parse_args()
+
+    if args.righe is not None and (args.colonne is None or args.mine is None):
+        parser.error("--righe richiede anche --colonne e --mine")
+    if args.partite < 1:
+        parser.error("--partite deve essere almeno 1")
+
+
+    risultato = simula_partite(args.partite, args.difficolta, args.bot, args.processi, args.seme,
+                               args.motore, args.righe, args.colonne, args.mine, args.senza_indovinare)
+
+    print(f"Partite:         {risultato['partite']} su {risultato['processi']} processi")
+    print(f"Durata:          {risultato['durata']:.2f}s ({risultato['partite_al_secondo']:.0f} partite/s)")
+    print(f"Vittorie:        {risultato['vittorie']} ({risultato['percentuale_vittorie']:.1f}%)")
+    print(f"Sconfitte:       {risultato['sconfitte']}")
+    print(f"Interrotte:      {risultato['interrotte']}")
+    print(f"Mosse medie:     {risultato['mosse_medie']:.1f}")
+    print(f"Progresso medio: {risultato['progresso_medio']:.1%} delle celle sicure")
+
+
+if __name__ == "__main__":
+    main()
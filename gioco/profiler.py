@@ -0,0 +1,102 @@
+"""Misura delle latenze del ciclo degli eventi di Tk.
+
+Le callback del controllore e della vista vengono decorate con
+misura_latenza: quando il profiler è attivo ne registra la durata e il
+tempo fino a quando Tk ha finito di ridisegnare la finestra. Il tempo
+passato nelle finestre di dialogo modali non viene conteggiato.
+"""
+import csv
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from tkinter import TclError
+
+# Campioni conservati per ogni misura: i più vecchi vengono scartati
+CAMPIONI_MASSIMI = 2000
+
+
+def percentile(valori_ordinati, frazione):
+    """Percentile con il metodo del rango più vicino su una lista già ordinata"""
+    if not valori_ordinati:
+        return 0.0
+    indice = max(0, math.ceil(frazione * len(valori_ordinati)) - 1)
+    return valori_ordinati[indice]
+
+
+class ProfilerLatenze:
+    """Raccoglie le durate (in secondi) delle callback, divise per nome"""
+    def __init__(self, campioni_massimi=CAMPIONI_MASSIMI):
+        self.attivo = False
+        self.campioni_massimi = campioni_massimi
+        self.campioni = {}
+        # Secondi trascorsi in attesa dell'utente (dialoghi modali), da sottrarre alle durate
+        self.tempo_bloccato = 0.0
+
+    def registra(self, nome, durata):
+        if nome not in self.campioni:
+            self.campioni[nome] = deque(maxlen=self.campioni_massimi)
+        self.campioni[nome].append(durata)
+
+    @contextmanager
+    def pausa(self):
+        """Esclude dalle misure il tempo passato nel blocco (per esempio in un messagebox)"""
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tempo_bloccato += time.perf_counter() - inizio
+
+    def misura_disegno(self, root, nome, inizio, bloccato):
+        """Registra il tempo dall'inizio della callback a quando Tk ha ridisegnato la finestra"""
+        def fine():
+            try:
+                root.update_idletasks()
+            except TclError:  # Finestra chiusa nel frattempo
+                return
+            self.registra(f"{nome} → disegno", time.perf_counter() - inizio - (self.tempo_bloccato - bloccato))
+        try:
+            root.after_idle(fine)
+        except TclError:
+            pass
+
+    def riepilogo(self):
+        """Per ogni misura: (nome, campioni, p50, p95, max), con i tempi in millisecondi"""
+        righe = []
+        for nome, valori in sorted(self.campioni.items()):
+            ordinati = sorted(valori)
+            righe.append((nome, len(ordinati), percentile(ordinati, 0.5) * 1000,
+                          percentile(ordinati, 0.95) * 1000, ordinati[-1] * 1000))
+        return righe
+
+    def esporta_csv(self, percorso):
+        with open(percorso, 'w', newline='', encoding='utf-8') as file:
+            scrittore = csv.writer(file)
+            scrittore.writerow(['misura', 'campioni', 'p50_ms', 'p95_ms', 'max_ms'])
+            for nome, campioni, p50, p95, massimo in self.riepilogo():
+                scrittore.writerow([nome, campioni, f"{p50:.3f}", f"{p95:.3f}", f"{massimo:.3f}"])
+
+    def azzera(self):
+        self.campioni.clear()
+
+
+PROFILER = ProfilerLatenze()
+
+
+def misura_latenza(nome):
+    """Decoratore per i metodi di vista e controllore (che hanno l'attributo root)"""
+    def decoratore(metodo):
+        @wraps(metodo)
+        def misurato(self, *args, **kwargs):
+            if not PROFILER.attivo:
+                return metodo(self, *args, **kwargs)
+            inizio = time.perf_counter()
+            bloccato = PROFILER.tempo_bloccato
+            try:
+                return metodo(self, *args, **kwargs)
+            finally:
+                PROFILER.registra(nome, time.perf_counter() - inizio - (PROFILER.tempo_bloccato - bloccato))
+                PROFILER.misura_disegno(self.root, nome, inizio, bloccato)
+        return misurato
+    return decoratore
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# I moduli del gioco si importano come script dalla loro cartella (import motore)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gioco'))
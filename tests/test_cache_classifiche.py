@@ -0,0 +1,95 @@
+import pytest
+
+import gioco
+from gioco import CacheClassifiche
+
+
+class Orologio:
+    def __init__(self):
+        self.adesso = 1000.0
+
+    def __call__(self):
+        return self.adesso
+
+
+@pytest.fixture
+def orologio(monkeypatch):
+    orologio = Orologio()
+    monkeypatch.setattr(gioco.time, 'monotonic', orologio)
+    return orologio
+
+
+def test_voci_scadute(orologio):
+    cache = CacheClassifiche(durata=60)
+    cache.scrivi(('vittorie', None, 10, 0), [('anna', 3)], cache.generazione)
+    orologio.adesso += 59
+    assert cache.leggi(('vittorie', None, 10, 0)) == [('anna', 3)]
+    orologio.adesso += 2
+    assert cache.leggi(('vittorie', None, 10, 0)) is None
+    assert not cache.voci
+    assert cache.contatori == {'trovate': 1, 'mancate': 1, 'invalidate': 0}
+
+
+def test_scarta_le_meno_usate(orologio):
+    cache = CacheClassifiche(voci_massime=3)
+    chiavi = [('recente', None, 10, offset) for offset in range(0, 40, 10)]
+    for chiave in chiavi[:3]:
+        cache.scrivi(chiave, [], cache.generazione)
+    # La prima pagina torna la più usata di recente: esce la seconda
+    cache.leggi(chiavi[0])
+    cache.scrivi(chiavi[3], [], cache.generazione)
+    assert list(cache.voci) == [chiavi[2], chiavi[0], chiavi[3]]
+
+
+def test_lettura_iniziata_prima_di_una_invalidazione(orologio):
+    cache = CacheClassifiche()
+    generazione = cache.generazione
+    cache.invalida('recente')
+    cache.scrivi(('recente', None, 10, 0), [], generazione)
+    assert not cache.voci
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = gioco.GestoreDatabase(str(tmp_path / 'campo_minato.db'))
+    yield db
+    db.chiudi()
+
+
+def salva(db, username, tempo, vinto=True, difficolta='facile'):
+    id_utente, _ = db.verifica_utente(username, 'segreta')
+    db.aggiorna_statistiche(id_utente, username, vinto=vinto, tempo_impiegato=tempo, difficolta=difficolta)
+
+
+def pagine_tempi(db):
+    return {chiave for chiave in db.cache_classifiche.voci if chiave[0] == 'tempo'}
+
+
+def test_solo_un_nuovo_record_invalida_le_pagine_dei_tempi(db):
+    for username, tempo in (('anna', 50), ('bruno', 60), ('carla', 70)):
+        db.aggiungi_utente(username, 'segreta', 'Colore?', 'blu')
+        salva(db, username, tempo)
+    salva(db, 'anna', 90, difficolta='medio')
+    piena = ('tempo', 'facile', 2, 0)
+    non_piena = ('tempo', 'facile', 2, 2)
+    medio = ('tempo', 'medio', 2, 0)
+    assert [riga[:2] for riga in db.ottieni_leaderboard('tempo', 'facile', 2, 0)] == [('anna', 50), ('bruno', 60)]
+    assert [riga[:2] for riga in db.ottieni_leaderboard('tempo', 'facile', 2, 2)] == [('carla', 70)]
+    db.ottieni_leaderboard('tempo', 'medio', 2, 0)
+    assert pagine_tempi(db) == {piena, non_piena, medio}
+
+    # Un tempo peggiore del record e una sconfitta non toccano le classifiche dei tempi
+    salva(db, 'anna', 55)
+    salva(db, 'bruno', 5, vinto=False)
+    assert pagine_tempi(db) == {piena, non_piena, medio}
+
+    # Carla migliora a 65: cambia solo la pagina non piena, dove si trova. La prima finisce
+    # con 60 e non può cambiare; quella del medio è di un'altra difficoltà
+    salva(db, 'carla', 65)
+    assert pagine_tempi(db) == {piena, medio}
+    assert [riga[:2] for riga in db.ottieni_leaderboard('tempo', 'facile', 2, 2)] == [('carla', 65)]
+
+    # Bruno scende a 40 e passa davanti ad Anna: va riletta anche la prima pagina
+    salva(db, 'bruno', 40)
+    assert pagine_tempi(db) == {medio}
+    assert [riga[:2] for riga in db.ottieni_leaderboard('tempo', 'facile', 2, 0)] == [('bruno', 40), ('anna', 50)]
@@ -0,0 +1,76 @@
+import random
+from collections import Counter
+
+import pytest
+
+import motore
+from motore import campiona_mine
+
+# Densità che costringe campiona_mine a usare lo scarto oppure Floyd
+RAMI = {'scarto': 1.0, 'floyd': 0.0}
+
+
+@pytest.fixture(params=sorted(RAMI))
+def ramo(request, monkeypatch):
+    monkeypatch.setattr(motore, 'DENSITA_MASSIMA_SCARTO', RAMI[request.param])
+    return request.param
+
+
+def zona_sicura(righe, colonne, riga, colonna):
+    return {r * colonne + c for r in range(max(0, riga-1), min(righe, riga+2))
+            for c in range(max(0, colonna-1), min(colonne, colonna+2))}
+
+
+def test_mine_fuori_dalla_zona_sicura(ramo):
+    generatore = random.Random(5)
+    for _ in range(300):
+        righe, colonne = generatore.randint(1, 12), generatore.randint(1, 12)
+        riga, colonna = generatore.randrange(righe), generatore.randrange(colonne)
+        escluse = zona_sicura(righe, colonne, riga, colonna)
+        # Anche le griglie piene, con tutte le celle fuori dalla zona minate
+        mine = generatore.randint(0, righe * colonne - len(escluse))
+        indici = campiona_mine(righe, colonne, mine, riga, colonna, generatore)
+        assert len(indici) == mine
+        assert all(0 <= indice < righe * colonne for indice in indici)
+        assert not indici & escluse
+
+
+def test_stesso_seme_stesse_mine(ramo):
+    for seme in range(20):
+        assert (campiona_mine(16, 30, 99, 7, 0, random.Random(seme))
+                == campiona_mine(16, 30, 99, 7, 0, random.Random(seme)))
+    assert campiona_mine(16, 30, 99, 7, 0, random.Random(1)) != campiona_mine(16, 30, 99, 7, 0, random.Random(2))
+
+
+def test_ogni_cella_disponibile_ugualmente_probabile(ramo):
+    # 4×4 con il primo click in (1, 2): restano 7 celle disponibili per 3 mine
+    generatore = random.Random(11)
+    estrazioni = 7000
+    conteggi = Counter()
+    for _ in range(estrazioni):
+        conteggi.update(campiona_mine(4, 4, 3, 1, 2, generatore))
+    assert set(conteggi) == set(range(16)) - zona_sicura(4, 4, 1, 2)
+    for volte in conteggi.values():
+        assert volte / estrazioni == pytest.approx(3 / 7, abs=0.03)
+
+
+class GeneratoreContato(random.Random):
+    """Annota l'ampiezza di ogni estrazione"""
+    def __init__(self, seme):
+        super().__init__(seme)
+        self.ampiezze = []
+
+    def randrange(self, n):
+        self.ampiezze.append(n)
+        return super().randrange(n)
+
+
+def test_scelta_del_ramo():
+    # 9×9 con il primo click al centro: 72 celle disponibili. Fino a metà lo scarto estrae
+    # su tutta la griglia, oltre Floyd estrae una volta per mina sulle sole disponibili
+    generatore = GeneratoreContato(0)
+    campiona_mine(9, 9, 36, 4, 4, generatore)
+    assert set(generatore.ampiezze) == {81}
+    generatore = GeneratoreContato(0)
+    campiona_mine(9, 9, 37, 4, 4, generatore)
+    assert generatore.ampiezze == list(range(36, 73))
@@ -0,0 +1,192 @@
+import sqlite3
+import threading
+
+import pytest
+
+import gioco
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Un blocco lasciato aperto deve far fallire il test in fretta, non dopo 25 secondi
+    monkeypatch.setattr(gioco, 'TENTATIVI_DATABASE', 2)
+    db = gioco.GestoreDatabase(str(tmp_path / 'campo_minato.db'), pragma={'busy_timeout': 50})
+    yield db
+    db.chiudi()
+
+
+def test_utente_duplicato_non_blocca_le_scritture(db):
+    assert db.aggiungi_utente('anna', 'segreta', 'Colore?', 'blu')
+    assert not db.aggiungi_utente('anna', 'altra', 'Colore?', 'rosso')
+    assert not db.connessione.in_transaction
+
+    id_utente, _ = db.verifica_utente('anna', 'segreta')
+    db.scritture().accoda('aggiorna_statistiche', id_utente, 'anna', vinto=True, tempo_impiegato=42)
+    db.scritture().svuota()
+    assert db.contatori_blocchi()['ripetizioni'] == 0
+    assert db.ottieni_statistiche('anna')[:3] == (1, 1, 42)
+
+
+def test_errore_in_scrittura_annulla_la_transazione(db):
+    # Un valore che sqlite3 non sa salvare: l'errore arriva a transazione già aperta
+    with pytest.raises(sqlite3.Error):
+        db.aggiorna_statistiche(1, 'nessuno', vinto=True, tempo_impiegato=10, difficolta=object())
+    assert not db.connessione.in_transaction
+    assert db.reimposta_password('nessuno', 'nuova') is False
+    assert not db.connessione.in_transaction
+
+
+def test_errore_qualsiasi_non_ferma_lo_scrittore(db):
+    db.aggiungi_utente('anna', 'segreta', 'Colore?', 'blu')
+    id_utente, _ = db.verifica_utente('anna', 'segreta')
+    esiti = []
+    scrittore = db.scritture()
+    # Argomenti mancanti: TypeError, non un errore di sqlite3
+    scrittore.accoda('aggiorna_statistiche', al_termine=lambda risultato, errore: esiti.append(errore))
+    scrittore.accoda('aggiorna_statistiche', id_utente, 'anna', vinto=True, tempo_impiegato=42,
+                     al_termine=lambda risultato, errore: esiti.append(errore))
+    scrittore.coda.join()
+    scrittore.consegna_completate()
+    assert isinstance(esiti[0], TypeError)
+    assert esiti[1] is None
+    assert scrittore.thread.is_alive()
+    assert db.ottieni_statistiche('anna')[:2] == (1, 1)
+
+
+def test_svuota_non_attende_per_sempre(db):
+    sblocca = threading.Event()
+    db.attendi = sblocca.wait
+    scrittore = db.scritture()
+    scrittore.accoda('attendi')
+    assert scrittore.svuota(attesa_massima=0.1) is False
+    sblocca.set()
+    assert scrittore.svuota(attesa_massima=5) is True
+
+
+def test_database_in_memoria_condiviso_con_lo_scrittore():
+    db = gioco.GestoreDatabase(':memory:')
+    try:
+        db.aggiungi_utente('anna', 'segreta', 'Colore?', 'blu')
+        id_utente, _ = db.verifica_utente('anna', 'segreta')
+        esiti = []
+        scrittore = db.scritture()
+        scrittore.accoda('aggiorna_statistiche', id_utente, 'anna', vinto=True, tempo_impiegato=42,
+                         al_termine=lambda risultato, errore: esiti.append(errore))
+        scrittore.coda.join()
+        scrittore.consegna_completate()
+        assert esiti == [None]
+        assert db.ottieni_statistiche('anna')[:3] == (1, 1, 42)
+        # Un secondo database in memoria resta separato dal primo
+        altro = gioco.GestoreDatabase(':memory:')
+        assert altro.verifica_utente('anna', 'segreta')[0] is None
+        altro.chiudi()
+    finally:
+        db.chiudi()
+
+
+def test_pagine_con_valori_uguali_senza_ripetizioni(db):
+    for n in range(7):
+        db.aggiungi_utente(f'utente{n}', 'segreta', 'Colore?', 'blu')
+        id_utente, _ = db.verifica_utente(f'utente{n}', 'segreta')
+        # Stesso tempo e stessa data (CURRENT_TIMESTAMP ha la precisione del secondo) per tutti
+        db.aggiorna_statistiche(id_utente, f'utente{n}', vinto=True, tempo_impiegato=30)
+    id_anna, _ = db.verifica_utente('utente0', 'segreta')
+    for tempo in range(7):
+        db.aggiorna_statistiche(id_anna, 'utente0', vinto=False, tempo_impiegato=tempo)
+
+    def tutte_le_pagine(leggi):
+        righe = []
+        for offset in range(0, 9, 3):
+            righe.extend(leggi(3, offset))
+        return righe
+
+    for tipo in ('tempo', 'vittorie', 'partite'):
+        righe = tutte_le_pagine(lambda limite, offset: db.leggi_leaderboard(tipo, 'facile', limite, offset))
+        assert sorted(riga[0] for riga in righe) == [f'utente{n}' for n in range(7)]
+    recenti = tutte_le_pagine(lambda limite, offset: db.leggi_leaderboard('recente', None, limite, offset))
+    assert len(set(recenti)) == 9
+    storico = tutte_le_pagine(lambda limite, offset: db.ottieni_storico_utente('utente0', limite, offset))
+    # Dalla più recente: prima le sconfitte in ordine inverso, poi la vittoria
+    assert [riga[2] for riga in storico] == [6, 5, 4, 3, 2, 1, 0, 30]
+
+
+def test_migrazione_spareggio_su_database_esistente(tmp_path):
+    percorso = str(tmp_path / 'vecchio.db')
+    db = gioco.GestoreDatabase(percorso)
+    # Riporta il database alla versione 2, con gli indici di allora
+    db.cursore.execute('DROP INDEX indice_utenti_vinte_id')
+    db.cursore.execute('DROP INDEX indice_utenti_giocate_id')
+    db.cursore.execute('CREATE INDEX indice_utenti_vinte ON utenti(partite_vinte)')
+    db.cursore.execute('CREATE INDEX indice_utenti_giocate ON utenti(partite_giocate)')
+    db.cursore.execute('PRAGMA user_version = 2')
+    db.connessione.commit()
+    db.chiudi()
+
+    db = gioco.GestoreDatabase(percorso)
+    try:
+        assert db.cursore.execute('PRAGMA user_version').fetchone()[0] == len(gioco.GestoreDatabase.MIGRAZIONI)
+        indici = {riga[0] for riga in db.cursore.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'indice_utenti_vinte_id', 'indice_utenti_giocate_id'} <= indici
+        assert not {'indice_utenti_vinte', 'indice_utenti_giocate'} & indici
+        piano = db.cursore.execute('EXPLAIN QUERY PLAN SELECT username FROM utenti '
+                                   'ORDER BY partite_vinte DESC, id ASC LIMIT 10').fetchall()
+        assert not any('TEMP B-TREE' in riga[3] for riga in piano)
+    finally:
+        db.chiudi()
+
+
+@pytest.mark.parametrize('in_gruppo', [False, True])
+def test_record_aggiornato_solo_da_un_tempo_migliore(db, in_gruppo):
+    db.aggiungi_utente('anna', 'segreta', 'Colore?', 'blu')
+    id_utente, _ = db.verifica_utente('anna', 'segreta')
+
+    def salva(tempo, vinto=True):
+        if in_gruppo:
+            with db.gruppo_scritture():
+                db.aggiorna_statistiche(id_utente, 'anna', vinto=vinto, tempo_impiegato=tempo)
+        else:
+            db.aggiorna_statistiche(id_utente, 'anna', vinto=vinto, tempo_impiegato=tempo)
+        return [tuple(riga[:2]) for riga in db.leggi_leaderboard('tempo', 'facile', 10, 0)]
+
+    assert salva(50) == [('anna', 50)]
+    assert salva(80) == [('anna', 50)]
+    # Una sconfitta più rapida non conta come record
+    assert salva(10, vinto=False) == [('anna', 50)]
+    assert salva(30) == [('anna', 30)]
+    assert db.ottieni_statistiche('anna')[:3] == (4, 3, 30)
+
+
+def blocca_database(db, secondi=None):
+    """Prende il blocco di scrittura da un'altra connessione; lo rilascia dopo secondi, se indicati"""
+    altra = sqlite3.connect(db.nome_db, check_same_thread=False)
+    altra.execute('BEGIN IMMEDIATE')
+    if secondi is not None:
+        rilascio = threading.Timer(secondi, altra.commit)
+        rilascio.start()
+    return altra
+
+
+def test_scrittura_riuscita_dopo_le_ripetizioni(db, monkeypatch):
+    monkeypatch.setattr(gioco, 'TENTATIVI_DATABASE', 10)
+    altra = blocca_database(db, secondi=0.3)
+    try:
+        assert db.aggiungi_utente('anna', 'segreta', 'Colore?', 'blu')
+    finally:
+        altra.close()
+    contatori = db.contatori_blocchi()
+    assert contatori['ripetizioni'] > 0
+    assert contatori['attesa'] > 0
+    assert db.utente_esiste('anna')
+
+
+def test_blocco_che_non_si_libera(db):
+    altra = blocca_database(db)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            db.aggiungi_utente('anna', 'segreta', 'Colore?', 'blu')
+    finally:
+        altra.close()
+    # Tutti i tentativi consumati, senza lasciare transazioni aperte
+    assert db.contatori_blocchi()['ripetizioni'] == gioco.TENTATIVI_DATABASE - 1
+    assert not db.connessione.in_transaction
+    assert db.aggiungi_utente('anna', 'segreta', 'Colore?', 'blu')
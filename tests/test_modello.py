@@ -0,0 +1,182 @@
+import random
+
+import pytest
+
+import motore
+from motore import MOTORI
+
+
+def sicure_coperte(modello):
+    """Celle senza mina ancora da scoprire, contate scorrendo tutta la griglia"""
+    return sum((riga, colonna) not in modello.posizioni_mine and not modello.cella_scoperta(riga, colonna)
+               for riga in range(modello.righe) for colonna in range(modello.colonne))
+
+
+def nuova_partita(motore, righe, colonne, mine, seme):
+    modello = MOTORI[motore](seme)
+    modello.righe, modello.colonne, modello.mine = righe, colonne, mine
+    modello.reset_gioco()
+    return modello
+
+
+def scopri(modello, riga, colonna):
+    """Scopre la cella come il controllore, espandendo le aree vuote; False se era una mina"""
+    risultato = modello.scopri_cella(riga, colonna)
+    if risultato == 'vuota':
+        modello.scopri_adiacenti(riga, colonna)
+    return risultato != 'mina'
+
+
+@pytest.mark.parametrize('motore', sorted(MOTORI))
+def test_contatore_celle_sicure_come_scansione(motore):
+    generatore = random.Random(3)
+    vittorie = sconfitte = 0
+    for partita in range(150):
+        righe, colonne = generatore.randint(4, 9), generatore.randint(4, 9)
+        # Le 9 celle attorno al primo clic restano senza mine
+        mine = generatore.randint(1, righe * colonne - 9)
+        modello = nuova_partita(motore, righe, colonne, mine, partita)
+        in_gioco = scopri(modello, generatore.randrange(righe), generatore.randrange(colonne))
+        while in_gioco and modello.celle_sicure_rimanenti > 0:
+            celle = [(r, c) for r in range(righe) for c in range(colonne) if not modello.cella_scoperta(r, c)]
+            cella = generatore.choice(celle)
+            if generatore.random() < 0.3:
+                modello.toggle_bandierina(*cella)
+            elif not modello.cella_segnata(*cella) and (cella not in modello.posizioni_mine
+                                                        or generatore.random() < 0.05):
+                in_gioco = scopri(modello, *cella)
+            assert modello.celle_sicure_rimanenti == sicure_coperte(modello)
+            assert (modello.celle_sicure_rimanenti == 0) == modello.controlla_vittoria_scansione()
+        if in_gioco:
+            vittorie += 1
+        else:
+            sconfitte += 1
+    assert vittorie and sconfitte
+
+
+def test_conteggi_numpy_come_python_puro(monkeypatch):
+    pytest.importorskip('numpy')
+    generatore = random.Random(3)
+    griglie = []
+    for _ in range(200):
+        righe, colonne = generatore.randint(1, 30), generatore.randint(1, 30)
+        mine = generatore.randint(0, righe * colonne)
+        griglie.append((righe, colonne, generatore.sample(range(righe * colonne), mine)))
+    con_numpy = [motore.calcola_conteggi(*griglia) for griglia in griglie]
+    monkeypatch.setattr(motore, 'np', None)
+    assert [motore.calcola_conteggi(*griglia) for griglia in griglie] == con_numpy
+
+
+def partita_con_numero(motore):
+    """Griglia 5×5 con mine in (0, 0), (0, 1) e (4, 4), con scoperto il 2 in (1, 1)"""
+    modello = MOTORI[motore]()
+    modello.righe, modello.colonne, modello.mine = 5, 5, 3
+    modello.mine_prefissate = [0, 1, 24]
+    modello.reset_gioco()
+    assert modello.scopri_cella(1, 1) == 2
+    return modello
+
+
+def scoperte(modello):
+    return {(r, c) for r in range(modello.righe) for c in range(modello.colonne) if modello.cella_scoperta(r, c)}
+
+
+@pytest.mark.parametrize('motore', sorted(MOTORI))
+def test_accordo_con_bandierine_giuste(motore):
+    modello = partita_con_numero(motore)
+    modello.toggle_bandierina(0, 0)
+    modello.toggle_bandierina(0, 1)
+    prima = scoperte(modello)
+    celle, mina = modello.scopri_accordo(1, 1)
+    assert mina is None
+    # Le vicine sicure e le aree vuote raggiunte, ognuna una volta sola
+    assert len(celle) == len(set(celle))
+    assert set(celle) == scoperte(modello) - prima
+    assert {(1, 0), (1, 2), (2, 0), (2, 1), (2, 2), (0, 2)} <= set(celle)
+    assert modello.celle_sicure_rimanenti == sicure_coperte(modello) == 0
+    assert modello.controlla_vittoria()
+
+
+@pytest.mark.parametrize('motore', sorted(MOTORI))
+@pytest.mark.parametrize('bandierine', [[], [(0, 0)], [(0, 0), (0, 1), (1, 0)]])
+def test_accordo_con_bandierine_in_numero_diverso(motore, bandierine):
+    modello = partita_con_numero(motore)
+    for cella in bandierine:
+        modello.toggle_bandierina(*cella)
+    prima = scoperte(modello), modello.celle_sicure_rimanenti
+    assert modello.scopri_accordo(1, 1) is None
+    # Su una cella coperta l'accordo non si applica mai
+    assert modello.scopri_accordo(3, 3) is None
+    assert (scoperte(modello), modello.celle_sicure_rimanenti) == prima
+    assert modello.celle_sicure_rimanenti == sicure_coperte(modello)
+    assert not modello.gioco_finito
+
+
+@pytest.mark.parametrize('motore', sorted(MOTORI))
+def test_accordo_con_bandierina_sbagliata(motore):
+    modello = partita_con_numero(motore)
+    modello.toggle_bandierina(0, 0)
+    # Bandierina su una cella sicura: il conteggio torna ma la mina in (0, 1) resta libera
+    modello.toggle_bandierina(1, 0)
+    celle, mina = modello.scopri_accordo(1, 1)
+    assert mina == (0, 1)
+    assert modello.gioco_finito
+    assert (0, 1) in celle and (1, 0) not in celle
+    assert modello.celle_sicure_rimanenti == sicure_coperte(modello) > 0
+    assert modello.scopri_accordo(1, 1) is None
+
+
+def stato(modello):
+    """Tutto ciò che il controllore può leggere dal modello"""
+    celle = {}
+    for r in range(modello.righe):
+        for c in range(modello.colonne):
+            scoperta = modello.cella_scoperta(r, c)
+            celle[r, c] = (scoperta, modello.cella_segnata(r, c),
+                           modello.ottieni_mine_adiacenti(r, c) if scoperta else None)
+    return (celle, modello.posizioni_mine, modello.celle_segnate, modello.bandierine_piazzate,
+            modello.celle_sicure_rimanenti, modello.gioco_finito, modello.primo_click)
+
+
+def mossa_guidata(modello, generatore):
+    """Mossa a caso, ma con bandierine per lo più sulle mine e accordi sui numeri scoperti, così
+    che molti accordi si applichino; ogni tanto si calpesta una mina"""
+    azione = generatore.choice(['scopri', 'scopri', 'bandierina', 'accordo'])
+    celle = [(r, c) for r in range(modello.righe) for c in range(modello.colonne)]
+    if azione == 'accordo':
+        candidate = [cella for cella in celle if modello.cella_scoperta(*cella)]
+    else:
+        candidate = [cella for cella in celle if not modello.cella_scoperta(*cella)]
+        mine = [cella for cella in candidate if cella in modello.posizioni_mine]
+        if azione == 'bandierina' and generatore.random() < 0.8:
+            candidate = mine
+        elif azione == 'scopri' and generatore.random() < 0.97:
+            candidate = [cella for cella in candidate if cella not in mine]
+    return generatore.choice(candidate or celle) + (azione,)
+
+
+def test_motori_equivalenti():
+    generatore = random.Random(8)
+    for partita in range(100):
+        righe, colonne = generatore.randint(1, 10), generatore.randint(1, 12)
+        mine = generatore.randint(0, max(0, righe * colonne - 9))
+        modelli = [nuova_partita(nome, righe, colonne, mine, partita) for nome in sorted(MOTORI)]
+        for _ in range(3 * righe * colonne):
+            if modelli[0].gioco_finito:
+                break
+            riga, colonna, azione = mossa_guidata(modelli[0], generatore)
+            risultati = []
+            for modello in modelli:
+                if azione == 'scopri':
+                    risultato = modello.scopri_cella(riga, colonna)
+                    # Le aree vuote escono in ordini diversi: contano le celle
+                    adiacenti = set(modello.scopri_adiacenti(riga, colonna)) if risultato == 'vuota' else None
+                    risultati.append((risultato, adiacenti))
+                elif azione == 'bandierina':
+                    risultati.append(modello.toggle_bandierina(riga, colonna))
+                else:
+                    risultato = modello.scopri_accordo(riga, colonna)
+                    risultati.append(risultato and (set(risultato[0]), risultato[1]))
+            assert risultati[0] == risultati[1], (partita, azione, riga, colonna)
+            assert stato(modelli[0]) == stato(modelli[1])
+            assert modelli[0].controlla_vittoria() == modelli[1].controlla_vittoria()
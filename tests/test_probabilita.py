@@ -0,0 +1,48 @@
+import random
+from itertools import combinations
+
+from motore import SessioneCampoMinato
+
+
+def probabilita_forza_bruta(modello):
+    """Probabilità di mina di ogni cella coperta, contando tutte le disposizioni coerenti con i numeri"""
+    righe, colonne = modello.righe, modello.colonne
+    coperte = [r * colonne + c for r in range(righe) for c in range(colonne) if not modello.cella_scoperta(r, c)]
+    vincoli = []
+    for riga in range(righe):
+        for colonna in range(colonne):
+            if modello.cella_scoperta(riga, colonna):
+                vicine = {r * colonne + c for r in range(max(0, riga-1), min(righe, riga+2))
+                          for c in range(max(0, colonna-1), min(colonne, colonna+2))}
+                vincoli.append((vicine, modello.ottieni_mine_adiacenti(riga, colonna)))
+
+    conteggi = dict.fromkeys(coperte, 0)
+    totale = 0
+    for mine in combinations(coperte, modello.mine):
+        mine = set(mine)
+        if all(len(vicine & mine) == numero for vicine, numero in vincoli):
+            totale += 1
+            for cella in mine:
+                conteggi[cella] += 1
+    return {cella: conteggio / totale for cella, conteggio in conteggi.items()}
+
+
+def test_probabilita_esatte_come_forza_bruta():
+    generatore = random.Random(11)
+    confronti = 0
+    for seme in range(150):
+        sessione = SessioneCampoMinato(righe=5, colonne=5, mine=4, seme=seme)
+        modello = sessione.modello
+        sessione.scopri(generatore.randrange(5), generatore.randrange(5))
+        while not sessione.terminata:
+            probabilita, interne = sessione.probabilita.calcola()
+            assert not sessione.probabilita.approssimata
+            attese = probabilita_forza_bruta(modello)
+            for cella, attesa in attese.items():
+                valore = probabilita.get(cella, interne)
+                assert abs(valore - attesa) < 1e-9, (seme, divmod(cella, modello.colonne), valore, attesa)
+            confronti += 1
+            # Si prosegue su una cella sicura a caso, così da incontrare frontiere diverse
+            sicure = [c for c in sessione.celle_coperte() if c not in modello.posizioni_mine]
+            sessione.scopri(*generatore.choice(sicure))
+    assert confronti > 300
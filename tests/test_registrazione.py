@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from motore import MOTORI, RegistrazionePartita, SessioneCampoMinato, riproduci_partita
+
+
+def mossa_mista(sessione, generatore):
+    """Mosse suggerite dal risolutore, tentativi quando mancano e in mezzo bandierine e accordi
+    a caso, giusti o sbagliati"""
+    caso = generatore.random()
+    if sessione.modello.gioco_iniziato and caso < 0.3:
+        azione = 'bandierina' if caso < 0.1 else 'accordo'
+        return azione, generatore.randrange(sessione.righe), generatore.randrange(sessione.colonne)
+    suggerimento = sessione.risolutore.suggerimento()
+    if suggerimento is not None:
+        azione, riga, colonna = suggerimento
+        return ('bandierina' if azione == 'togli_bandierina' else azione), riga, colonna
+    riga, colonna = generatore.choice(list(sessione.celle_coperte()))
+    return 'scopri', riga, colonna
+
+
+def gioca_e_registra(motore, seme):
+    sessione = SessioneCampoMinato('medio', motore=motore, seme=seme)
+    generatore = random.Random(seme)
+    registrazione = RegistrazionePartita(sessione.righe, sessione.colonne)
+    risultati = []
+    istante = 0.0
+    while not sessione.terminata and sessione.mosse < 400:
+        azione, riga, colonna = mossa_mista(sessione, generatore)
+        istante += generatore.uniform(0.05, 2)
+        registrazione.registra(azione, riga, colonna, istante)
+        risultati.append(sessione.mossa(azione, riga, colonna))
+    colonne = sessione.colonne
+    registrazione.indici_mine = sorted(r * colonne + c for r, c in sessione.modello.posizioni_mine)
+    return sessione, registrazione, risultati
+
+
+def stato_finale(sessione):
+    return {(r, c): sessione.stato_cella(r, c) for r in range(sessione.righe) for c in range(sessione.colonne)}
+
+
+@pytest.mark.parametrize('motore', sorted(MOTORI))
+def test_registrazione_codificata_e_rigiocata(motore):
+    esiti = set()
+    for seme in range(20):
+        originale, registrazione, risultati = gioca_e_registra(motore, seme)
+        decodificata = RegistrazionePartita.decodifica(registrazione.codifica())
+        assert (decodificata.righe, decodificata.colonne) == (originale.righe, originale.colonne)
+        assert decodificata.indici_mine == registrazione.indici_mine
+        assert decodificata.mosse == registrazione.mosse
+
+        for motore_riproduzione in sorted(MOTORI):
+            rigiocati = []
+            copia = riproduci_partita(decodificata, motore=motore_riproduzione,
+                                      ad_ogni_mossa=lambda *mossa: rigiocati.append(mossa))
+            assert [mossa[:3] for mossa in rigiocati] == [mossa[:3] for mossa in registrazione.mosse]
+            if motore_riproduzione == motore:
+                assert [mossa[3] for mossa in rigiocati] == risultati
+            assert copia.esito == originale.esito
+            assert copia.mosse == originale.mosse
+            assert stato_finale(copia) == stato_finale(originale)
+        esiti.add(originale.esito)
+    # Le partite provate finiscono sia in vittoria sia in sconfitta
+    assert {'vittoria', 'sconfitta'} <= esiti
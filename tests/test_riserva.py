@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+import motore
+from motore import MOTORI, RiservaGriglie
+
+
+def test_chiudi_con_generazioni_in_attesa():
+    riserva = RiservaGriglie(processi=1, scorta=2)
+    # 9 regioni × 2 griglie: quasi tutti i lavori restano in coda
+    riserva.prepara(16, 30, 99)
+    assert len(riserva.lavori) > 1
+
+    chiusura = threading.Thread(target=riserva.chiudi, daemon=True)
+    chiusura.start()
+    chiusura.join(timeout=10)
+    assert not chiusura.is_alive(), "chiudi() bloccato con lavori in coda"
+    assert riserva.esecutore is None
+    # I lavori annullati non contano più tra quelli in corso
+    with riserva.lucchetto:
+        assert sum(riserva.in_corso.values()) == len(riserva.lavori)
+
+
+def test_riserva_riutilizzabile_dopo_chiudi():
+    riserva = RiservaGriglie(processi=1, scorta=1)
+    riserva.prepara(9, 9, 10)
+    riserva.chiudi()
+    # Una nuova preparazione riavvia i processi
+    riserva.prepara(9, 9, 10)
+    assert riserva.esecutore is not None
+    riserva.chiudi()
+    assert riserva.esecutore is None
+
+
+@pytest.mark.parametrize('nome_motore', sorted(MOTORI))
+def test_griglia_garantita_senza_indovinare(nome_motore):
+    modello = MOTORI[nome_motore](seme=1)
+    modello.senza_indovinare = True
+    modello.reset_gioco()
+    modello.scopri_cella(4, 4)
+    assert modello.griglia_garantita
+
+
+@pytest.mark.parametrize('nome_motore', sorted(MOTORI))
+def test_griglia_non_garantita_se_nessuna_risolvibile(nome_motore, monkeypatch):
+    monkeypatch.setattr(motore, 'genera_griglia_senza_indovinare', lambda *args: None)
+    modello = MOTORI[nome_motore](seme=1)
+    modello.senza_indovinare = True
+    modello.reset_gioco()
+    assert modello.scopri_cella(4, 4) == 'vuota'
+    assert not modello.griglia_garantita
+    # La partita si gioca comunque, con tutte le mine fuori dalla zona del primo click
+    assert len(modello.posizioni_mine) == modello.mine
+    assert all(max(abs(r - 4), abs(c - 4)) > 1 for r, c in modello.posizioni_mine)
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from motore import RisolutoreCampoMinato, SessioneCampoMinato
+
+
+def gioca_con_risolutore(sessione, generatore, ad_ogni_mossa):
+    """Scopre le celle sicure dedotte e, quando non ce ne sono, una cella senza mina a caso"""
+    modello = sessione.modello
+    while not sessione.terminata:
+        mossa = sessione.risolutore.mossa_sicura()
+        if mossa is not None:
+            cella = mossa[1:]
+        else:
+            cella = generatore.choice([c for c in sessione.celle_coperte() if c not in modello.posizioni_mine])
+        sessione.scopri(*cella)
+        if not sessione.terminata:
+            ad_ogni_mossa(sessione)
+
+
+# Meno partite sulle griglie grandi, dove ricostruire il risolutore a ogni mossa costa di più
+@pytest.mark.parametrize('difficolta, partite', [('facile', 40), ('medio', 15), ('difficile', 5)])
+def test_deduzioni_corrette_e_uguali_a_quelle_da_zero(difficolta, partite):
+    generatore = random.Random(7)
+    for seme in range(partite):
+        sessione = SessioneCampoMinato(difficolta, seme=seme)
+        modello = sessione.modello
+        sessione.scopri(sessione.righe // 2, sessione.colonne // 2)
+
+        def verifica(sessione):
+            risolutore = sessione.risolutore
+            colonne = sessione.colonne
+            mine = {r * colonne + c for r, c in modello.posizioni_mine}
+            # Solidità: nessuna cella sicura è una mina, ogni mina dedotta lo è davvero
+            assert not risolutore.sicure & mine
+            assert risolutore.mine <= mine
+            assert not any(modello.cella_scoperta(*divmod(i, colonne)) for i in risolutore.sicure)
+            # L'aggiornamento incrementale deduce quanto un risolutore costruito da zero
+            da_zero = RisolutoreCampoMinato(modello)
+            assert risolutore.sicure == da_zero.sicure
+            assert risolutore.mine == da_zero.mine
+
+        if not sessione.terminata:
+            verifica(sessione)
+            gioca_con_risolutore(sessione, generatore, verifica)
+        assert sessione.esito == 'vittoria'
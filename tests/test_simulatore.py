@@ -0,0 +1,18 @@
+import pytest
+
+from motore import simula_partite
+
+
+@pytest.mark.parametrize('processi', [1, 2])
+def test_nessuna_partita(processi):
+    risultato = simula_partite(0, processi=processi)
+    assert (risultato['vittorie'], risultato['sconfitte'], risultato['mosse']) == (0, 0, 0)
+    assert risultato['percentuale_vittorie'] == 0.0
+
+
+def test_risultati_indipendenti_dai_processi():
+    chiavi = ('vittorie', 'sconfitte', 'interrotte', 'mosse')
+    in_serie = simula_partite(40, bot='risolutore', processi=1, seme=3)
+    in_parallelo = simula_partite(40, bot='risolutore', processi=3, seme=3)
+    assert [in_serie[k] for k in chiavi] == [in_parallelo[k] for k in chiavi]
+    assert in_serie['vittorie'] > 0